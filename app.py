@@ -5,10 +5,17 @@
 from flask import Flask, render_template, request, jsonify, redirect, url_for, session,send_file #import flask modules
 import psycopg2
 import psycopg2.extras
-import re
-
-import bcrypt #import bcrypt for the password hashing
-from email_service import send_email
+import atexit
+import base64
+import csv
+import hashlib
+import json
+import math
+import queue
+
+from passwords import HasherBusy, check_password, hash_password, hasher, needs_rehash  #bcrypt on a bounded pool
+from login_limiter import PostgresTokenBucketLimiter, TokenBucketLimiter  #login throttling
+from email_service import send_batch, send_email, sender as email_sender
 
 from apscheduler.schedulers.background import BackgroundScheduler  #import background scheduler
 from datetime import datetime #import datetime module
@@ -20,19 +27,28 @@ from itsdangerous import URLSafeTimedSerializer  #import url safe timed serializ
 from flask import url_for  #import url for generating urls
 from flask import flash   #import flash for flashing messages
 from datetime import timedelta #import timedelta for session lifetime
-from reportlab.pdfgen import canvas  #import report lab for pdf generation
-from reportlab.lib.pagesizes import A4  #import a4 image for pdf size
-from reportlab.lib.utils import ImageReader  #import image reader for reading images
-from io import BytesIO  #import bytes io for byte stream handling
+from report_pdf import ReportCache, build_report, report_key  #server-side pdf report (reportlab)
+from io import BytesIO, StringIO  #import bytes io for byte stream handling
 from flask import session #import session for session management
-from translations import TRANSLATIONS #import translations dictionary
+from translations import catalog, report_missing_keys #import frozen per-language translation catalogs
+from stat_keys import game_key_for, result_key_for  #canonical game/result keys
 from itsdangerous import SignatureExpired, BadSignature  #import exceptions for taken handling
 from flask import send_from_directory  #import send from directory for serving static files
+from flask import stream_with_context  #keep the request (and its db connection) alive while streaming
+from database import PG, database_url_from_env  #import pooled postgres connection wrapper
+from user_cache import UserCache  #import per-process cache of users rows
+from stats_events import StatsBroadcaster  #import LISTEN/NOTIFY fan-out for live stats
+from stats_writer import WriteBehindBuffer, QueueFull  #import optional write-behind for add_stat
+from jobs import enqueue_job, start_workers  #import background jobs queue (postgres)
+from leader import LeaderElection  #import single-leader election (advisory lock)
+from reminders import CLAIM_BATCH, claim_due, prune_deliveries, reschedule  #import reminder scheduling (next_reminder_at)
 
 
 from dotenv import load_dotenv
 load_dotenv()
 
+report_missing_keys()  # ⚠️ keys a language lacks (served from the fallback), once at startup
+
 ATHENS_TZ = pytz.timezone("Europe/Athens")
 UTC_TZ = pytz.utc
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -45,6 +61,8 @@ app.secret_key = os.environ.get("SECRET_KEY", "dev-only-secret")
 
 #App session lifetime configuration
 app.permanent_session_lifetime = timedelta(days=30)
+#Only send the session cookie when it changed (load_language refreshes it once a day)
+app.config['SESSION_REFRESH_EACH_REQUEST'] = False
 #Serializer for generating tokens
 s = URLSafeTimedSerializer(app.secret_key)
 
@@ -78,100 +96,93 @@ import time
 # -------------------------------------------------------------------
 # ✅ Settings Database (Postgres via DATABASE_URL)
 # -------------------------------------------------------------------
-DATABASE_URL = os.environ.get("DATABASE_URL", "").strip()
-
-# Render μερικές φορές δίνει postgres://, το κάνουμε postgresql://
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-# ✅ force sslmode=require αν δεν υπάρχει ήδη
-if "sslmode=" not in DATABASE_URL:
-    sep = "&" if "?" in DATABASE_URL else "?"
-    DATABASE_URL = DATABASE_URL + f"{sep}sslmode=require"
-
-class TranslatingCursor:
-    """
-    Μεταφράζει λίγα MySQL-specific πράγματα σε Postgres,
-    ώστε να ΜΗΝ αλλάξεις SQL μέσα στα routes.
-    """
-    def __init__(self, real_cursor):
-        self._cur = real_cursor
-
-    def execute(self, query, params=None):
-        q = query
-        q = q.replace("UTC_TIMESTAMP()", "(NOW() AT TIME ZONE 'UTC')")
-        q = q.replace("CURDATE()", "CURRENT_DATE")
-        q = re.sub(r"DATE\s*\(\s*created_at\s*\)", "created_at::date", q, flags=re.IGNORECASE)
-        return self._cur.execute(q, params)
-
-    def executemany(self, query, param_seq):
-        q = query
-        q = q.replace("UTC_TIMESTAMP()", "(NOW() AT TIME ZONE 'UTC')")
-        q = q.replace("CURDATE()", "CURRENT_DATE")
-        q = re.sub(r"DATE\s*\(\s*created_at\s*\)", "created_at::date", q, flags=re.IGNORECASE)
-        return self._cur.executemany(q, param_seq)
-
-    def fetchone(self):
-        return self._cur.fetchone()
+DATABASE_URL = database_url_from_env()
 
-    def fetchall(self):
-        return self._cur.fetchall()
+# ✅ keep the same name "mysql" (pooled, one connection per request)
+mysql = PG(DATABASE_URL, app)
 
-    def close(self):
-        return self._cur.close()
+# ✅ Fake MySQLdb.cursors.DictCursor dont change the routes
+class MySQLdb:
+    class cursors:
+        DictCursor = object()
 
-    def __getattr__(self, name):
-        return getattr(self._cur, name)
+# -------------------------------------------------------------------
+# ✅ Users rows cache (per process, TTL + LRU)
+# -------------------------------------------------------------------
+user_cache = UserCache(
+    maxsize=int(os.environ.get("USER_CACHE_SIZE", 1024)),
+    ttl=int(os.environ.get("USER_CACHE_TTL", 30)),
+)
 
-class PostgresConnection:
-    def __init__(self, dsn: str):
-        self.dsn = dsn
-        self._conn = None
+def get_user(user_id=None, username=None, email=None, newer_than=None, fresh=False):
+    """Return the users row (dict) by id, username or email, or None."""
+    if not fresh:
+        row = user_cache.get(user_id=user_id, username=username, email=email, newer_than=newer_than)
+        if row is not None:
+            return row
+
+    if user_id is not None:
+        column, value = "id", user_id
+    elif username is not None:
+        column, value = "username", username
+    else:
+        column, value = "email", email
 
-    def _connect(self):
-        if self._conn is None or self._conn.closed != 0:
-            self._conn = psycopg2.connect(self.dsn)
-        return self._conn
+    cur = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    cur.execute(f"SELECT * FROM users WHERE {column}=%s", (value,))
+    row = cur.fetchone()
+    cur.close()
 
-    def cursor(self, cursorclass=None):
-        conn = self._connect()
+    if not row:
+        return None
+    user_cache.put(row)
+    return dict(row)
 
-        if cursorclass is not None:
-            real = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            return TranslatingCursor(real)
+def invalidate_user(user_id=None, username=None, email=None):
+    """Call after every write to the users table."""
+    user_cache.invalidate(user_id=user_id, username=username, email=email)
 
-        real = conn.cursor()
-        return TranslatingCursor(real)
+# -------------------------------------------------------------------
+# ✅ Login throttling (per IP and per account, before any DB/bcrypt work)
+# -------------------------------------------------------------------
+LOGIN_IP_LIMIT = int(os.environ.get("LOGIN_IP_LIMIT", 20))              # attempts per window per IP
+LOGIN_ACCOUNT_LIMIT = int(os.environ.get("LOGIN_ACCOUNT_LIMIT", 5))     # attempts per window per account
+LOGIN_WINDOW = int(os.environ.get("LOGIN_WINDOW", 300))                 # seconds
 
-    def commit(self):
-        if self._conn:
-            self._conn.commit()
+if os.environ.get("LOGIN_LIMITER") == "postgres":
+    login_ip_limiter = PostgresTokenBucketLimiter(mysql.connection, LOGIN_IP_LIMIT, LOGIN_WINDOW)
+    login_account_limiter = PostgresTokenBucketLimiter(mysql.connection, LOGIN_ACCOUNT_LIMIT, LOGIN_WINDOW)
+else:
+    login_ip_limiter = TokenBucketLimiter(LOGIN_IP_LIMIT, LOGIN_WINDOW)
+    login_account_limiter = TokenBucketLimiter(LOGIN_ACCOUNT_LIMIT, LOGIN_WINDOW)
 
-    def rollback(self):
-        if self._conn:
-            self._conn.rollback()
 
-    def ping(self, reconnect=False):
-        try:
-            cur = self.cursor()
-            cur.execute("SELECT 1;")
-            cur.close()
-        except Exception:
-            if reconnect:
-                self._conn = None
-                self._connect()
+def client_ip():
+    # behind Render's proxy the last X-Forwarded-For entry is the address it saw;
+    # earlier entries come from the client and can be anything
+    if os.environ.get("RENDER") or os.environ.get("TRUST_X_FORWARDED_FOR"):
+        return request.access_route[-1]
+    return request.remote_addr or "?"
 
 
-class PG:
-    def __init__(self, dsn: str):
-        self.connection = PostgresConnection(dsn)
+def login_account_keys(email, username):
+    # the login matches email OR username, so both are limited
+    return [f"acct:e:{email.lower()}", f"acct:u:{username.lower()}"]
 
-# ✅ keep the same name "mysql"
-mysql = PG(DATABASE_URL)
 
-# ✅ Fake MySQLdb.cursors.DictCursor dont change the routes
-class MySQLdb:
-    class cursors:
-        DictCursor = object()
+# -------------------------------------------------------------------
+# ✅ Live stats events (one LISTEN connection per worker, SSE fan-out)
+# -------------------------------------------------------------------
+# every open stream holds a request thread of this worker (gunicorn.conf.py:
+# gthread, GUNICORN_THREADS per worker); by default streams get at most half of
+# them and the rest stay free for normal requests, beyond that -> 503 + polling
+WORKER_THREADS = int(os.environ.get("GUNICORN_THREADS", 16))
+stats_events = StatsBroadcaster(
+    DATABASE_URL,
+    max_clients=int(os.environ.get("STATS_STREAM_MAX_CLIENTS", max(1, WORKER_THREADS // 2))),
+)
+STATS_STREAM_HEARTBEAT = 15      # seconds between keep-alive comments
+STATS_STREAM_MAX_AGE = 300       # the browser reconnects by itself, so threads get recycled
 
 @app.route("/assets/first_game/<path:filename>")
 def first_game_assets(filename):
@@ -189,25 +200,23 @@ def last_game_assets(filename):
 
 #Translation helper functions
 def get_user_lang_by_email(email: str) -> str:
-    cur = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-    cur.execute("SELECT language FROM users WHERE email=%s", (email,))
-    row = cur.fetchone()
-    cur.close()
+    row = get_user(email=email)
 
     lang = (row.get("language") if row else None) or "el"
     return lang if lang in ("el", "en") else "el"
 #Translation function
 def TT(lang: str):
-    if lang not in ("el", "en"):
-        lang = "el"
-    return TRANSLATIONS.get(lang, TRANSLATIONS["el"])
-#Reconnect to DB if connection is lost
-@app.before_request
-def ensure_db_alive():
-    try:
-        mysql.connection.ping(True)  # reconnect if dropped
-    except Exception:
-        pass
+    return catalog(lang)
+# Endpoints that never touch the database (static files, PWA files, game assets).
+# Dead connections are replaced when a query fails, so there is no ping per request.
+NO_DB_ENDPOINTS = {
+    "static",
+    "manifest",
+    "service_worker",
+    "first_game_assets",
+    "third_game_assets",
+    "last_game_assets",
+}
 
 
 # 📁 game's file
@@ -222,8 +231,14 @@ def db_test():
     cur.execute("SELECT COUNT(*) FROM users")
     count = cur.fetchone()
     cur.close()
-    return f"DB OK – users rows: {count}"
+    return f"DB OK – users rows: {count} – pool: {mysql.stats()} – users cache: {user_cache.stats()} – stats stream: {stats_events.stats()} – write-behind: {stats_writer.stats() if stats_writer else 'off'} – reports: {report_cache.stats()} – email: {email_sender.stats()} – scheduler: {scheduler_leader.stats()} – bcrypt: {hasher.stats()} – login limits: {login_ip_limiter.stats()} / {login_account_limiter.stats()}"
 #Route for PWA manifest and service worker
+@app.errorhandler(HasherBusy)
+def hasher_busy(e):
+    # every bcrypt thread busy and the queue full: ask the client to retry shortly
+    return "Server busy, please try again.", 503, {"Retry-After": "2"}
+
+
 @app.route("/manifest.webmanifest")
 def manifest():
     return send_from_directory("static", "manifest.webmanifest",
@@ -273,34 +288,22 @@ def profile():
     if 'user_id' not in session:
         return redirect(url_for('index'))
 
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-
     # 🔑 id 
-    cursor.execute("SELECT * FROM users WHERE id = %s", (session['user_id'],))
-    user = cursor.fetchone()
+    user = get_user(user_id=session['user_id'])
 
     if not user:
-        cursor.close()
         session.clear()
         return redirect(url_for('index'))
 
-    # 📊 stats with username only
-    cursor.execute(
-        "SELECT * FROM game_statistics WHERE username = %s",
-        (user['username'],)
-    )
-    stats = cursor.fetchall()
-    cursor.close()
-
     # 👤 only owner
     is_owner = True
 
-    session['avatar'] = user.get('avatar')
+    if session.get('avatar') != user.get('avatar'):
+        session['avatar'] = user.get('avatar')
 
     return render_template(
         'profile.html',
         user=user,
-        stats=stats,
         is_owner=is_owner
     )
 
@@ -308,116 +311,9 @@ def get_lang():
     return session.get("lang", "el")
 
 def get_t_dict():
+    # already merged with the fallback language at import: no per-render copy
     lang = get_lang()
-    base = TRANSLATIONS.get("el", {})
-    current = TRANSLATIONS.get(lang, base)
-    merged = {**base, **current}
-    return merged, lang
-def normalize_result_key(result: str) -> str:
-    """Normalize DB result (completed/win/lose/...) into a canonical key."""
-    if not result:
-        return ""
-
-    r = str(result).strip().lower()
-
-    # accept many variants so old data still works
-    mapping = {
-        "completed": "completed",
-        "complete": "completed",
-        "done": "completed",
-
-        "win": "win",
-        "won": "win",
-        "victory": "win",
-
-        "lose": "lose",
-        "loss": "lose",
-        "failed": "lose",
-         # ✅ add Greek variants
-        "νικη": "win",
-        "νίκη": "win",
-        "επιτυχια": "win",
-         "επιτυχία": "win",
-
-        "ηττα": "lose",
-        "ήττα": "lose",
-        "αποτυχια": "lose",
-        "αποτυχία": "lose",
-
-
-        "game over": "game_over",
-        "game_over": "game_over",
-        "gameover": "game_over",
-
-        "exit": "exit",
-        "quit": "exit",
-    }
-    return mapping.get(r, r)  # fallback to raw normalized value
-
-#Display result translation function
-def display_result(db_result: str, lang: str) -> str:
-    """Return translated display text for result."""
-    key = normalize_result_key(db_result)
-
-    tt = TRANSLATIONS.get(lang, TRANSLATIONS.get("el", {}))
-    base = TRANSLATIONS.get("el", {})
-
-    key_to_label = {
-        "completed": "result_completed",
-        "win": "result_win",
-        "lose": "result_lose",
-        "game_over": "result_game_over",
-        "exit": "result_exit",
-    }
-
-    label_key = key_to_label.get(key)
-    if not label_key:
-        return db_result  # unknown -> show raw
-
-    return tt.get(label_key) or base.get(label_key) or db_result
-#Mapping game names for translation
-def normalize_game_key(name: str) -> str:
-    """Map DB game_name (Greek/English) -> canonical key."""
-    if not name:
-        return ""
-
-    name = name.strip()
-
-    mapping = {
-        "Άσκηση 1": "exercise_1",
-        "Άσκηση 2": "exercise_2",
-        "Άσκηση 3": "exercise_3",
-        "Άσκηση 4": "exercise_4",
-        "Exercise 1": "exercise_1",
-        "Exercise 2": "exercise_2",
-        "Exercise 3": "exercise_3",
-        "Exercise 4": "exercise_4",
-    }
-    return mapping.get(name, name)  # fallback: keep as-is if unknown
-
-
-def display_game_name(db_game_name: str, lang: str) -> str:
-    """Return translated display name for a game based on current language."""
-    key = normalize_game_key(db_game_name)
-
-    # use your TRANSLATIONS dict to get label
-    # make sure these keys exist in translations.py:
-    # exercise_1_title, exercise_2_title, ...
-    tt = TRANSLATIONS.get(lang, TRANSLATIONS.get("el", {}))
-    base = TRANSLATIONS.get("el", {})
-
-    key_to_label = {
-        "exercise_1": "exercise_1_title",
-        "exercise_2": "exercise_2_title",
-        "exercise_3": "exercise_3_title",
-        "exercise_4": "exercise_4_title",
-    }
-
-    label_key = key_to_label.get(key)
-    if not label_key:
-        return db_game_name  # unknown -> show raw
-
-    return tt.get(label_key) or base.get(label_key) or db_game_name
+    return catalog(lang), lang
 
 @app.context_processor
 def inject_translations():
@@ -430,10 +326,7 @@ def forgot_password():
 
     email = request.form['email'].strip()
 
-    cur = mysql.connection.cursor()
-    cur.execute("SELECT id FROM users WHERE email=%s", (email,))
-    user = cur.fetchone()
-    cur.close()
+    user = get_user(email=email)
 
     if not user:
         flash("Το email δεν βρέθηκε.")
@@ -441,7 +334,7 @@ def forgot_password():
 
     # ✅ language from db
     lang = get_user_lang_by_email(email)
-    tt = TRANSLATIONS.get(lang, TRANSLATIONS["el"])
+    tt = catalog(lang)
 
     token = s.dumps(email, salt='password-reset')
     reset_link = url_for('reset_password', token=token, _external=True)
@@ -485,7 +378,7 @@ def reset_password(token):
 
     # ✅ language from db for emails
     lang = get_user_lang_by_email(email)
-    tt = TRANSLATIONS.get(lang, TRANSLATIONS["el"])
+    tt = catalog(lang)
 
     if request.method == 'POST':
         new_pass = request.form['password']
@@ -495,12 +388,13 @@ def reset_password(token):
             flash(tt.get("passwords_mismatch", "Passwords do not match."))
             return redirect(url_for('reset_password', token=token))
 
-        hashed = bcrypt.hashpw(new_pass.encode('utf-8'), bcrypt.gensalt()).decode("utf-8")
+        hashed = hash_password(new_pass)
 
         cur = mysql.connection.cursor()
         cur.execute("UPDATE users SET password=%s WHERE email=%s", (hashed, email))
         mysql.connection.commit()
         cur.close()
+        invalidate_user(email=email)
 
         flash(tt.get("password_reset_success", "Password changed successfully. You can log in."))
         return redirect(url_for('index'))
@@ -512,28 +406,28 @@ def edit_profile():
     if "username" not in session:
         return redirect(url_for("index"))
 
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-    cursor.execute("SELECT * FROM users WHERE username=%s", (session['username'],))
-    user = cursor.fetchone()
+    user = get_user(username=session['username'])
 
     if request.method == "POST":
+        cursor = mysql.connection.cursor()
         new_username = request.form.get("new_username")
         old_username = user['username']   # ⬅️ 
 
-        # 1️⃣ update users table
-        cursor.execute(
-            "UPDATE users SET username=%s WHERE id=%s",
-            (new_username, user['id'])
-        )
-
-        # 2️⃣ update stats
-        cursor.execute(
-            "UPDATE game_statistics SET username=%s WHERE username=%s",
-            (new_username, old_username)
-        )
-
-        mysql.connection.commit()
-        cursor.close()
+        # 1️⃣ update users table (stats are linked by user_id, nothing else to rewrite)
+        try:
+            cursor.execute(
+                "UPDATE users SET username=%s WHERE id=%s",
+                (new_username, user['id'])
+            )
+            mysql.connection.commit()
+        except psycopg2.IntegrityError:
+            # users_username_unique_idx: another account has this username
+            mysql.connection.rollback()
+            tt, _ = get_t_dict()
+            return render_template("edit_profile.html", user=user, error=tt["username_taken"]), 409
+        finally:
+            cursor.close()
+        invalidate_user(user_id=user['id'], username=old_username)
 
         # update session
         session['username'] = new_username
@@ -541,7 +435,6 @@ def edit_profile():
         return redirect(url_for("profile"))
 
 
-    cursor.close()
     return render_template("edit_profile.html", user=user)
 
 
@@ -550,11 +443,10 @@ def change_password():
     if "username" not in session:
         return redirect(url_for('index'))
 
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-    cursor.execute("SELECT * FROM users WHERE username=%s", (session['username'],))
-    user = cursor.fetchone()
-
     if request.method == "POST":
+        # password checks always read the current hash, never the cache
+        user = get_user(username=session['username'], fresh=True)
+
         old_pw = request.form.get("old_password")
         new_pw = request.form.get("new_password")
         confirm_pw = request.form.get("confirm_password")
@@ -563,10 +455,10 @@ def change_password():
         lang = (user.get("language") or "el")
         if lang not in ("el", "en"):
             lang = "el"
-        tt = TRANSLATIONS.get(lang, TRANSLATIONS["el"])
+        tt = catalog(lang)
 
         #  check old password
-        if not bcrypt.checkpw(old_pw.encode(), user['password'].encode()):
+        if not check_password(old_pw, user['password']):
             return f"""
             <script>
                 alert("{tt.get('old_password_wrong','Wrong old password!')}");
@@ -593,15 +485,18 @@ def change_password():
             """
 
         # 4️⃣ Hash νέου κωδικού
-        hashed_pw = bcrypt.hashpw(new_pw.encode(), bcrypt.gensalt()).decode()
+        hashed_pw = hash_password(new_pw)
 
+        cursor = mysql.connection.cursor()
         cursor.execute(
             "UPDATE users SET password=%s WHERE id=%s",
             (hashed_pw, user['id'])
         )
         mysql.connection.commit()
+        cursor.close()
+        invalidate_user(user_id=user['id'])
 
-        # ✅ Send email async (no request blocking)
+        # ✅ Queued, delivered by the email_service threads (no request blocking)
         send_email(
         to_email=user["email"],
         subject=tt.get("password_changed_subject", "🔐 Password changed"),
@@ -613,8 +508,6 @@ def change_password():
 
 
 
-        cursor.close()
-
         # 6️⃣ Logout + μήνυμα
         return f"""
         <script>
@@ -623,7 +516,6 @@ def change_password():
         </script>
         """
 
-    cursor.close()
     return render_template('change_password.html')
 
 @app.route('/delete_account', methods=['POST'])
@@ -634,21 +526,28 @@ def delete_account():
     username = session['username']
 
     # 🌍 πάρε γλώσσα χρήστη από DB
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-    cursor.execute("SELECT language FROM users WHERE username=%s", (username,))
-    user = cursor.fetchone()
+    user = get_user(username=username)
 
     lang = (user.get("language") if user else None) or "el"
     if lang not in ("el", "en"):
         lang = "el"
-    tt = TRANSLATIONS.get(lang, TRANSLATIONS["el"])
+    tt = catalog(lang)
 
-    # ❌ διαγραφή λογαριασμού
-    cursor.execute("DELETE FROM game_statistics WHERE username = %s", (username,))
-    cursor.execute("DELETE FROM users WHERE username = %s", (username,))
+    # ❌ διαγραφή λογαριασμού: hidden right away (username/email free again, no login),
+    # the stats are deleted in chunks by the purge_account job
+    user_id = session['user_id']
+    cursor = mysql.connection.cursor()
+    cursor.execute("""
+        UPDATE users
+        SET deleted_at = NOW(), username = %s, email = %s, password = '!',
+            reminder = 'no', next_reminder_at = NULL
+        WHERE id = %s AND deleted_at IS NULL
+    """, (f"deleted:{user_id}", f"deleted:{user_id}", user_id))
+    enqueue_job(cursor, "purge_account", {"user_id": user_id}, user_id=user_id)
     mysql.connection.commit()
 
     cursor.close()
+    invalidate_user(user_id=user_id, username=username, email=user["email"] if user else None)
 
     session.clear()
 
@@ -672,6 +571,7 @@ def change_theme():
                    (new_theme, session['username']))
     mysql.connection.commit()
     cursor.close()
+    invalidate_user(username=session['username'])
     session['theme'] = new_theme
 
 
@@ -701,6 +601,7 @@ def api_theme():
     )
     mysql.connection.commit()
     cursor.close()
+    invalidate_user(username=session["username"])
 
     session["theme"] = new_theme  
 
@@ -726,6 +627,7 @@ def upload_avatar():
 
     mysql.connection.commit()
     cursor.close()
+    invalidate_user(username=session['username'])
 
     return redirect(url_for('profile'))
 
@@ -733,6 +635,32 @@ def upload_avatar():
 # -------------------------------------------------------------------
 # 4️⃣ Check/Sing up user/Login
 # -------------------------------------------------------------------
+# email match wins; LIMIT 1 stops before the username probe when the email is found.
+# Explicit columns (not *) so the statement cache can PREPARE it.
+LOGIN_LOOKUP_SQL = """
+    (SELECT id, email, username, password, language, profile_completed FROM users WHERE email = %s)
+    UNION ALL
+    (SELECT id, email, username, password, language, profile_completed FROM users WHERE username = %s)
+    LIMIT 1
+"""
+
+# one row: the new id, or (NULL, 'email' / 'username') for the unique index that refused it
+REGISTER_SQL = """
+    WITH ins AS (
+        INSERT INTO users (username, email, password, language, profile_completed, reminder)
+        VALUES (%s, %s, %s, %s, FALSE, 'no')
+        ON CONFLICT DO NOTHING
+        RETURNING id
+    )
+    SELECT id, NULL::text AS conflict FROM ins
+    UNION ALL
+    (SELECT NULL::bigint, 'email' FROM users WHERE email = %s AND NOT EXISTS (SELECT 1 FROM ins))
+    UNION ALL
+    (SELECT NULL::bigint, 'username' FROM users WHERE username = %s AND NOT EXISTS (SELECT 1 FROM ins))
+    LIMIT 1
+"""
+
+
 @app.route('/check_user', methods=['POST'])
 def check_user():
     data = request.get_json() or {}
@@ -743,14 +671,16 @@ def check_user():
     if not username or not email or not password:
         return "Συμπλήρωσε όλα τα πεδία!", 400
 
+    # ⛔ too many attempts from this IP or for this account: no DB, no bcrypt
+    wait = max(login_ip_limiter.hit(f"ip:{client_ip()}"),
+               login_account_limiter.hit(*login_account_keys(email, username)))
+    if wait:
+        return "Πολλές προσπάθειες σύνδεσης, δοκίμασε ξανά σε λίγο.", 429, {"Retry-After": str(math.ceil(wait))}
+
     cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
 
-    # 1) Ψάξε πρώτα με email (πιο σωστό για login)
-    # 1) Login lookup: με email ή με username
-    cursor.execute(
-    "SELECT * FROM users WHERE email=%s OR username=%s",
-    (email, username)
-)
+    # 1) Login lookup: με email ή με username (email first, one indexed probe each)
+    cursor.execute(LOGIN_LOOKUP_SQL, (email, username))
     user = cursor.fetchone()
 
 
@@ -758,7 +688,19 @@ def check_user():
     # ✅ LOGIN (υπάρχει user με αυτό το email)
     # ------------------------
     if user:
-        if bcrypt.checkpw(password.encode('utf-8'), user['password'].encode('utf-8')):
+        if check_password(password, user['password']):
+            # only the account that authenticated: the submitted username may be someone else's
+            login_account_limiter.reset(*login_account_keys(user['email'], user['username']))
+
+            # BCRYPT_ROUNDS changed since this hash was made: store a new one (once)
+            if needs_rehash(user['password']):
+                cursor.execute(
+                    "UPDATE users SET password=%s WHERE id=%s AND password=%s",
+                    (hash_password(password), user['id'], user['password'])
+                )
+                mysql.connection.commit()
+                invalidate_user(user_id=user['id'])
+
             session['user_id'] = user['id']
             session['username'] = user['username']
 
@@ -776,6 +718,7 @@ def check_user():
             if db_lang != lang:
                 cursor.execute("UPDATE users SET language=%s WHERE id=%s", (lang, user['id']))
                 mysql.connection.commit()
+                invalidate_user(user_id=user['id'])
 
             cursor.close()
             return "menu" if user.get('profile_completed') else "steps"
@@ -788,48 +731,37 @@ def check_user():
     # ✅ REGISTER 
     # ------------------------
 
-    # 2) Μην αφήνεις ίδιο username να ξαναγραφτεί
-    # the email is already on database
-    cursor.execute("SELECT id FROM users WHERE email=%s", (email,))
-    existing_email = cursor.fetchone()
-    if existing_email:
-      cursor.close()
-      return "Το email υπάρχει ήδη!", 409
-
+    # 2) Hash password
+    hashed = hash_password(password)
 
-    cursor.execute("SELECT id FROM users WHERE username=%s", (username,))
-    existing_username = cursor.fetchone()
-    if existing_username:
-       cursor.close()
-       return "Το username υπάρχει ήδη!", 409
-
-
-    # 3) Hash password
-    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-    # 4) lang from session (from welcome page)
+    # 3) lang from session (from welcome page)
     lang = session.get('lang') or 'el'
     if lang not in ('el', 'en'):
         lang = 'el'
 
+    # 4) insert; the unique indexes on email/username decide, in the same round trip
     try:
-        cursor.execute("""
-            INSERT INTO users (username, email, password, language, profile_completed, reminder)
-            VALUES (%s, %s, %s, %s, FALSE, 'no')
-        """, (username, email, hashed, lang))
-
+        cursor.execute(REGISTER_SQL, (username, email, hashed, lang, email, username))
+        row = cursor.fetchone()
         mysql.connection.commit()
-
     except Exception as e:
         mysql.connection.rollback()
         print("❌ REGISTER ERROR:", e)
         cursor.close()
         return "Σφάλμα εγγραφής", 500
+    cursor.close()
+
+    if row is None or row['id'] is None:
+        # registered by someone else between the lookup and the insert
+        if row is not None and row['conflict'] == 'username':
+            return "Το username υπάρχει ήδη!", 409
+        return "Το email υπάρχει ήδη!", 409
+    new_user_id = row['id']
 
 
     # welcome email,email for successful sign up
     try:
-        tt = TRANSLATIONS.get(lang, TRANSLATIONS["el"])
+        tt = catalog(lang)
 
         send_email(
         to_email=email,
@@ -841,18 +773,14 @@ def check_user():
     """
 )
 
-        print(f"✅ Welcome email sent to {email}")
+        print(f"✅ Welcome email queued for {email}")
     except Exception as e:
         print("⚠️ Welcome email error:", e)
 
     
 
-    # 6) take id ->login
-    cursor.execute("SELECT id FROM users WHERE email=%s", (email,))
-    new_user = cursor.fetchone()
-    cursor.close()
-
-    session['user_id'] = new_user['id']
+    # 6) login
+    session['user_id'] = new_user_id
     session['username'] = username
     session['lang'] = lang
     session.permanent = True
@@ -880,6 +808,7 @@ def save_step1():
     cursor.execute("UPDATE users SET age=%s  WHERE id=%s", (age,  session['user_id']))
     mysql.connection.commit()
     cursor.close()
+    invalidate_user(user_id=session['user_id'])
     return redirect(url_for('sign_up_steps', step_number=2))
 
 
@@ -890,8 +819,10 @@ def save_step2():
     exercise_time = request.form.get('exercise_time')
     cursor = mysql.connection.cursor()
     cursor.execute("UPDATE users SET exercise_time=%s WHERE id=%s", (exercise_time, session['user_id']))
+    reschedule(cursor, session['user_id'])
     mysql.connection.commit()
     cursor.close()
+    invalidate_user(user_id=session['user_id'])
     return redirect(url_for('sign_up_steps', step_number=3))
 
 
@@ -916,9 +847,11 @@ def save_step3():
         SET reminder=%s, exercise_time=%s 
         WHERE id=%s
     """, (reminder, exercise_time, session['user_id']))
+    reschedule(cursor, session['user_id'])
 
     mysql.connection.commit()
     cursor.close()
+    invalidate_user(user_id=session['user_id'])
 
     return redirect(url_for('sign_up_steps', step_number=4))
 
@@ -949,6 +882,7 @@ def complete_profile():
     """, (stage, type_, frequency, duration, session['user_id']))
     mysql.connection.commit()
     cursor.close()
+    invalidate_user(user_id=session['user_id'])
 
     return redirect(url_for('menu'))
 
@@ -957,58 +891,85 @@ def complete_profile():
 # Scheduler from email(Scheduler)
 # -------------------------------------------------------------------
 def send_daily_reminders():
+    # only the due rows (indexed); each claim also moves them to their next day
+    # and logs the delivery, so `send` is false for anything already sent today
+    users = []
+    skipped = 0
     with app.app_context():
-        cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-        cursor.execute("""
-            SELECT username, email, exercise_time, language
-            FROM users
-            WHERE reminder = 'yes' AND exercise_time IS NOT NULL
-        """)
-        users = cursor.fetchall()
-        cursor.close()
-
-        now = datetime.now(pytz.timezone('Europe/Athens')).strftime("%H:%M")
-
-        for user in users:
-            raw_time = str(user['exercise_time']).strip()
-
-            # Μετατροπή "20:30" ή "20:30:00" σε "20:30"
-            if ":" in raw_time:
-                parts = raw_time.split(":")
-                ex_time_str = f"{parts[0].zfill(2)}:{parts[1].zfill(2)}"
-            else:
-                ex_time_str = raw_time
-
-            if ex_time_str == now:
-                # ✅ language από DB
-                lang = (user.get('language') or 'el')
-                if lang not in ('el', 'en'):
-                    lang = 'el'
-                tt = TRANSLATIONS.get(lang, TRANSLATIONS['el'])
+        while True:
+            cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+            batch = claim_due(cursor, CLAIM_BATCH)
+            mysql.connection.commit()
+            cursor.close()
+            for user in batch:
+                if user['send']:
+                    users.append(user)
+                else:
+                    skipped += 1
+            if len(batch) < CLAIM_BATCH:
+                break
+    if skipped:
+        # reminder off, already sent today, or missed by more than REMINDER_MAX_LATE
+        print(f"⚠️ Skipped {skipped} due reminders")
+
+    # ✅ one message per language, sent to all its users in batches (Brevo messageVersions)
+    by_lang = {}
+    for user in users:
+        lang = (user.get('language') or 'el')
+        if lang not in ('el', 'en'):
+            lang = 'el'
+        by_lang.setdefault(lang, []).append(
+            {"email": user["email"], "params": {"username": user["username"]}}
+        )
 
-                try:
-                    send_email(
-                    to_email=user["email"],
-                    subject=tt['email_reminder_subject'],
-                    html_content=f"""
-                   <p>{tt['email_hi']} {user['username']}!</p>
+    for lang, recipients in by_lang.items():
+        tt = catalog(lang)
+        try:
+            send_batch(
+                subject=tt['email_reminder_subject'],
+                html_content=f"""
+                   <p>{tt['email_hi']} {{{{ params.username }}}}!</p>
                    <p>{tt['email_reminder_body']}</p>
-    """
-)
+    """,
+                recipients=recipients,
+            )
+            print(f"✅ Reminder emails queued for {len(recipients)} users ({lang})")
+        except Exception as e:
+            print("⚠️ Reminder email error:", e)
 
-                    print(f"✅ Reminder email sent to {user['username']} ({lang})")
-                except Exception as e:
-                    print("⚠️ Reminder email error:", e)
+
+def prune_reminder_deliveries():
+    with app.app_context():
+        cursor = mysql.connection.cursor()
+        prune_deliveries(cursor)
+        mysql.connection.commit()
+        cursor.close()
 
 
 # ---  Scheduler ---
 scheduler = BackgroundScheduler(timezone='Europe/Athens')
 scheduler.add_job(func=send_daily_reminders, trigger='cron', minute='*')
+scheduler.add_job(func=prune_reminder_deliveries, trigger='cron', hour=4, minute=30)
+
+# ✅ Every process (gunicorn worker, node) starts the scheduler paused; only the one
+# holding the advisory lock resumes it, another takes over when that one dies
+SCHEDULER_LOCK_KEY = 827_302
+scheduler_leader = LeaderElection(
+    DATABASE_URL, SCHEDULER_LOCK_KEY,
+    on_elected=scheduler.resume, on_deposed=scheduler.pause,
+    interval=int(os.environ.get("SCHEDULER_LEADER_INTERVAL", 10)), name="scheduler",
+)
 
-# ✅ Start scheduler only once (avoid Flask reloader double-start on Windows)
 # Start scheduler in production (Render/Gunicorn)
 if os.environ.get("RENDER") or os.environ.get("ENV") == "production":
-    scheduler.start()
+    scheduler.start(paused=True)
+    scheduler_leader.start()
+
+# ✅ Background jobs (account purges, rollup rebuilds) run in every web worker by default,
+# so a deploy with only `gunicorn app:app` still processes them. With a separate
+# `python -m jobs worker` deployed, set JOBS_IN_PROCESS=0 to keep them out of the web tier.
+if os.environ.get("JOBS_IN_PROCESS", "1").lower() not in ("0", "false", "no"):
+    start_workers(DATABASE_URL, threads=int(os.environ.get("JOBS_THREADS", 2)))
 
 
 
@@ -1028,10 +989,15 @@ def update_reminder():
         UPDATE users
         SET reminder=%s, exercise_time=%s
         WHERE username=%s
+        RETURNING id
     """, (reminder, exercise_time, session['username']))
+    row = cursor.fetchone()
+    if row:
+        reschedule(cursor, row[0])
 
     mysql.connection.commit()
     cursor.close()
+    invalidate_user(username=session['username'])
 
     return """
    <script>
@@ -1059,42 +1025,115 @@ def dashboard():
     if 'username' not in session:
         return redirect(url_for('index'))
 
-    username = session['username']
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    # 📊 the table is filled by the page itself, one /api/stats page at a time
+    return render_template('dashboard.html', username=session['username'])
 
-    cursor.execute("""
-        SELECT 
-            game_name,
-            COUNT(*) AS plays,
-            SUM(score) AS total_score,
-            AVG(score) AS avg_score,
-            SUM(time_seconds) AS total_time
-        FROM game_statistics
-        WHERE username = %s
-        GROUP BY game_name
-        ORDER BY game_name;
-    """, (username,))
 
-    stats = cursor.fetchall()
-    cursor.close()
 
-    total_plays = sum(row['plays'] for row in stats)
-    total_score = sum(row['total_score'] or 0 for row in stats)
-    total_time = sum(row['total_time'] or 0 for row in stats)
 
-    return render_template('dashboard.html',
-                           username=username,
-                           stats=stats,
-                           total_plays=total_plays,
-                           total_score=total_score,
-                           total_time=total_time)
+# -------------------------------------------------------------------
+# add stats 
+# -------------------------------------------------------------------
+STATS_BATCH_MAX = int(os.environ.get("STATS_BATCH_MAX", 500))
+IDEMPOTENCY_KEY_MAX = 64
+
+# one statement for the whole batch: age/user_id come from a single join on users,
+# rows whose idempotency_key this user already stored are skipped (retried batches)
+ADD_STATS_SQL = """
+    WITH v (idempotency_key, username, age, game_name, game_key, score, time_seconds, result, result_key) AS (
+        VALUES %s
+    ),
+    ins AS (
+        INSERT INTO game_statistics (user_id, username, age, game_name, game_key, score, time_seconds,
+                                     result, result_key, idempotency_key, created_at)
+        SELECT u.id, CASE WHEN u.id IS NULL THEN v.username END, COALESCE(u.age, v.age),
+               v.game_name, v.game_key, v.score, v.time_seconds, v.result, v.result_key, v.idempotency_key,
+               (NOW() AT TIME ZONE 'UTC')
+        FROM v
+        LEFT JOIN LATERAL (
+            SELECT id, age FROM users WHERE users.username = v.username ORDER BY id LIMIT 1
+        ) u ON TRUE
+        ON CONFLICT ((COALESCE(user_id, 0)), idempotency_key) WHERE idempotency_key IS NOT NULL DO NOTHING
+        RETURNING id, user_id, game_key, score, time_seconds, created_at, idempotency_key
+    ),
+    daily AS (
+        INSERT INTO game_stats_daily AS d (user_id, game_key, day, plays, sum_score, scored_plays, sum_time, last_played)
+        SELECT user_id, game_key, created_at::date, COUNT(*),
+               COALESCE(SUM(score), 0), COUNT(score), COALESCE(SUM(time_seconds), 0), MAX(created_at)
+        FROM ins
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id, game_key, created_at::date
+        ON CONFLICT (user_id, game_key, day) DO UPDATE SET
+            plays = d.plays + EXCLUDED.plays,
+            sum_score = d.sum_score + EXCLUDED.sum_score,
+            scored_plays = d.scored_plays + EXCLUDED.scored_plays,
+            sum_time = d.sum_time + EXCLUDED.sum_time,
+            last_played = GREATEST(d.last_played, EXCLUDED.last_played)
+    )
+    SELECT idempotency_key,
+           CASE WHEN user_id IS NOT NULL THEN pg_notify('stats_events', json_build_object(
+               'user_id', user_id, 'id', id, 'game_key', game_key, 'score', score,
+               'time_seconds', time_seconds, 'created_at', created_at)::text) END
+    FROM ins
+"""
+ADD_STATS_TEMPLATE = "(%s, %s, %s::int, %s, %s::game_key_t, %s::float8, %s::float8, %s, %s::result_key_t)"
 
 
+def row_from_stat(item, username):
+    """Positional row for ADD_STATS_SQL from one posted result."""
+    return (
+        item.get("idempotency_key"), username, item.get("age"),
+        item.get("game_name"), game_key_for(item.get("game_name")),
+        item.get("score"), item.get("time_seconds"),
+        item.get("result"), result_key_for(item.get("result")),
+    )
+
+
+def insert_stats_rows(rows):
+    """Insert rows with one statement/commit; returns the idempotency keys that were new."""
+    cursor = mysql.connection.cursor()
+    try:
+        inserted = psycopg2.extras.execute_values(
+            cursor, ADD_STATS_SQL, rows, template=ADD_STATS_TEMPLATE, page_size=len(rows), fetch=True,
+        )
+        mysql.connection.commit()
+    except Exception:
+        mysql.connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return [row[0] for row in inserted]
+
+
+def flush_stats_rows(rows):
+    """Write-behind flush (runs in the buffer thread, outside any request)."""
+    try:
+        try:
+            insert_stats_rows(rows)
+        except psycopg2.DataError:
+            # one bad row must not sink the whole batch: retry them one by one
+            for row in rows:
+                try:
+                    insert_stats_rows([row])
+                except psycopg2.DataError as e:
+                    print(f"⚠️ write-behind: skipped invalid stat for {row[1]}: {e.diag.message_primary}")
+    finally:
+        mysql.connection.release()
+
+
+# ✅ optional write-behind for /add_stat: acknowledge fast, insert in batches
+stats_writer = None
+if os.environ.get("STATS_WRITE_BEHIND", "").lower() in ("1", "true", "yes"):
+    stats_writer = WriteBehindBuffer(
+        flush_stats_rows,
+        max_rows=int(os.environ.get("STATS_FLUSH_ROWS", 200)),
+        interval_ms=int(os.environ.get("STATS_FLUSH_MS", 200)),
+        max_queue=int(os.environ.get("STATS_QUEUE_MAX", 5000)),
+        put_timeout=float(os.environ.get("STATS_QUEUE_TIMEOUT", 2)),
+    )
+    atexit.register(stats_writer.close)
 
 
-# -------------------------------------------------------------------
-# add stats 
-# -------------------------------------------------------------------
 @app.route('/add_stat', methods=['POST'])
 def add_stat():
     data = request.get_json()
@@ -1104,29 +1143,86 @@ def add_stat():
     if not username:
         return jsonify({"error": "Unauthorized – no username provided"}), 401
 
-    game_name = data.get('game_name')
-    score = data.get('score')
-    time_seconds = data.get('time_seconds')
-    result = data.get('result')
-    age = data.get('age')
+    # ✅ user_id/age are resolved by the insert itself (join on users), no lookup here
+    row = row_from_stat(data, username)
 
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-    cursor.execute("SELECT age FROM users WHERE username = %s", (username,))
-    user = cursor.fetchone()
-    db_age = user['age'] if user else age
-
-    cursor.execute("""
-        INSERT INTO game_statistics (username, age, game_name, score, time_seconds, result, created_at)
-        VALUES (%s, %s, %s, %s, %s, %s, UTC_TIMESTAMP())
-    """, (username, db_age, game_name, score, time_seconds, result))
-    mysql.connection.commit()
-    cursor.close()
-
-    print(f"📊 Στατιστικά αποθηκεύτηκαν για τον {username} ({game_name})")
+    if stats_writer is not None:
+        try:
+            stats_writer.submit(row)
+        except QueueFull:
+            response = jsonify({"error": "stats queue is full, retry later"})
+            response.headers["Retry-After"] = "2"
+            return response, 503
+        return jsonify({"message": "✅ Τα στατιστικά αποθηκεύτηκαν επιτυχώς!"}), 202
 
+    try:
+        insert_stats_rows([row])
+    except psycopg2.DataError as e:
+        return jsonify({"error": f"invalid stat: {e.diag.message_primary or e}"}), 400
     return jsonify({"message": "✅ Τα στατιστικά αποθηκεύτηκαν επιτυχώς!"}), 200
 
 
+@app.route('/add_stats', methods=['POST'])
+def add_stats():
+    """
+    Batch version of /add_stat: {"username": ..., "items": [{..., "idempotency_key": ...}, ...]}.
+    Every item gets its own status (accepted / duplicate / rejected), one bad item
+    never costs the others; the outbox drops exactly the items listed in `results`.
+    """
+    data = request.get_json(silent=True)
+    if isinstance(data, list):
+        data = {"items": data}
+    if not isinstance(data, dict) or not isinstance(data.get("items"), list):
+        return jsonify({"error": "expected {\"items\": [...]}"}), 400
+
+    items = data["items"]
+    if len(items) > STATS_BATCH_MAX:
+        return jsonify({"error": f"at most {STATS_BATCH_MAX} items per batch"}), 413
+
+    batch_username = data.get("username") or session.get("username")
+    results = []
+    rows = []
+    seen = set()
+    for item in items:
+        key = item.get("idempotency_key") if isinstance(item, dict) else None
+        if not isinstance(key, str) or not key or len(key) > IDEMPOTENCY_KEY_MAX:
+            results.append({"idempotency_key": key if isinstance(key, str) else None, "status": "rejected",
+                            "error": "every item needs an idempotency_key (max 64 chars)"})
+            continue
+        username = item.get("username") or batch_username
+        if not username:
+            # not logged in: nothing is settled, the client keeps the items for later
+            return jsonify({"error": "Unauthorized – no username provided"}), 401
+        result = {"idempotency_key": key, "status": "duplicate"}
+        results.append(result)
+        if key in seen:
+            continue
+        seen.add(key)
+        rows.append((result, row_from_stat(item, username)))
+
+    if rows:
+        try:
+            inserted_keys = set(insert_stats_rows([row for _, row in rows]))
+        except (psycopg2.DataError, psycopg2.IntegrityError):
+            # some value the columns don't take: the same insert row by row, the bad ones rejected
+            inserted_keys = set()
+            for result, row in rows:
+                try:
+                    inserted_keys.update(insert_stats_rows([row]))
+                except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                    result.update(status="rejected", error=f"invalid item: {e.diag.message_primary or e}")
+        # a key sent twice in one batch: the first copy carries the insert, the rest stay duplicates
+        for result, row in rows:
+            if row[0] in inserted_keys:
+                result["status"] = "accepted"
+
+    return jsonify({
+        "results": results,
+        "inserted": sum(1 for r in results if r["status"] == "accepted"),
+        "duplicates": [r["idempotency_key"] for r in results if r["status"] == "duplicate"],
+        "rejected": sum(1 for r in results if r["status"] == "rejected"),
+    }), 200
+
 
 # -------------------------------------------------------------------
 # Start exercises
@@ -1136,10 +1232,7 @@ def start_exercise(exercise_num):
     if 'username' not in session:
         return redirect(url_for('index'))
 
-    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-    cursor.execute("SELECT age, language FROM users WHERE username = %s", (session['username'],))
-    user = cursor.fetchone()
-    cursor.close()
+    user = get_user(username=session['username'])
 
     username = session['username']
     age = user['age'] if user else 0
@@ -1205,27 +1298,141 @@ def exercise_4():
 # -------------------------------------------------------------------
 # 12️⃣ API for live add stats
 # -------------------------------------------------------------------
+STATS_PAGE_SIZE = 50
+STATS_PAGE_MAX = 200
+
+
+def encode_stats_cursor(created_at, row_id):
+    """Opaque `before` value for the next page: position (created_at, id) of the last row."""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_stats_cursor(value):
+    """(created_at, id) from a `before` value; ValueError when it is not one of ours."""
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"bad cursor: {value!r}") from e
+
+
+def decode_since_cursor(value):
+    """Row id from a `since` value (`latest`); older pages may still send a `before`-style cursor."""
+    if value.isdigit():
+        return int(value)
+    return decode_stats_cursor(value)[1]
+
+
+def stats_marker(user_id):
+    """The user's last-write marker: highest game_statistics id (0 if none) and today's date."""
+    # MAX(id), not the newest created_at: created_at is the inserting transaction's
+    # start, so a row that commits late can be "older" than one already seen
+    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    cursor.execute("""
+        SELECT CURRENT_DATE AS day,
+               COALESCE((SELECT MAX(id) FROM game_statistics WHERE user_id = %s), 0) AS last_id
+    """, (user_id,))
+    row = cursor.fetchone()
+    cursor.close()
+    return row["last_id"], row["day"]
+
+
+def stats_etag(endpoint, *parts, marker=None):
+    """Strong ETag for a stats response; changes whenever the user adds a stat
+    (or the language / username / day the response depends on changes)."""
+    last_id, day = marker or stats_marker(session['user_id'])
+    raw = "|".join(str(p) for p in (endpoint, last_id, day, get_lang(), session['username'], *parts))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def not_modified(etag):
+    """304 for a poll whose If-None-Match already has `etag`, else None."""
+    if etag in request.if_none_match:
+        return with_etag(app.response_class(status=304), etag)
+    return None
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    # private: per-user data; no-cache: the browser must revalidate every poll
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
 @app.route('/api/stats')
 def api_stats():
     if 'username' not in session:
-        return jsonify([])
+        return jsonify({"items": [], "next_before": None, "latest": None, "total_estimate": 0})
+
+    try:
+        limit = min(max(int(request.args.get("limit", STATS_PAGE_SIZE)), 1), STATS_PAGE_MAX)
+    except ValueError:
+        return jsonify({"error": "limit must be a number"}), 400
+
+    # ⏩ keyset pagination on (created_at, id): every page is one index range scan,
+    # no OFFSET, and new rows arriving at the top do not shift older pages.
+    # before=<cursor> -> older rows, since=<id> -> only rows with a higher id (new
+    # rows get higher ids; a late commit can still carry an earlier created_at)
+    before = request.args.get("before")
+    since = request.args.get("since")
+    position, order = "", "ORDER BY s.created_at DESC, s.id DESC"
+    args = [session['username'], get_lang(), get_lang(), session['user_id']]
+    try:
+        if before:
+            args += list(decode_stats_cursor(before))
+            position = "AND (s.created_at, s.id) < (%s, %s)"
+        elif since:
+            args.append(decode_since_cursor(since))
+            position, order = "AND s.id > %s", "ORDER BY s.id ASC"
+    except ValueError:
+        return jsonify({"error": "invalid cursor"}), 400
+
+    marker = stats_marker(session['user_id'])
+    etag = stats_etag("stats", limit, before, since, marker=marker)
+    cached = not_modified(etag)
+    if cached:
+        return cached
 
     cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-    cursor.execute("""
-        SELECT username, age, game_name, score, time_seconds, result, created_at
-        FROM game_statistics
-        WHERE username = %s
-        ORDER BY created_at DESC
-    """, (session['username'],))
+    cursor.execute(f"""
+        SELECT s.id, %s AS username, s.age,
+               CASE WHEN s.game_key IS NULL OR s.game_key = 'other' THEN s.game_name ELSE gl.label END AS game_name,
+               s.score, s.time_seconds,
+               CASE WHEN s.result_key IS NULL OR s.result_key = 'other' THEN s.result ELSE rl.label END AS result,
+               s.created_at
+        FROM game_statistics s
+        LEFT JOIN game_labels gl ON gl.game_key = s.game_key AND gl.lang = %s
+        LEFT JOIN result_labels rl ON rl.result_key = s.result_key AND rl.lang = %s
+        WHERE s.user_id = %s {position}
+        {order}
+        LIMIT %s
+    """, args + [limit + 1])
     stats = cursor.fetchall()
+
+    # 🔢 the rollup already counts every play, so the total costs one small index scan
+    total_estimate = None
+    if not before and not since:
+        cursor.execute("SELECT COALESCE(SUM(plays), 0) AS plays FROM game_stats_daily WHERE user_id = %s",
+                       (session['user_id'],))
+        total_estimate = int(cursor.fetchone()["plays"])
     cursor.close()
 
-    lang = session.get("lang", "el")
+    more = len(stats) > limit
+    stats = stats[:limit]
+    next_before = None
+    if since:
+        # lowest ids first up to `limit`; `latest` moves forward and has_more asks for another poll
+        stats.reverse()
+        latest = str(stats[0]["id"]) if stats else since
+    else:
+        if more:
+            next_before = encode_stats_cursor(stats[-1]["created_at"], stats[-1]["id"])
+        # the first page starts polling from the user's highest id, wherever that row sorts
+        latest = str(marker[0]) if marker[0] and not before else None
 
     for row in stats:
-        row["game_name"] = display_game_name(row.get("game_name"), lang)
-        row["result"] = display_result(row.get("result"), lang)
-
         dt = row.get("created_at")
         if isinstance(dt, datetime):
             # DB returns naive datetime -> treat as UTC (because we store with UTC_TIMESTAMP())
@@ -1236,7 +1443,234 @@ def api_stats():
             # fallback: keep as-is
             row["created_at"] = str(dt)
 
-    return jsonify(stats)
+    return with_etag(jsonify({
+        "items": stats,
+        "next_before": next_before,
+        "latest": latest,
+        "has_more": bool(since) and more,
+        "total_estimate": total_estimate,
+    }), etag)
+@app.route('/api/stats/stream')
+def api_stats_stream():
+    """Server-Sent Events: one `stat` event per new game of the logged-in user."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    user_id = session['user_id']
+    q = stats_events.subscribe(user_id)
+    if q is None:
+        # worker is full: the page falls back to polling
+        return jsonify({"error": "too many live clients"}), 503
+
+    def events():
+        # runs after the request's pooled connection was released; no DB work in here
+        try:
+            yield "retry: 3000\n\n"
+            started = time.monotonic()
+            while time.monotonic() - started < STATS_STREAM_MAX_AGE:
+                try:
+                    event = q.get(timeout=STATS_STREAM_HEARTBEAT)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: stat\nid: {event.get('id')}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            stats_events.unsubscribe(user_id, q)
+
+    return app.response_class(events(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",   # nginx/Render proxies must not buffer the stream
+    })
+
+
+EXPORT_COLUMNS = ("created_at", "game", "game_key", "score", "time_seconds", "result", "result_key", "age")
+EXPORT_ITERSIZE = int(os.environ.get("STATS_EXPORT_ITERSIZE", 2000))
+
+
+@app.route('/api/stats/export')
+def api_stats_export():
+    """The whole history of the logged-in user as CSV or NDJSON, streamed."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    fmt = request.args.get("format", "csv")
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+
+    user_id, lang, username = session['user_id'], get_lang(), session['username']
+
+    def rows():
+        # 🧵 named cursor: Postgres keeps the result, we pull EXPORT_ITERSIZE rows per round trip
+        cursor = mysql.connection.cursor(name="stats_export", itersize=EXPORT_ITERSIZE)
+        try:
+            cursor.execute("""
+                SELECT s.created_at,
+                       CASE WHEN s.game_key IS NULL OR s.game_key = 'other' THEN s.game_name ELSE gl.label END,
+                       s.game_key::text, s.score, s.time_seconds,
+                       CASE WHEN s.result_key IS NULL OR s.result_key = 'other' THEN s.result ELSE rl.label END,
+                       s.result_key::text, s.age
+                FROM game_statistics s
+                LEFT JOIN game_labels gl ON gl.game_key = s.game_key AND gl.lang = %s
+                LEFT JOIN result_labels rl ON rl.result_key = s.result_key AND rl.lang = %s
+                WHERE s.user_id = %s
+                ORDER BY s.created_at, s.id
+            """, (lang, lang, user_id))
+            for row in cursor:
+                yield (row[0].astimezone(ATHENS_TZ).isoformat(),) + tuple(row[1:])
+        finally:
+            cursor.close()
+            mysql.connection.rollback()   # ends the read transaction that held the cursor
+
+    def as_csv():
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for row in rows():
+            writer.writerow(row)
+            # flush in ~64 KB pieces instead of one tiny chunk per row
+            if buffer.tell() > 65536:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def as_ndjson():
+        lines = []
+        size = 0
+        for row in rows():
+            line = json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n"
+            lines.append(line)
+            size += len(line)
+            if size > 65536:
+                yield "".join(lines)
+                lines, size = [], 0
+        yield "".join(lines)
+
+    stamp = datetime.now(ATHENS_TZ).strftime("%Y%m%d")
+    filename = secure_filename(f"{username}_history_{stamp}.{fmt}") or f"history_{stamp}.{fmt}"
+    body = as_csv() if fmt == "csv" else as_ndjson()
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return app.response_class(stream_with_context(body), mimetype=mimetype, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control": "private, no-store",
+    })
+
+
+# -------------------------------------------------------------------
+# 👷 Background jobs status
+# -------------------------------------------------------------------
+@app.route('/api/jobs/<int:job_id>')
+def api_job(job_id):
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    cursor.execute("""
+        SELECT id, kind, status, attempts, max_attempts, progress, result, last_error,
+               run_at, created_at, finished_at
+        FROM jobs
+        WHERE id = %s AND user_id = %s
+    """, (job_id, session['user_id']))
+    job = cursor.fetchone()
+    cursor.close()
+    if not job:
+        return jsonify({"error": "Not found"}), 404
+
+    for field in ("run_at", "created_at", "finished_at"):
+        if job[field] is not None:
+            job[field] = job[field].isoformat()
+    return jsonify(job)
+
+
+# -------------------------------------------------------------------
+# 📄 PDF report (built on the server, cached by content)
+# -------------------------------------------------------------------
+report_cache = ReportCache(
+    os.environ.get("REPORT_CACHE_DIR", os.path.join(BASE_DIR, "report_cache")),
+    max_files=int(os.environ.get("REPORT_CACHE_MAX_FILES", 500)),
+)
+REPORT_MAX_ROWS = int(os.environ.get("REPORT_MAX_ROWS", 200))
+
+
+def report_data(user_id, lang):
+    """Aggregates + latest rows the report is drawn from."""
+    cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    cursor.execute("""
+        SELECT COALESCE(MAX(gl.label), s.game_key::text) AS game,
+               COUNT(*) AS plays,
+               COUNT(*) FILTER (WHERE s.result_key IN ('win', 'completed')) AS successes,
+               COUNT(*) FILTER (WHERE s.time_seconds > 0) AS timed_plays,
+               SUM(s.time_seconds) FILTER (WHERE s.time_seconds > 0) AS time_sum
+        FROM game_statistics s
+        LEFT JOIN game_labels gl ON gl.game_key = s.game_key AND gl.lang = %s
+        WHERE s.user_id = %s
+        GROUP BY s.game_key
+        ORDER BY s.game_key
+    """, (lang, user_id))
+    per_game = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT day, SUM(plays) AS plays
+        FROM game_stats_daily
+        WHERE user_id = %s AND day > CURDATE() - 30
+        GROUP BY day
+        ORDER BY day
+    """, (user_id,))
+    daily = [(row["day"], int(row["plays"])) for row in cursor.fetchall()]
+
+    cursor.execute("""
+        SELECT s.created_at,
+               CASE WHEN s.game_key IS NULL OR s.game_key = 'other' THEN s.game_name ELSE gl.label END AS game,
+               s.score, s.time_seconds,
+               CASE WHEN s.result_key IS NULL OR s.result_key = 'other' THEN s.result ELSE rl.label END AS result,
+               s.age
+        FROM game_statistics s
+        LEFT JOIN game_labels gl ON gl.game_key = s.game_key AND gl.lang = %s
+        LEFT JOIN result_labels rl ON rl.result_key = s.result_key AND rl.lang = %s
+        WHERE s.user_id = %s
+        ORDER BY s.created_at DESC, s.id DESC
+        LIMIT %s
+    """, (lang, lang, user_id, REPORT_MAX_ROWS + 1))
+    recent = cursor.fetchall()
+    cursor.close()
+
+    for row in recent:
+        row["created_at"] = row["created_at"].astimezone(ATHENS_TZ)
+    return {
+        "per_game": per_game,
+        "daily": daily,
+        "recent": recent[:REPORT_MAX_ROWS],
+        "recent_truncated": len(recent) > REPORT_MAX_ROWS,
+    }
+
+
+@app.route('/report.pdf')
+def report_pdf():
+    if 'user_id' not in session:
+        return redirect(url_for('index'))
+
+    patient = {
+        "first_name": request.args.get("first_name", "").strip()[:100],
+        "last_name": request.args.get("last_name", "").strip()[:100],
+    }
+    tt, lang = get_t_dict()
+    user_id = session['user_id']
+
+    # 🔑 same user + same last stat + same language/form/day -> same bytes
+    last_id, day = stats_marker(user_id)
+    key = report_key(user_id=user_id, last_id=last_id, day=day, lang=lang, **patient)
+
+    path = report_cache.get(key)
+    if path is None:
+        data = report_data(user_id, lang)
+        data["patient"] = patient
+        data["report_date"] = day.strftime("%d/%m/%Y")
+        path = report_cache.put(key, build_report(data, tt))
+
+    return send_file(path, mimetype="application/pdf", as_attachment=True,
+                     download_name=tt.get("pdf_filename", "report.pdf"), etag=key, max_age=0)
+
+
 @app.route('/today')
 def today():
     if 'username' not in session:
@@ -1246,16 +1680,15 @@ def today():
 
     cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
     cursor.execute("""
-        SELECT game_name, COUNT(*) AS plays, SUM(score) AS total_score, SUM(time_seconds) AS total_time
-        FROM game_statistics
-        WHERE username = %s AND DATE(created_at) = CURDATE()
-        GROUP BY game_name
-    """, (username,))
+        SELECT d.game_key, COALESCE(l.label, d.game_key::text) AS game_name,
+               d.plays, d.sum_score AS total_score, d.sum_time AS total_time
+        FROM game_stats_daily d
+        LEFT JOIN game_labels l ON l.game_key = d.game_key AND l.lang = %s
+        WHERE d.user_id = %s AND d.day = CURDATE()
+        ORDER BY d.game_key
+    """, (get_lang(), session['user_id']))
     today_stats = cursor.fetchall()
     cursor.close()
-    lang = session.get("lang", "el")
-    for row in today_stats:
-      row["game_name"] = display_game_name(row["game_name"], lang)
 
 
     total_plays = sum(item['plays'] for item in today_stats)
@@ -1274,21 +1707,23 @@ def api_today_stats():
     if 'username' not in session:
         return jsonify([])
 
-    username = session['username']
+    etag = stats_etag("today")
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
     cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
     cursor.execute("""
-        SELECT game_name, COUNT(*) AS plays
-        FROM game_statistics
-        WHERE username = %s AND DATE(created_at) = CURDATE()
-        GROUP BY game_name
-    """, (username,))
+        SELECT d.game_key, COALESCE(l.label, d.game_key::text) AS game_name, d.plays
+        FROM game_stats_daily d
+        LEFT JOIN game_labels l ON l.game_key = d.game_key AND l.lang = %s
+        WHERE d.user_id = %s AND d.day = CURDATE()
+        ORDER BY d.game_key
+    """, (get_lang(), session['user_id']))
     data = cursor.fetchall()
     cursor.close()
-    lang = session.get("lang", "el")
-    for row in data:
-      row["game_name"] = display_game_name(row["game_name"], lang)
 
-    return jsonify(data)
+    return with_etag(jsonify(data), etag)
 
 
 @app.route('/api_dashboard_stats')
@@ -1296,28 +1731,31 @@ def api_dashboard_stats():
     if 'username' not in session:
         return jsonify([])
 
-    username = session['username']
+    etag = stats_etag("dashboard")
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
     cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
     
     
     cursor.execute("""
-        SELECT game_name,
-               COUNT(*) AS plays,
-               ROUND(AVG(score), 1) AS avg_score,
-               MAX(created_at) AS last_played
-        FROM game_statistics
-        WHERE username = %s
-        GROUP BY game_name
-        ORDER BY game_name
-    """, (username,))
+        SELECT d.game_key,
+               COALESCE(MAX(l.label), d.game_key::text) AS game_name,
+               SUM(d.plays) AS plays,
+               ROUND((SUM(d.sum_score) / NULLIF(SUM(d.scored_plays), 0))::numeric, 1)::float8 AS avg_score,
+               MAX(d.last_played) AS last_played
+        FROM game_stats_daily d
+        LEFT JOIN game_labels l ON l.game_key = d.game_key AND l.lang = %s
+        WHERE d.user_id = %s
+        GROUP BY d.game_key
+        ORDER BY d.game_key
+    """, (get_lang(), session['user_id']))
     
     data = cursor.fetchall()
     cursor.close()
-    lang = session.get("lang", "el")
-    for row in data:
-     row["game_name"] = display_game_name(row.get("game_name"), lang)
 
-    return jsonify(data)
+    return with_etag(jsonify(data), etag)
 
 
 
@@ -1341,6 +1779,9 @@ def change_language():
         )
         mysql.connection.commit()
         cursor.close()
+        invalidate_user(username=session['username'])
+        # other workers may still cache the old row: load_language refetches rows older than this
+        session['lang_at'] = time.time()
 
     return redirect(request.referrer or url_for('welcome'))
 
@@ -1348,24 +1789,30 @@ def change_language():
 
 @app.before_request
 def load_language():
+    if request.endpoint in NO_DB_ENDPOINTS:
+        return
+
+    # ✅ Refresh the 30-day session cookie at most once a day instead of on every response
+    today_stamp = datetime.now(UTC_TZ).strftime("%Y-%m-%d")
+    if session.permanent and session.get('seen') != today_stamp:
+        session['seen'] = today_stamp
+
     # ✅ The user is on signup steps, dont change the  session lang from DB
     if request.path.startswith("/sign_up/"):
         if session.get('lang') not in ('el', 'en'):
             session['lang'] = 'el'
         return
 
-    # ✅ For all the pages , if the user is logged in, DB -> session
+    # ✅ For all the pages , if the user is logged in, DB -> session (only if it changed)
     if 'username' in session:
-        cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-        cursor.execute("SELECT language FROM users WHERE username=%s", (session['username'],))
-        user = cursor.fetchone()
-        cursor.close()
+        user = get_user(username=session['username'], newer_than=session.get('lang_at'))
 
         db_lang = (user.get('language') if user else None) or 'el'
         if db_lang not in ('el', 'en'):
             db_lang = 'el'
 
-        session['lang'] = db_lang
+        if session.get('lang') != db_lang:
+            session['lang'] = db_lang
     else:
         if session.get('lang') not in ('el', 'en'):
             session['lang'] = 'el'
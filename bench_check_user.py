@@ -0,0 +1,176 @@
+#bench_check_user.py
+#p50/p95 of the database work behind /check_user, old queries vs new ones.
+#Seeds --users accounts (username bench_u<i>), runs the login lookup and the
+#registration with both versions through the app's pool/cursor (so hot statements
+#are PREPAREd like in production) and deletes the seeded/created rows again.
+#bcrypt is left out: it costs the same in both versions and would hide the DB part.
+#Against a local socket a round trip is ~0.05 ms; on a hosted database every
+#round trip adds the network RTT, so `--rtt-ms` sleeps that long per statement.
+#
+#Usage:
+#   python bench_check_user.py [--users 50000] [--runs 2000]
+
+import argparse
+import random
+import statistics
+import sys
+import time
+
+import psycopg2.extras
+from dotenv import load_dotenv
+
+from database import PG, database_url_from_env
+
+PREFIX = "bench_u"
+
+OLD_LOGIN_SQL = "SELECT * FROM users WHERE email=%s OR username=%s"
+
+# kept in step with app.LOGIN_LOOKUP_SQL / app.REGISTER_SQL
+NEW_LOGIN_SQL = """
+    (SELECT id, email, username, password, language, profile_completed FROM users WHERE email = %s)
+    UNION ALL
+    (SELECT id, email, username, password, language, profile_completed FROM users WHERE username = %s)
+    LIMIT 1
+"""
+
+NEW_REGISTER_SQL = """
+    WITH ins AS (
+        INSERT INTO users (username, email, password, language, profile_completed, reminder)
+        VALUES (%s, %s, %s, %s, FALSE, 'no')
+        ON CONFLICT DO NOTHING
+        RETURNING id
+    )
+    SELECT id, NULL::text AS conflict FROM ins
+    UNION ALL
+    (SELECT NULL::bigint, 'email' FROM users WHERE email = %s AND NOT EXISTS (SELECT 1 FROM ins))
+    UNION ALL
+    (SELECT NULL::bigint, 'username' FROM users WHERE username = %s AND NOT EXISTS (SELECT 1 FROM ins))
+    LIMIT 1
+"""
+
+
+class Trips:
+    """Runs statements on the app's connection, one simulated RTT per round trip."""
+    def __init__(self, db, rtt_ms):
+        self.db = db
+        self.rtt = rtt_ms / 1000.0
+
+    def _wait(self):
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    def one(self, sql, params):
+        cur = self.db.cursor()
+        cur.execute(sql, params)
+        self._wait()
+        row = cur.fetchone()
+        cur.close()
+        return row
+
+    def commit(self):
+        self.db.commit()
+        self._wait()
+
+
+def old_login(trips, email, username):
+    trips.one(OLD_LOGIN_SQL, (email, username))
+    trips.commit()
+
+
+def new_login(trips, email, username):
+    trips.one(NEW_LOGIN_SQL, (email, username))
+    trips.commit()
+
+
+def old_register(trips, username, email):
+    trips.one(OLD_LOGIN_SQL, (email, username))
+    trips.one("SELECT id FROM users WHERE email=%s", (email,))
+    trips.one("SELECT id FROM users WHERE username=%s", (username,))
+    trips.one("""
+        INSERT INTO users (username, email, password, language, profile_completed, reminder)
+        VALUES (%s, %s, %s, %s, FALSE, 'no') RETURNING id
+    """, (username, email, "x", "el"))
+    trips.commit()
+    return trips.one("SELECT id FROM users WHERE email=%s", (email,))[0]
+
+
+def new_register(trips, username, email):
+    trips.one(NEW_LOGIN_SQL, (email, username))
+    row = trips.one(NEW_REGISTER_SQL, (username, email, "x", "el", email, username))
+    trips.commit()
+    return row[0]
+
+
+def timed(func, args_list):
+    samples = []
+    for args in args_list:
+        started = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def summary(samples):
+    q = statistics.quantiles(samples, n=100)
+    return f"p50 {q[49]:.3f} ms  p95 {q[94]:.3f} ms"
+
+
+def seed(db, users):
+    cur = db.cursor()
+    cur.execute("DELETE FROM users WHERE username LIKE %s", (PREFIX + "%",))
+    psycopg2.extras.execute_values(
+        cur,
+        "INSERT INTO users (username, email, password, language, profile_completed, reminder) VALUES %s",
+        [(f"{PREFIX}{i}", f"{PREFIX}{i}@bench.invalid", "x", "el", True, "no") for i in range(users)],
+        page_size=5000,
+    )
+    cur.execute("ANALYZE users")
+    db.commit()
+
+
+def cleanup(db, pattern):
+    db.rollback()
+    cur = db.cursor()
+    cur.execute("DELETE FROM users WHERE username LIKE %s", (pattern,))
+    db.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency of the /check_user queries, old vs new.")
+    parser.add_argument("--users", type=int, default=50000, help="accounts to seed")
+    parser.add_argument("--runs", type=int, default=2000, help="lookups/registrations per variant")
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="simulated network round trip per statement")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db = PG(database_url_from_env()).connection
+    trips = Trips(db, args.rtt_ms)
+    try:
+        print(f"seeding {args.users} users...")
+        seed(db, args.users)
+
+        picks = [random.randrange(args.users) for _ in range(args.runs)]
+        # login by email, by username (email mistyped) and a miss
+        logins = [(f"{PREFIX}{i}@bench.invalid", f"{PREFIX}{i}") for i in picks]
+        logins += [(f"nobody{i}@bench.invalid", f"{PREFIX}{i}") for i in picks[: args.runs // 2]]
+        random.shuffle(logins)
+
+        for name, func in (("old login (OR)", old_login), ("new login (UNION ALL)", new_login)):
+            timed(lambda e, u: func(trips, e, u), logins[:50])   # warm-up, statements get PREPAREd
+            print(f"{name:<28} {summary(timed(lambda e, u: func(trips, e, u), logins))}")
+
+        for name, func in (("old registration (6 trips)", old_register), ("new registration (3 trips)", new_register)):
+            warmup = [(f"{PREFIX}w{i}", f"{PREFIX}w{i}@bench.invalid") for i in range(50)]
+            timed(lambda u, e: func(trips, u, e), warmup)
+            registrations = [(f"{PREFIX}new{i}", f"{PREFIX}new{i}@bench.invalid") for i in range(args.runs)]
+            print(f"{name:<28} {summary(timed(lambda u, e: func(trips, u, e), registrations))}")
+            cleanup(db, PREFIX + "new%")
+            cleanup(db, PREFIX + "w%")
+        return 0
+    finally:
+        cleanup(db, PREFIX + "%")
+        db.release()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#bench_reminders.py
+#Throughput of the reminder sends against a local stand-in for the Brevo API.
+#Compares the old loop (one request per user, one after another) with
+#send_batch-style delivery (messageVersions chunks, several in flight).
+#
+#Usage:
+#   python bench_reminders.py [--users 5000] [--batch-size 500] [--concurrency 4]
+#                             [--latency-ms 80] [--single-sample 200]
+
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from email_service import CircuitBreaker, EmailSender
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Answers like Brevo after `latency` seconds (+ a little per recipient)."""
+    protocol_version = "HTTP/1.1"
+    latency = 0.08
+    per_recipient = 0.00002
+    received = 0
+    requests_seen = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        count = len(payload.get("messageVersions") or payload.get("to") or ())
+        time.sleep(self.latency + self.per_recipient * count)
+        with self.lock:
+            StandIn.received += count
+            StandIn.requests_seen += 1
+        body = b'{"messageIds": []}'
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def recipients(n):
+    return [{"to": [{"email": f"user{i}@example.com"}], "params": {"username": f"user{i}"}} for i in range(n)]
+
+
+def bench_single(url, users):
+    """The old send_daily_reminders: requests.post per user, no session, in sequence."""
+    started = time.monotonic()
+    for version in users:
+        requests.post(url, json={
+            "sender": {"email": "bench@example.com"},
+            "to": version["to"],
+            "subject": "Reminder",
+            "htmlContent": f"<p>Hi {version['params']['username']}!</p>",
+        }, headers={"api-key": "bench"}, timeout=30)
+    return time.monotonic() - started
+
+
+def bench_batched(url, users, batch_size, concurrency):
+    sender = EmailSender(url=url, threads=concurrency, max_pending=len(users), batch_size=batch_size,
+                         breaker=CircuitBreaker(threshold=10 ** 9))
+    base = {"sender": {"email": "bench@example.com"}, "subject": "Reminder",
+            "htmlContent": "<p>Hi {{ params.username }}!</p>"}
+    started = time.monotonic()
+    futures = sender.submit_batch(base, users, "bench")
+    for future in futures:
+        future.result()
+    elapsed = time.monotonic() - started
+    return elapsed, sender.stats()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark reminder delivery against a local Brevo stand-in.")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4, help="chunks in flight")
+    parser.add_argument("--latency-ms", type=float, default=80, help="stand-in response time per request")
+    parser.add_argument("--single-sample", type=int, default=200,
+                        help="users sent one by one for the baseline (extrapolated to --users)")
+    args = parser.parse_args(argv)
+
+    StandIn.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v3/smtp/email"
+    users = recipients(args.users)
+
+    try:
+        sample = users[:max(1, min(args.single_sample, args.users))]
+        single = bench_single(url, sample)
+        single_rate = len(sample) / single
+        print(f"one by one : {len(sample)} users in {single:.2f}s -> {single_rate:,.0f} emails/s "
+              f"(~{args.users / single_rate:.1f}s for {args.users})")
+
+        StandIn.received = StandIn.requests_seen = 0
+        batched, stats = bench_batched(url, users, args.batch_size, args.concurrency)
+        print(f"batched    : {args.users} users in {batched:.2f}s -> {args.users / batched:,.0f} emails/s "
+              f"({StandIn.requests_seen} requests, {args.concurrency} in flight, batch {args.batch_size})")
+        if StandIn.received != args.users or stats["sent"] != args.users:
+            print(f"❌ stand-in received {StandIn.received}, sender stats {stats}")
+            return 1
+        print(f"Done ✅ {args.users / single_rate / batched:.0f}x faster.")
+        return 0
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
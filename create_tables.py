@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 import psycopg2
+from migrations import run_migrations
 
 load_dotenv()
 
@@ -60,6 +61,9 @@ cur = conn.cursor()
 print("Creating tables...")
 cur.execute(SCHEMA_SQL)
 
+print("Applying migrations...")
+run_migrations(conn)
+
 cur.close()
 conn.close()
 print("Done ✅ Tables created.")
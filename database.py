@@ -0,0 +1,616 @@
+#database.py
+#Postgres access layer used by app.py (and by the maintenance scripts).
+#A per-process, thread-safe connection pool hands one connection to every
+#request/app context and takes it back on teardown, so the routes can keep
+#calling mysql.connection.cursor(...) exactly like before.
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+import psycopg2.extras
+from flask import g, has_app_context
+
+
+def database_url_from_env(require_ssl=True):
+    """Read DATABASE_URL and normalize it the way Render/psycopg2 expect it."""
+    url = os.environ.get("DATABASE_URL", "").strip()
+
+    # Render μερικές φορές δίνει postgres://, το κάνουμε postgresql://
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    # ✅ force sslmode=require αν δεν υπάρχει ήδη
+    if require_ssl and "sslmode=" not in url:
+        sep = "&" if "?" in url else "?"
+        url = url + f"{sep}sslmode=require"
+    # TCP keepalives so dead connections are noticed by the OS, not by a ping per request
+    if url and "keepalives=" not in url:
+        sep = "&" if "?" in url else "?"
+        url = url + (
+            f"{sep}keepalives=1"
+            f"&keepalives_idle={_env_int('DB_KEEPALIVES_IDLE', 30)}"
+            f"&keepalives_interval={_env_int('DB_KEEPALIVES_INTERVAL', 10)}"
+            f"&keepalives_count={_env_int('DB_KEEPALIVES_COUNT', 3)}"
+        )
+    return url
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+_READ_ONLY_RE = re.compile(r"^\s*\(?\s*SELECT\b", re.IGNORECASE)
+_WRITE_RE = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|FOR\s+UPDATE|FOR\s+SHARE|NEXTVAL|PG_NOTIFY)\b", re.IGNORECASE)
+
+
+def is_idempotent_read(query):
+    """True for plain SELECTs, which are safe to re-run on a fresh connection."""
+    return bool(_READ_ONLY_RE.match(query)) and not _WRITE_RE.search(query)
+
+
+def translate_sql(query):
+    """MySQL-isms used by the routes -> Postgres."""
+    q = query
+    q = q.replace("UTC_TIMESTAMP()", "(NOW() AT TIME ZONE 'UTC')")
+    q = q.replace("CURDATE()", "CURRENT_DATE")
+    q = re.sub(r"DATE\s*\(\s*created_at\s*\)", "created_at::date", q, flags=re.IGNORECASE)
+    return q
+
+
+_PREPARABLE_RE = re.compile(r"^\s*\(?\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+# `SELECT *` / `RETURNING u.*`: the prepared result type would be fixed at PREPARE
+# time, and an ALTER TABLE ... ADD COLUMN breaks it ("cached plan must not change
+# result type"), so star selects always run as plain statements
+_STAR_RE = re.compile(r"\b(SELECT|DISTINCT|RETURNING)\s+(\w+\.)?\*|,\s*(\w+\.)?\*", re.IGNORECASE)
+
+
+class CachedStatement:
+    """Translated SQL for one query text, plus its server-side prepared form."""
+    __slots__ = ("sql", "name", "nparams", "prepare_sql", "execute_sql", "preparable", "uses")
+
+    def __init__(self, query):
+        self.sql = translate_sql(query)
+        self.uses = 0
+        self.nparams = self.sql.count("%s")
+        self.preparable = (
+            bool(_PREPARABLE_RE.match(self.sql))
+            and "%(" not in self.sql
+            and "%%" not in self.sql
+            and not _STAR_RE.search(self.sql)
+        )
+        self.name = "ps_" + hashlib.sha1(self.sql.encode("utf-8")).hexdigest()[:16]
+        self.prepare_sql = None
+        self.execute_sql = None
+        if self.preparable:
+            counter = iter(range(1, self.nparams + 1))
+            numbered = re.sub(r"%s", lambda _m: f"${next(counter)}", self.sql)
+            self.prepare_sql = f"PREPARE {self.name} AS {numbered}"
+            args = ", ".join(["%s"] * self.nparams)
+            self.execute_sql = f"EXECUTE {self.name} ({args})" if self.nparams else f"EXECUTE {self.name}"
+
+
+class StatementCache:
+    """
+    Bounded LRU of translated statements keyed by the original query text,
+    so the str.replace/re.sub work runs once per distinct query.
+    Statements used at least `prepare_threshold` times are PREPAREd on each
+    pooled connection (0 disables prepared statements, e.g. behind PgBouncer).
+    """
+    def __init__(self, maxsize=256, prepare_threshold=5):
+        self.maxsize = maxsize
+        self.prepare_threshold = prepare_threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.prepares = 0
+        self.prepared_executes = 0
+
+    def get(self, query):
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is not None:
+                self._entries.move_to_end(query)
+                self.hits += 1
+                entry.uses += 1
+                return entry
+            self.misses += 1
+
+        entry = CachedStatement(query)
+        entry.uses = 1
+        with self._lock:
+            self._entries[query] = entry
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def should_prepare(self, entry, params):
+        if self.prepare_threshold <= 0 or not entry.preparable or entry.uses < self.prepare_threshold:
+            return False
+        if params is None:
+            return entry.nparams == 0
+        return isinstance(params, (tuple, list)) and len(params) == entry.nparams
+
+    def count(self, prepares=0, prepared_executes=0):
+        with self._lock:
+            self.prepares += prepares
+            self.prepared_executes += prepared_executes
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "prepares": self.prepares,
+                "prepared_executes": self.prepared_executes,
+            }
+
+
+STATEMENT_CACHE = StatementCache(
+    maxsize=_env_int("DB_STATEMENT_CACHE_SIZE", 256),
+    prepare_threshold=_env_int("DB_PREPARE_THRESHOLD", 5),
+)
+
+
+class TranslatingCursor:
+    """
+    Μεταφράζει λίγα MySQL-specific πράγματα σε Postgres,
+    ώστε να ΜΗΝ αλλάξεις SQL μέσα στα routes.
+    Translations come from STATEMENT_CACHE and hot statements run as
+    EXECUTE of a per-connection prepared statement.
+    If the connection turns out to be dead, a read that opened the
+    transaction is retried once on a fresh connection from the pool.
+    """
+    def __init__(self, real_cursor, owner=None):
+        self._cur = real_cursor
+        self._owner = owner
+
+    def execute(self, query, params=None):
+        if not isinstance(query, str):
+            # already-composed bytes (e.g. psycopg2.extras.execute_values)
+            return self._cur.execute(query, params)
+
+        entry = STATEMENT_CACHE.get(query)
+        conn = self._cur.connection
+        fresh_txn = conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        try:
+            return self._run(entry, params, fresh_txn)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # only retry when nothing else ran in this transaction and the link is gone
+            if self._owner is None or not fresh_txn or not conn.closed or not is_idempotent_read(entry.sql):
+                raise
+            self._cur = self._owner.reconnect_cursor(self._cur)
+            return self._run(entry, params, True)
+
+    def _run(self, entry, params, fresh_txn):
+        prepared = self._owner.prepared_names() if self._owner is not None else None
+        # a named (server-side) cursor is a DECLARE ... CURSOR FOR <query>, which can't wrap EXECUTE
+        if prepared is None or self._cur.name is not None or not STATEMENT_CACHE.should_prepare(entry, params):
+            return self._cur.execute(entry.sql, params)
+
+        if prepared.get(entry.name) is not True and not self._prepare(entry, prepared, fresh_txn):
+            return self._cur.execute(entry.sql, params)
+
+        try:
+            result = self._cur.execute(entry.execute_sql, params)
+        except psycopg2.errors.FeatureNotSupported:
+            # the table changed under the statement ("cached plan must not change
+            # result type"): it is DEALLOCATEd and PREPAREd again before its next use
+            prepared[entry.name] = False
+            if not fresh_txn:
+                raise
+            self._cur.connection.rollback()
+            return self._cur.execute(entry.sql, params)
+        STATEMENT_CACHE.count(prepared_executes=1)
+        return result
+
+    def _prepare(self, entry, prepared, fresh_txn):
+        """PREPARE entry on this session; False if it has to run as a plain statement."""
+        # inside the caller's transaction a failed PREPARE must not abort it
+        savepoint = not fresh_txn
+        if savepoint:
+            self._cur.execute("SAVEPOINT ps_prepare")
+        try:
+            if prepared.get(entry.name) is False:
+                self._cur.execute(f"DEALLOCATE {entry.name}")
+                del prepared[entry.name]
+            self._cur.execute(entry.prepare_sql)
+        except psycopg2.OperationalError:
+            raise
+        except psycopg2.DatabaseError:
+            # e.g. a parameter type Postgres can't infer: never try this one again
+            entry.preparable = False
+            if savepoint:
+                self._cur.execute("ROLLBACK TO SAVEPOINT ps_prepare")
+            else:
+                self._cur.connection.rollback()
+            return False
+        if savepoint:
+            self._cur.execute("RELEASE SAVEPOINT ps_prepare")
+        prepared[entry.name] = True
+        STATEMENT_CACHE.count(prepares=1)
+        return True
+
+    def executemany(self, query, param_seq):
+        return self._cur.executemany(STATEMENT_CACHE.get(query).sql, param_seq)
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def fetchmany(self, size=None):
+        return self._cur.fetchmany(size) if size is not None else self._cur.fetchmany()
+
+    def __iter__(self):
+        # named cursors fetch `itersize` rows per round trip while iterating
+        return iter(self._cur)
+
+    def close(self):
+        return self._cur.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """No connection became free within the pool timeout."""
+
+
+class PooledConnection:
+    """A raw psycopg2 connection plus the bookkeeping the pool needs."""
+    __slots__ = ("raw", "created_at", "checked_out_at", "prepared")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.checked_out_at = None
+        self.prepared = {}  # statement name -> True once PREPAREd on this session, False if stale
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool with min/max size, blocking checkout with a timeout
+    and recycling of connections older than max_age seconds.
+    Connections are opened lazily, after gunicorn has forked the worker.
+    """
+    def __init__(self, dsn, minconn=1, maxconn=10, max_age=1800, timeout=10, probe_interval=0):
+        self.dsn = dsn
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self.max_age = max_age
+        self.timeout = timeout
+        self.probe_interval = probe_interval
+
+        self._cond = threading.Condition()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._idle = []      # LIFO: the most recently used connection is reused first
+        self._size = 0       # idle + checked out
+        self._in_use = 0
+        self._waiting = 0
+        self._prefilled = False
+        self._prober = None
+        self._checkouts = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _new_connection(self):
+        return PooledConnection(psycopg2.connect(self.dsn))
+
+    def _expired(self, conn):
+        if conn.raw.closed:
+            return True
+        return self.max_age > 0 and time.monotonic() - conn.created_at > self.max_age
+
+    def _close_quietly(self, conn):
+        try:
+            conn.raw.close()
+        except Exception:
+            pass
+
+    def _prefill(self):
+        # open the minimum number of connections once per process
+        opened = []
+        try:
+            for _ in range(self.minconn):
+                opened.append(self._new_connection())
+        except psycopg2.Error:
+            pass  # the first real checkout will surface the error
+        with self._cond:
+            room = self.maxconn - self._size
+            keep, extra = opened[:room], opened[room:]
+            self._idle.extend(keep)
+            self._size += len(keep)
+            self._cond.notify_all()
+        for conn in extra:
+            self._close_quietly(conn)
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        with self._cond:
+            if self._pid != os.getpid():
+                # forked: the parent's sockets are not ours to use or close
+                self._reset_state()
+            prefill = not self._prefilled and self.minconn > 0
+            if prefill:
+                self._prefilled = True
+            if self.probe_interval > 0 and self._prober is None:
+                self._start_prober()
+
+        if prefill:
+            self._prefill()
+
+        stale = []
+        conn = None
+        reserved = False
+        with self._cond:
+            while True:
+                while self._idle:
+                    candidate = self._idle.pop()
+                    if self._expired(candidate):
+                        self._size -= 1
+                        self._recycled += 1
+                        stale.append(candidate)
+                        continue
+                    conn = candidate
+                    break
+                if conn is not None:
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1  # reserve a slot, connect outside the lock
+                    reserved = True
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    break
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            if conn is not None or reserved:
+                self._in_use += 1
+                self._record_wait(time.monotonic() - start)
+
+        for old in stale:
+            self._close_quietly(old)
+
+        if conn is None and not reserved:
+            raise PoolTimeout(f"no database connection free after {self.timeout}s")
+
+        if reserved:
+            try:
+                conn = self._new_connection()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+
+        conn.checked_out_at = time.monotonic()
+        return conn
+
+    def _record_wait(self, waited):
+        self._checkouts += 1
+        self._wait_total += waited
+        if waited > self._wait_max:
+            self._wait_max = waited
+
+    def putconn(self, conn, discard=False):
+        """Give a connection back. Any open transaction is rolled back first."""
+        raw = conn.raw
+        if not discard and not raw.closed:
+            try:
+                if raw.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    raw.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            same_process = self._pid == os.getpid()
+            if same_process:
+                self._in_use -= 1
+                if discard or self._expired(conn):
+                    self._size -= 1
+                    self._recycled += 1
+                else:
+                    self._idle.append(conn)
+                    conn = None
+                self._cond.notify()
+            else:
+                conn = None  # inherited from the parent process, just drop it
+
+        if conn is not None:
+            self._close_quietly(conn)
+
+    def _start_prober(self):
+        self._prober = threading.Thread(target=self._probe_loop, args=(os.getpid(),),
+                                        name="db-pool-probe", daemon=True)
+        self._prober.start()
+
+    def _probe_loop(self, pid):
+        while self._pid == pid:
+            time.sleep(self.probe_interval)
+            self.probe_idle()
+
+    def probe_idle(self):
+        """Low-frequency liveness check of idle connections only (never on the request path)."""
+        with self._cond:
+            probing, self._idle = self._idle, []
+
+        alive, dead = [], []
+        for conn in probing:
+            try:
+                if self._expired(conn):
+                    raise psycopg2.InterfaceError("expired")
+                cur = conn.raw.cursor()
+                cur.execute("SELECT 1")
+                cur.close()
+                conn.raw.rollback()
+                alive.append(conn)
+            except Exception:
+                dead.append(conn)
+
+        with self._cond:
+            self._idle.extend(alive)
+            self._size -= len(dead)
+            self._recycled += len(dead)
+            self._cond.notify_all()
+        for conn in dead:
+            self._close_quietly(conn)
+        return len(dead)
+
+    def stats(self):
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "min": self.minconn,
+                "max": self.maxconn,
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+                "wait_avg_ms": round(self._wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+                "wait_max_ms": round(self._wait_max * 1000, 3),
+            }
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+
+class PostgresConnection:
+    """
+    Request-scoped face of the pool with the old single-connection API.
+    Inside a Flask app context the checkout lives on `g` and is returned
+    by PG's teardown handler; outside one (scripts, threads) it is kept
+    per thread until release() is called.
+    """
+    def __init__(self, pool):
+        self.pool = pool
+        self._local = threading.local()
+
+    def _slot(self):
+        return g if has_app_context() else self._local
+
+    def _current(self):
+        return getattr(self._slot(), "_pg_conn", None)
+
+    def _connect(self):
+        slot = self._slot()
+        conn = getattr(slot, "_pg_conn", None)
+        if conn is not None and conn.raw.closed:
+            self.release(discard=True)
+            conn = None
+        if conn is None:
+            conn = self.pool.getconn()
+            slot._pg_conn = conn
+        return conn.raw
+
+    def prepared_names(self):
+        conn = self._current()
+        return conn.prepared if conn is not None else None
+
+    def reconnect_cursor(self, old_cursor):
+        """Drop the dead checkout and open the same kind of cursor on a new one."""
+        factory = type(old_cursor)
+        self.release(discard=True)
+        conn = self._connect()
+        if factory is psycopg2.extras.RealDictCursor:
+            return conn.cursor(cursor_factory=factory)
+        return conn.cursor()
+
+    def release(self, discard=False):
+        slot = self._slot()
+        conn = getattr(slot, "_pg_conn", None)
+        if conn is None:
+            return
+        slot._pg_conn = None
+        self.pool.putconn(conn, discard=discard)
+
+    def cursor(self, cursorclass=None, name=None, itersize=2000):
+        """`name` opens a server-side cursor: rows stay in Postgres and arrive `itersize` at a time."""
+        conn = self._connect()
+
+        if cursorclass is not None:
+            real = conn.cursor(name=name, cursor_factory=psycopg2.extras.RealDictCursor)
+        else:
+            real = conn.cursor(name=name)
+        if name is not None:
+            real.itersize = itersize
+        return TranslatingCursor(real, self)
+
+    def commit(self):
+        conn = self._current()
+        if conn:
+            conn.raw.commit()
+
+    def rollback(self):
+        conn = self._current()
+        if conn:
+            conn.raw.rollback()
+
+    def ping(self, reconnect=False):
+        try:
+            cur = self.cursor()
+            cur.execute("SELECT 1;")
+            cur.close()
+        except Exception:
+            if reconnect:
+                self.release(discard=True)
+                self._connect()
+
+
+class PG:
+    def __init__(self, dsn: str, app=None):
+        self.pool = ConnectionPool(
+            dsn,
+            minconn=_env_int("DB_POOL_MIN", 1),
+            maxconn=_env_int("DB_POOL_MAX", 10),
+            max_age=_env_int("DB_POOL_MAX_AGE", 1800),
+            timeout=_env_int("DB_POOL_TIMEOUT", 10),
+            probe_interval=_env_int("DB_PROBE_INTERVAL", 0),
+        )
+        self.connection = PostgresConnection(self.pool)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.teardown_appcontext(self._teardown)
+
+    def _teardown(self, exc):
+        # a failed request must not leave its transaction open for the next one
+        self.connection.release()
+
+    def stats(self):
+        return {"pool": self.pool.stats(), "statements": STATEMENT_CACHE.stats()}
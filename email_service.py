@@ -1,27 +1,268 @@
+#email_service.py
+#Brevo transactional email, delivered in the background.
+#send_email() only queues the message and returns; a small thread pool posts it
+#over one keep-alive requests.Session (connect/read timeouts, retries with
+#jittered backoff on network errors, 429 and 5xx). After EMAIL_BREAKER_FAILURES
+#failed deliveries in a row the circuit opens and messages are dropped at once
+#for EMAIL_BREAKER_RESET seconds, so a Brevo outage can't pile up threads.
+#send_batch() sends one message to many recipients with Brevo's messageVersions,
+#EMAIL_BATCH_SIZE recipients per request, the chunks going out in parallel.
+#BREVO_API_URL points the client somewhere else (e.g. a local fake server).
+
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
 
-def send_email(to_email, subject, html_content):
-    api_key = os.getenv("BREVO_API_KEY")
-    sender = os.getenv("EMAIL_SENDER")
+BREVO_API_URL = "https://api.brevo.com/v3/smtp/email"
+BREVO_MAX_VERSIONS = 1000   # messageVersions per request accepted by Brevo
 
-    if not api_key or not sender:
-        print("Email disabled (missing API key)")
-        return
 
-    url = "https://api.brevo.com/v3/smtp/email"
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
 
-    headers = {
-        "accept": "application/json",
-        "api-key": api_key,
-        "content-type": "application/json"
-    }
 
-    data = {
-        "sender": {"email": sender},
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """closed -> open after `threshold` failures in a row -> half-open after `reset_timeout` (one probe)."""
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half-open" and self._probing):
+                raise CircuitOpen()
+            if state == "half-open":
+                self._probing = True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    print(f"⚠️ email: {self.failures} failures in a row, pausing delivery for {self.reset_timeout:.0f}s")
+                self.opened_at = time.monotonic()
+
+
+class RetryableError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _recipients(payload):
+    return len(payload.get("messageVersions") or payload.get("to") or ())
+
+
+class EmailSender:
+    def __init__(self, url=None, threads=4, max_pending=1000, connect_timeout=3.05, read_timeout=10.0,
+                 retries=3, backoff=0.5, breaker=None, batch_size=500):
+        self.url = url or BREVO_API_URL
+        self.threads = threads
+        self.batch_size = min(batch_size, BREVO_MAX_VERSIONS)
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pool = None
+        self._session = None
+        # metrics
+        self.queued = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_ms = 0.0
+
+    def _ensure_pool(self):
+        # one pool + session per process (threads and sockets do not survive fork)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.threads)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session = session
+            self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="email")
+            self._pid = os.getpid()
+
+    def submit(self, payload, api_key):
+        """Queue one Brevo payload; returns a Future, or None when the queue is full (dropped)."""
+        if not self._slots.acquire(blocking=False):
+            self.dropped += _recipients(payload)
+            print("⚠️ email: queue full, message dropped")
+            return None
+        self._ensure_pool()
+        self.queued += _recipients(payload)
+        return self._pool.submit(self._deliver_and_release, payload, api_key)
+
+    def submit_batch(self, base, versions, api_key):
+        """
+        Queue one message (`base`: sender, subject, htmlContent) for many recipients,
+        `versions` being Brevo messageVersions. Returns one Future (or None) per chunk.
+        """
+        return [
+            self.submit(dict(base, messageVersions=versions[i:i + self.batch_size]), api_key)
+            for i in range(0, len(versions), self.batch_size)
+        ]
+
+    def _deliver_and_release(self, payload, api_key):
+        try:
+            self.deliver(payload, api_key)
+        except Exception as e:
+            print("⚠️ email delivery error:", e)
+        finally:
+            self._slots.release()
+
+    def _post(self, payload, api_key):
+        headers = {
+            "accept": "application/json",
+            "api-key": api_key,
+            "content-type": "application/json",
+        }
+        try:
+            response = self._session.post(self.url, json=payload, headers=headers, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise RetryableError(f"{type(e).__name__}: {e}")
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After")
+            raise RetryableError(f"HTTP {response.status_code}",
+                                 float(retry_after) if retry_after and retry_after.isdigit() else None)
+        return response
+
+    def deliver(self, payload, api_key):
+        """Send now (in the calling thread). Returns the response, or None if it was given up."""
+        self._ensure_pool()
+        for attempt in range(self.retries + 1):
+            try:
+                self.breaker.before_call()
+            except CircuitOpen:
+                self.dropped += _recipients(payload)
+                print("⚠️ email: circuit open, message dropped")
+                return None
+
+            started = time.monotonic()
+            try:
+                response = self._post(payload, api_key)
+            except RetryableError as e:
+                self.breaker.failure()
+                if attempt == self.retries:
+                    self.failed += _recipients(payload)
+                    print(f"❌ email: giving up after {attempt + 1} attempts ({e})")
+                    return None
+                self.retried += 1
+                # full jitter, or what the server asked for on 429
+                delay = e.retry_after or random.uniform(0, self.backoff * 2 ** attempt)
+                time.sleep(min(delay, 30))
+                continue
+
+            self.last_ms = (time.monotonic() - started) * 1000
+            self.breaker.success()
+            if response.status_code >= 400:
+                # 4xx (bad address, bad key...): retrying will not help
+                self.failed += _recipients(payload)
+                print(f"❌ email rejected: HTTP {response.status_code} {response.text[:200]}")
+            else:
+                self.sent += _recipients(payload)
+            return response
+
+    def stats(self):
+        return {
+            "queued": self.queued,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "breaker": self.breaker.state,
+            "last_ms": round(self.last_ms, 1),
+        }
+
+
+sender = EmailSender(
+    url=os.environ.get("BREVO_API_URL"),
+    threads=int(_env_float("EMAIL_THREADS", 4)),
+    max_pending=int(_env_float("EMAIL_MAX_PENDING", 1000)),
+    connect_timeout=_env_float("EMAIL_CONNECT_TIMEOUT", 3.05),
+    read_timeout=_env_float("EMAIL_READ_TIMEOUT", 10),
+    retries=int(_env_float("EMAIL_RETRIES", 3)),
+    batch_size=int(_env_float("EMAIL_BATCH_SIZE", 500)),
+    breaker=CircuitBreaker(
+        threshold=int(_env_float("EMAIL_BREAKER_FAILURES", 5)),
+        reset_timeout=_env_float("EMAIL_BREAKER_RESET", 30),
+    ),
+)
+
+
+def build_payload(sender_email, to_email, subject, html_content):
+    return {
+        "sender": {"email": sender_email},
         "to": [{"email": to_email}],
         "subject": subject,
         "htmlContent": html_content
     }
 
-    requests.post(url, json=data, headers=headers)
+
+def send_email(to_email, subject, html_content):
+    """Queue an email and return at once (a Future, or None if it was not queued)."""
+    api_key = os.getenv("BREVO_API_KEY")
+    sender_email = os.getenv("EMAIL_SENDER")
+
+    if not api_key or not sender_email:
+        print("Email disabled (missing API key)")
+        return None
+
+    return sender.submit(build_payload(sender_email, to_email, subject, html_content), api_key)
+
+
+def send_batch(subject, html_content, recipients):
+    """
+    Queue the same email for many recipients: [{"email": ..., "params": {...}}].
+    `params` fill {{ params.x }} placeholders of html_content per recipient.
+    """
+    api_key = os.getenv("BREVO_API_KEY")
+    sender_email = os.getenv("EMAIL_SENDER")
+
+    if not api_key or not sender_email:
+        print("Email disabled (missing API key)")
+        return []
+
+    base = {"sender": {"email": sender_email}, "subject": subject, "htmlContent": html_content}
+    versions = [{"to": [{"email": r["email"]}], "params": r.get("params") or {}} for r in recipients]
+    return sender.submit_batch(base, versions, api_key)
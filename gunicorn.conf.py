@@ -0,0 +1,20 @@
+#gunicorn.conf.py
+#Picked up automatically by `gunicorn app:app` (the Render start command).
+#/api/stats/stream keeps one worker thread busy per open dashboard, so the
+#workers are threaded (gthread): with the default sync worker a couple of open
+#dashboards would take every worker. app.py reads the same GUNICORN_THREADS to
+#let live streams use at most half of the threads (STATS_STREAM_MAX_CLIENTS).
+#Change the thread count through GUNICORN_THREADS, not --threads.
+#Every worker also runs JOBS_THREADS background-job threads (jobs.py); set
+#JOBS_IN_PROCESS=0 only when `python -m jobs worker` runs as a separate service.
+
+import os
+
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.setdefault("GUNICORN_THREADS", "16"))
+
+# the PDF report and the CSV export can take a while on long histories
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
@@ -22,7 +22,7 @@ def send_stats(username, age, score, time_seconds, result):
     }
     try:
         response = requests.post("http://127.0.0.1:5000/add_stat", json=data)
-        if response.status_code == 200:
+        if 200 <= response.status_code < 300:   # 202 when the server queues the write
             print("✅ Τα στατιστικά στάλθηκαν με επιτυχία στο Flask!")
         else:
             print(f"⚠️ Σφάλμα αποστολής ({response.status_code}):", response.text)
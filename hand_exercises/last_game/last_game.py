@@ -17,7 +17,7 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 if BASE_DIR not in sys.path:
     sys.path.insert(0, BASE_DIR)
 
-from translations import TRANSLATIONS  # shared translations with Flask
+from translations import t  # shared translation catalogs with Flask
 import hand_exercises  # your module with gesture logic
 
 # ------------------------------------------------------------
@@ -32,16 +32,8 @@ if lang_arg not in ("el", "en"):
 
 
 def tr(key: str, **kwargs) -> str:
-    """Translation helper using TRANSLATIONS dict from Flask."""
-    base = TRANSLATIONS.get("el", {})
-    cur = TRANSLATIONS.get(lang_arg, base)
-    text = cur.get(key) or base.get(key) or key
-    if kwargs:
-        try:
-            return text.format(**kwargs)
-        except Exception:
-            return text
-    return text
+    """Translation helper using the shared catalogs from Flask (translations.t)."""
+    return t(lang_arg, key, **kwargs)
 
 
 def send_stats(username, age, score, time_seconds, result):
@@ -63,7 +55,7 @@ def send_stats(username, age, score, time_seconds, result):
     }
     try:
         response = requests.post("http://127.0.0.1:5000/add_stat", json=data)
-        if response.status_code == 200:
+        if 200 <= response.status_code < 300:   # 202 when the server queues the write
             print("✅ Stats sent to Flask")
         else:
             print(f"⚠️ Stats send error ({response.status_code}):", response.text)
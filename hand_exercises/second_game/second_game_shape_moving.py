@@ -16,7 +16,7 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 if BASE_DIR not in sys.path:
     sys.path.insert(0, BASE_DIR)
 
-from translations import TRANSLATIONS  # uses the same translations.py as Flask (next to app.py)
+from translations import t  # uses the same translations.py catalogs as Flask (next to app.py)
 
 # ------------------------------------------------------------
 # ✅ Read args passed from Flask
@@ -32,19 +32,11 @@ if lang_arg not in ("el", "en"):
 def tr(key: str, **kwargs) -> str:
     """
     Translation helper.
-    - Looks up key in selected language dict
-    - Falls back to Greek if missing, then to key itself
+    - Looks up key in the selected language's catalog (built once, fallbacks already resolved)
+    - Unknown keys come back as the key itself
     - Supports format placeholders: tr("level_label", level=1, score=2, goal=10)
     """
-    base = TRANSLATIONS.get("el", {})
-    cur = TRANSLATIONS.get(lang_arg, base)
-    text = cur.get(key) or base.get(key) or key
-    if kwargs:
-        try:
-            return text.format(**kwargs)
-        except Exception:
-            return text
-    return text
+    return t(lang_arg, key, **kwargs)
 
 
 def send_stats(username, age, score, time_seconds, result):
@@ -58,7 +50,7 @@ def send_stats(username, age, score, time_seconds, result):
     }
     try:
         response = requests.post("http://127.0.0.1:5000/add_stat", json=data)
-        if response.status_code == 200:
+        if 200 <= response.status_code < 300:   # 202 when the server queues the write
             print("✅ Stats sent to Flask")
         else:
             print(f"⚠️ Stats send error ({response.status_code}):", response.text)
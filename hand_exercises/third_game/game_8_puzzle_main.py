@@ -50,7 +50,7 @@ def send_stats(username, age, score, time_seconds, result):
         response = requests.post("http://127.0.0.1:5000/add_stat", json=data)
 
         # Check response
-        if response.status_code == 200:
+        if 200 <= response.status_code < 300:   # 202 when the server queues the write
             print("✅ Stats sent to Flask")
         else:
             print(f"⚠️ Stats send error ({response.status_code}):", response.text)
@@ -0,0 +1,399 @@
+#jobs.py
+#Durable background jobs in Postgres (table `jobs`, migration 14).
+#A request only inserts a row with enqueue_job() in its own transaction; worker
+#threads claim runnable rows with SELECT ... FOR UPDATE SKIP LOCKED, so any number
+#of threads/processes/machines can share the queue without handing out a job twice.
+#A failed job goes back to the queue with exponential backoff until max_attempts;
+#a job whose worker died is requeued once its lease runs out.
+#The web app runs JOBS_THREADS worker threads per gunicorn worker unless
+#JOBS_IN_PROCESS=0; then `python -m jobs worker` has to run as its own service.
+#
+#Usage:
+#   python -m jobs worker [--threads 4] [--processes 1] [--poll 5]
+#   python -m jobs enqueue rebuild_rollups [--payload '{"chunk_size": 500}']
+#   python -m jobs status
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+
+import rollups
+from database import database_url_from_env
+
+CHANNEL = "jobs_new"
+LEASE_SECONDS = 600          # a running job not heard from for this long belongs to a dead worker
+STALE_CHECK_SECONDS = 60
+BACKOFF_BASE = 5             # seconds before the 1st retry, doubled every attempt
+BACKOFF_MAX = 3600
+PURGE_CHUNK = 5000           # game_statistics rows per purge transaction
+
+
+class PermanentError(Exception):
+    """Raised by a handler when retrying can not help."""
+
+
+HANDLERS = {}
+
+
+def handler(kind):
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+ENQUEUE_SQL = """
+INSERT INTO jobs (kind, payload, user_id, max_attempts, run_at)
+VALUES (%s, %s::jsonb, %s, %s, NOW() + %s * INTERVAL '1 second')
+RETURNING id
+"""
+
+CLAIM_SQL = """
+UPDATE jobs
+SET status = 'running', attempts = attempts + 1, locked_by = %s, locked_at = NOW()
+WHERE id = (
+  SELECT id FROM jobs
+  WHERE status = 'queued' AND run_at <= NOW()
+  ORDER BY run_at, id
+  LIMIT 1
+  FOR UPDATE SKIP LOCKED
+)
+RETURNING id, kind, payload, user_id, attempts, max_attempts
+"""
+
+REQUEUE_STALE_SQL = """
+UPDATE jobs
+SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+    finished_at = CASE WHEN attempts >= max_attempts THEN NOW() END,
+    last_error = 'lease expired, worker ' || COALESCE(locked_by, '?') || ' is gone',
+    locked_by = NULL,
+    locked_at = NULL
+WHERE status = 'running' AND locked_at < NOW() - %s * INTERVAL '1 second'
+"""
+
+
+def enqueue_job(cur, kind, payload=None, user_id=None, max_attempts=5, delay=0):
+    """
+    Queue a job with the caller's cursor, so it is committed (or rolled back)
+    together with the caller's own writes. Returns the job id.
+    """
+    cur.execute(ENQUEUE_SQL, (kind, json.dumps(payload or {}), user_id, max_attempts, delay))
+    row = cur.fetchone()
+    job_id = row["id"] if isinstance(row, dict) else row[0]
+    # delivered at commit; idle workers wake up instead of waiting for their next poll
+    cur.execute("SELECT pg_notify(%s, %s)", (CHANNEL, kind))
+    return job_id
+
+
+class Job:
+    def __init__(self, conn, row):
+        self.conn = conn
+        self.id, self.kind, self.payload, self.user_id, self.attempts, self.max_attempts = row
+
+    def progress(self, **data):
+        """Commit a progress note for /api/jobs; also renews the lease of long jobs."""
+        with self.conn.cursor() as cur:
+            cur.execute("UPDATE jobs SET progress = %s::jsonb, locked_at = NOW() WHERE id = %s",
+                        (json.dumps(data), self.id))
+        self.conn.commit()
+
+
+def retry_delay(attempts):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)   # jitter: failed jobs don't come back in lockstep
+
+
+def _finish(conn, job, result):
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE jobs
+            SET status = 'done', result = %s::jsonb, last_error = NULL,
+                locked_by = NULL, locked_at = NULL, finished_at = NOW()
+            WHERE id = %s
+        """, (json.dumps(result), job.id))
+    conn.commit()
+
+
+def _fail(conn, job, error):
+    message = f"{type(error).__name__}: {error}"[:2000]
+    with conn.cursor() as cur:
+        if isinstance(error, PermanentError) or job.attempts >= job.max_attempts:
+            cur.execute("""
+                UPDATE jobs
+                SET status = 'failed', last_error = %s, locked_by = NULL, locked_at = NULL, finished_at = NOW()
+                WHERE id = %s
+            """, (message, job.id))
+            print(f"❌ job {job.id} ({job.kind}) failed for good after {job.attempts} attempts: {message}")
+        else:
+            delay = retry_delay(job.attempts)
+            cur.execute("""
+                UPDATE jobs
+                SET status = 'queued', last_error = %s, locked_by = NULL, locked_at = NULL,
+                    run_at = NOW() + %s * INTERVAL '1 second'
+                WHERE id = %s
+            """, (message, delay, job.id))
+            print(f"⚠️ job {job.id} ({job.kind}) attempt {job.attempts} failed ({message}), retry in {delay:.0f}s")
+    conn.commit()
+
+
+def run_one(conn, worker_id):
+    """Claim and run one job. False when nothing was runnable."""
+    with conn.cursor() as cur:
+        cur.execute(CLAIM_SQL, (worker_id,))
+        row = cur.fetchone()
+    conn.commit()
+    if row is None:
+        return False
+
+    job = Job(conn, row)
+    func = HANDLERS.get(job.kind)
+    started = time.monotonic()
+    try:
+        if func is None:
+            raise PermanentError(f"unknown job kind {job.kind!r}")
+        result = func(conn, job)
+        conn.commit()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        # connection gone: the lease brings the job back
+        raise
+    except Exception as e:
+        conn.rollback()
+        _fail(conn, job, e)
+        return True
+    _finish(conn, job, result)
+    print(f"✅ job {job.id} ({job.kind}) done in {time.monotonic() - started:.2f}s")
+    return True
+
+
+def requeue_stale(conn, lease=LEASE_SECONDS):
+    with conn.cursor() as cur:
+        cur.execute(REQUEUE_STALE_SQL, (lease,))
+        count = cur.rowcount
+    conn.commit()
+    if count:
+        print(f"⚠️ jobs: {count} job(s) with an expired lease put back")
+    return count
+
+
+# -------------------------------------------------------------------
+# Handlers
+# -------------------------------------------------------------------
+@handler("purge_account")
+def purge_account(conn, job):
+    """Delete an account hidden by /delete_account: its stats in chunks, then the users row."""
+    user_id = int(job.payload["user_id"])
+    chunk_size = int(job.payload.get("chunk_size", PURGE_CHUNK))
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT deleted_at FROM users WHERE id = %s", (user_id,))
+        row = cur.fetchone()
+    conn.commit()
+    if row is not None and row[0] is None:
+        raise PermanentError(f"user {user_id} is not marked as deleted")
+
+    deleted = 0
+    while True:
+        # short transactions: the table is never locked for long, and a retry resumes
+        with conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM game_statistics
+                WHERE id IN (SELECT id FROM game_statistics WHERE user_id = %s LIMIT %s)
+            """, (user_id, chunk_size))
+            count = cur.rowcount
+        conn.commit()
+        deleted += count
+        job.progress(stats_deleted=deleted)
+        if count < chunk_size:
+            break
+
+    with conn.cursor() as cur:
+        # game_stats_daily goes with it (ON DELETE CASCADE)
+        cur.execute("DELETE FROM users WHERE id = %s AND deleted_at IS NOT NULL", (user_id,))
+        user_deleted = cur.rowcount == 1
+    conn.commit()
+    return {"stats_deleted": deleted, "user_deleted": user_deleted}
+
+
+@handler("rebuild_rollups")
+def rebuild_rollups(conn, job):
+    """Recompute game_stats_daily; for all users it fans out one job per chunk of users."""
+    payload = job.payload
+    if "user_id" in payload:
+        return {"rows": rollups.rebuild_range(conn, payload["user_id"], payload["user_id"])}
+    if "first_id" in payload:
+        return {"rows": rollups.rebuild_range(conn, payload["first_id"], payload["last_id"])}
+
+    chunks = rollups.user_id_chunks(conn, int(payload.get("chunk_size", 500)))
+    with conn.cursor() as cur:
+        for first_id, last_id in chunks:
+            enqueue_job(cur, "rebuild_rollups", {"first_id": first_id, "last_id": last_id})
+    conn.commit()
+    return {"chunks": len(chunks)}
+
+
+# -------------------------------------------------------------------
+# Worker
+# -------------------------------------------------------------------
+def _work_loop(url, worker_id, stop, wake, poll):
+    conn = None
+    backoff = 1
+    try:
+        while not stop.is_set():
+            try:
+                if conn is None or conn.closed:
+                    conn = psycopg2.connect(url)
+                if run_one(conn, worker_id):
+                    backoff = 1
+                    continue
+            except psycopg2.Error as e:
+                print(f"⚠️ jobs: {worker_id} lost its connection ({e}), retrying in {backoff}s")
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                stop.wait(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            # queue empty: sleep until a NOTIFY or the next poll
+            wake.wait(poll)
+            wake.clear()
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def _listen_loop(url, stop, wakes):
+    """One LISTEN connection per process: wakes the threads and requeues dead workers' jobs."""
+    backoff = 1
+    while not stop.is_set():
+        conn = None
+        try:
+            conn = psycopg2.connect(url)
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL}")
+            backoff = 1
+            last_check = 0
+            while not stop.is_set():
+                if time.monotonic() - last_check >= STALE_CHECK_SECONDS:
+                    requeue_stale(conn)
+                    last_check = time.monotonic()
+                if select.select([conn], [], [], 1) == ([], [], []):
+                    continue
+                conn.poll()
+                if conn.notifies:
+                    conn.notifies.clear()
+                    for wake in wakes:
+                        wake.set()
+        except psycopg2.Error as e:
+            print(f"⚠️ jobs listener lost its connection ({e}), retrying in {backoff}s")
+            stop.wait(backoff)
+            backoff = min(backoff * 2, 30)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+def start_workers(url, threads=4, poll=5.0, stop=None, daemon=True):
+    """Start `threads` worker threads (+ the listener) in this process. Returns (stop, threads)."""
+    stop = stop or threading.Event()
+    wakes = [threading.Event() for _ in range(threads)]
+    host = socket.gethostname()
+    started = [threading.Thread(target=_listen_loop, args=(url, stop, wakes), name="jobs-listener", daemon=True)]
+    for n, wake in enumerate(wakes):
+        worker_id = f"{host}:{os.getpid()}:{n}"
+        started.append(threading.Thread(target=_work_loop, args=(url, worker_id, stop, wake, poll),
+                                        name=f"jobs-worker-{n}", daemon=daemon))
+    for thread in started:
+        thread.start()
+    return stop, started
+
+
+def run_worker(url, threads=4, poll=5.0):
+    """Blocking worker process; SIGTERM/SIGINT let the running jobs finish first."""
+    stop = threading.Event()
+
+    def shutdown(signum, frame):
+        print("🛑 jobs worker stopping after the current jobs...")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    stop, started = start_workers(url, threads=threads, poll=poll, stop=stop, daemon=False)
+    print(f"👷 jobs worker {os.getpid()} running {threads} thread(s)")
+    while not stop.is_set():
+        stop.wait(1)
+    for thread in started[1:]:
+        thread.join()
+
+
+def queue_status(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT kind, status, COUNT(*), MIN(run_at) FILTER (WHERE status = 'queued')
+            FROM jobs
+            GROUP BY kind, status
+            ORDER BY kind, status
+        """)
+        return cur.fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Background jobs stored in Postgres.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker = sub.add_parser("worker", help="run jobs until stopped")
+    worker.add_argument("--threads", type=int, default=4, help="worker threads per process")
+    worker.add_argument("--processes", type=int, default=1)
+    worker.add_argument("--poll", type=float, default=5.0, help="seconds between polls when idle")
+    add = sub.add_parser("enqueue", help="queue a job")
+    add.add_argument("kind", choices=sorted(HANDLERS))
+    add.add_argument("--payload", default="{}", help="JSON object")
+    add.add_argument("--max-attempts", type=int, default=5)
+    sub.add_parser("status", help="jobs per kind and status")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    url = database_url_from_env()
+
+    if args.command == "worker":
+        if args.processes <= 1:
+            run_worker(url, args.threads, args.poll)
+            return 0
+        procs = [multiprocessing.Process(target=run_worker, args=(url, args.threads, args.poll))
+                 for _ in range(args.processes)]
+        for proc in procs:
+            proc.start()
+        # children get SIGTERM/SIGINT themselves and shut down cleanly
+        signal.signal(signal.SIGTERM, lambda signum, frame: [proc.terminate() for proc in procs])
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for proc in procs:
+            proc.join()
+        return 0
+
+    conn = psycopg2.connect(url)
+    try:
+        if args.command == "enqueue":
+            with conn.cursor() as cur:
+                job_id = enqueue_job(cur, args.kind, json.loads(args.payload), max_attempts=args.max_attempts)
+            conn.commit()
+            print(f"Done ✅ job {job_id} queued.")
+        else:
+            for kind, status, count, next_run in queue_status(conn):
+                print(f"{kind:<20} {status:<8} {count:>8}  {next_run or ''}")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#leader.py
+#One leader per cluster through a Postgres session advisory lock.
+#Every process runs a small thread with its own connection that keeps trying
+#pg_try_advisory_lock(key). Whoever holds it is the leader until its connection
+#goes away: if the leader process dies (or its link does), Postgres drops the
+#lock and the next follower takes over within `interval` seconds.
+#TCP keepalives make the server notice a vanished leader host quickly.
+
+import os
+import threading
+import time
+
+import psycopg2
+
+KEEPALIVE_OPTIONS = "-c tcp_keepalives_idle=10 -c tcp_keepalives_interval=5 -c tcp_keepalives_count=3"
+
+
+class LeaderElection:
+    def __init__(self, dsn, key, on_elected, on_deposed, interval=10, name="leader"):
+        self.dsn = dsn
+        self.key = key
+        self.on_elected = on_elected
+        self.on_deposed = on_deposed
+        self.interval = interval
+        self.name = name
+        self.is_leader = False
+        self.elections = 0
+        self.reconnects = 0
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        # one thread per process (and again after a fork)
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self.is_leader = False
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-election", daemon=True)
+        self._thread.start()
+
+    def _set_leader(self, value):
+        if value == self.is_leader:
+            return
+        self.is_leader = value
+        try:
+            if value:
+                self.elections += 1
+                print(f"👑 {self.name}: process {os.getpid()} is the leader")
+                self.on_elected()
+            else:
+                print(f"⚠️ {self.name}: process {os.getpid()} lost the leadership")
+                self.on_deposed()
+        except Exception as e:
+            print(f"⚠️ {self.name} callback error:", e)
+
+    def _run(self):
+        backoff = 1
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn, options=KEEPALIVE_OPTIONS,
+                                        keepalives=1, keepalives_idle=10, keepalives_interval=5, keepalives_count=3)
+                conn.autocommit = True
+                backoff = 1
+                with conn.cursor() as cur:
+                    while True:
+                        if self.is_leader:
+                            # the lock lives as long as this session: just prove it is still there
+                            cur.execute("SELECT 1")
+                        else:
+                            cur.execute("SELECT pg_try_advisory_lock(%s)", (self.key,))
+                            if cur.fetchone()[0]:
+                                self._set_leader(True)
+                        time.sleep(self.interval)
+            except psycopg2.Error as e:
+                self.reconnects += 1
+                print(f"⚠️ {self.name}: election connection lost ({e}), retrying in {backoff}s")
+            finally:
+                # without the session there is no lock: stop leading right away
+                self._set_leader(False)
+                if conn is not None:
+                    conn.close()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def stats(self):
+        return {
+            "leader": self.is_leader,
+            "elections": self.elections,
+            "reconnects": self.reconnects,
+            "running": self._thread is not None and self._thread.is_alive(),
+        }
@@ -0,0 +1,486 @@
+#legacy_import.py
+#Moves the data of the old versions of the app into Postgres:
+#   - the MySQL/phpMyAdmin dump (`check_users (1).sql`)      -> users / game_statistics
+#   - the live MySQL `scores` table written by db_utils.save_score -> game_statistics
+#   - the SQLite Hand.db used by send_data_users.py            -> users / game_statistics
+#Rows are streamed from the source in chunks and sent with COPY FROM STDIN into a
+#temp staging table, then merged with one INSERT ... SELECT per chunk. Memory stays
+#constant no matter how many rows the source has.
+#
+#Usage:
+#   python legacy_import.py dump "check_users (1).sql" [--chunk-size 10000]
+#   python legacy_import.py mysql --host localhost --user root --database game_data
+#   python legacy_import.py sqlite Hand.db
+
+import argparse
+import itertools
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from dotenv import load_dotenv
+
+from database import database_url_from_env
+from passwords import hash_password, hasher, is_password_hash
+from stat_keys import game_key_for, result_key_for
+
+# legacy table -> kind of rows it holds
+USER_TABLES = ("check_users", "users")
+STAT_TABLES = ("scores", "game_statistics")
+
+STAGE_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS stage_users (
+  username TEXT, email TEXT, password TEXT, created_at TIMESTAMPTZ
+);
+CREATE TEMP TABLE IF NOT EXISTS stage_stats (
+  idempotency_key TEXT, username TEXT, age INTEGER,
+  game_name TEXT, game_key game_key_t, score DOUBLE PRECISION, time_seconds DOUBLE PRECISION,
+  result TEXT, result_key result_key_t, created_at TIMESTAMPTZ
+);
+-- legacy username -> the account its email landed on, for every user row of this run
+CREATE TEMP TABLE IF NOT EXISTS legacy_user_map (
+  username TEXT NOT NULL, user_id BIGINT NOT NULL, PRIMARY KEY (username, user_id)
+);
+"""
+
+STAGE_COLUMNS = {
+    "users": ("username", "email", "password", "created_at"),
+    "stats": ("idempotency_key", "username", "age", "game_name", "game_key",
+              "score", "time_seconds", "result", "result_key", "created_at"),
+}
+
+# existing emails win. A username that is taken (by an account already in Postgres or
+# an earlier row of the chunk) gets the migration 19 rule: `name#id`, logged in
+# username_renames so the user can be told. Passwords arrive bcrypt'd or as werkzeug
+# hashes (see _prepare_passwords).
+MERGE_USERS_SQL = """
+WITH src AS (
+    SELECT DISTINCT ON (s.email) s.username, s.email, s.password, COALESCE(s.created_at, NOW()) AS created_at
+    FROM stage_users s
+    WHERE s.email <> '' AND s.username <> ''
+      AND NOT EXISTS (SELECT 1 FROM users u WHERE u.email = s.email)
+    ORDER BY s.email, s.created_at
+),
+numbered AS (
+    SELECT src.*, nextval(pg_get_serial_sequence('users', 'id')) AS id,
+           ROW_NUMBER() OVER (PARTITION BY src.username ORDER BY src.created_at, src.email) > 1
+             OR EXISTS (SELECT 1 FROM users u WHERE u.username = src.username) AS renamed
+    FROM src
+),
+ins AS (
+    INSERT INTO users (id, username, email, password, created_at)
+    SELECT id, CASE WHEN renamed THEN LEFT(username, 240) || '#' || id ELSE username END,
+           email, password, created_at
+    FROM numbered
+    ON CONFLICT (email) DO NOTHING
+    RETURNING id
+),
+renames AS (
+    INSERT INTO username_renames (user_id, old_username, new_username)
+    SELECT n.id, n.username, LEFT(n.username, 240) || '#' || n.id
+    FROM numbered n
+    JOIN ins ON ins.id = n.id
+    WHERE n.renamed
+    RETURNING user_id
+)
+SELECT (SELECT COUNT(*) FROM ins), (SELECT COUNT(*) FROM renames)
+"""
+
+# emails are unique, so a legacy user is whoever owns its email now (imported or not,
+# renamed or not)
+MAP_USERS_SQL = """
+INSERT INTO legacy_user_map (username, user_id)
+SELECT DISTINCT s.username, u.id
+FROM stage_users s
+JOIN users u ON u.email = s.email
+WHERE s.username <> ''
+ON CONFLICT DO NOTHING
+"""
+
+# same shape as /add_stats: user_id/age from one join, rollup kept in step
+MERGE_STATS_SQL = """
+WITH resolved AS (
+    -- a name from this run's users -> their account; several accounts -> ambiguous.
+    -- Other names only by exact username, and not if an account was renamed away from
+    -- it (the stats could belong to either one).
+    SELECT s.*,
+           CASE WHEN m.n = 1 THEN m.user_id WHEN m.n = 0 AND NOT r.renamed THEN u.id END AS user_id,
+           m.n > 1 OR (m.n = 0 AND r.renamed) AS ambiguous
+    FROM stage_stats s
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) AS n, MIN(user_id) AS user_id FROM legacy_user_map WHERE username = s.username
+    ) m
+    CROSS JOIN LATERAL (
+        SELECT EXISTS (SELECT 1 FROM username_renames WHERE old_username = s.username) AS renamed
+    ) r
+    LEFT JOIN users u ON u.username = s.username
+),
+ins AS (
+    INSERT INTO game_statistics (user_id, username, age, game_name, game_key, score, time_seconds,
+                                 result, result_key, idempotency_key, created_at)
+    SELECT s.user_id, CASE WHEN s.user_id IS NULL THEN s.username END, COALESCE(u.age, s.age),
+           s.game_name, s.game_key, s.score, s.time_seconds, s.result, s.result_key, s.idempotency_key,
+           COALESCE(s.created_at, NOW())
+    FROM resolved s
+    LEFT JOIN users u ON u.id = s.user_id
+    WHERE NOT s.ambiguous
+    ON CONFLICT ((COALESCE(user_id, 0)), idempotency_key) WHERE idempotency_key IS NOT NULL DO NOTHING
+    RETURNING user_id, game_key, score, time_seconds, created_at
+),
+daily AS (
+    INSERT INTO game_stats_daily AS d (user_id, game_key, day, plays, sum_score, scored_plays, sum_time, last_played)
+    SELECT user_id, game_key, created_at::date, COUNT(*),
+           COALESCE(SUM(score), 0), COUNT(score), COALESCE(SUM(time_seconds), 0), MAX(created_at)
+    FROM ins
+    WHERE user_id IS NOT NULL
+    GROUP BY user_id, game_key, created_at::date
+    ON CONFLICT (user_id, game_key, day) DO UPDATE SET
+        plays = d.plays + EXCLUDED.plays,
+        sum_score = d.sum_score + EXCLUDED.sum_score,
+        scored_plays = d.scored_plays + EXCLUDED.scored_plays,
+        sum_time = d.sum_time + EXCLUDED.sum_time,
+        last_played = GREATEST(d.last_played, EXCLUDED.last_played)
+)
+SELECT (SELECT COUNT(*) FROM ins),
+       (SELECT array_agg(DISTINCT username) FROM resolved WHERE ambiguous)
+"""
+
+
+# -------------------------------------------------------------------
+# Normalization (legacy row dict -> staging row)
+# -------------------------------------------------------------------
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", "replace")
+    return str(value).strip()
+
+
+def _timestamp(value):
+    value = _text(value)
+    if not value or value.startswith("0000-00-00"):
+        return None
+    # MySQL DATETIME / SQLite isoformat carry no zone; the dumps are written in UTC
+    if "+" not in value[10:] and not value.endswith("Z"):
+        value += "+00"
+    return value
+
+
+def user_row(row):
+    return (
+        _text(row.get("username")) or "",
+        (_text(row.get("email")) or "").lower(),
+        _text(row.get("password")) or "",
+        _timestamp(row.get("created_at")),
+    )
+
+
+def stat_row(source, table, row):
+    game_name = _text(row.get("game_name") or row.get("game"))
+    result = _text(row.get("result"))
+    legacy_id = row.get("id")
+    # a stable key per source row, so running the import twice adds nothing
+    key = f"legacy:{source}:{table}:{legacy_id}"[:64] if legacy_id is not None else None
+    return (
+        key,
+        _text(row.get("username")),
+        row.get("age"),
+        game_name,
+        game_key_for(game_name),
+        row.get("score"),
+        row.get("time_seconds", row.get("time")),
+        result,
+        result_key_for(result),
+        _timestamp(row.get("created_at")),
+    )
+
+
+def _kind(table):
+    if table in USER_TABLES:
+        return "users"
+    if table in STAT_TABLES:
+        return "stats"
+    return None
+
+
+# -------------------------------------------------------------------
+# Sources: each yields (kind, staging row) one at a time
+# -------------------------------------------------------------------
+_MYSQL_ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+
+
+def _parse_values(chars, state):
+    """
+    Feed characters of an INSERT ... VALUES list; yields one list of values per tuple.
+    `state` survives between calls, so a statement may span any number of lines.
+    Returns (via state["done"]) when the closing ';' is reached.
+    """
+    for c in chars:
+        if state["in_str"]:
+            if state["esc"]:
+                state["token"].append(_MYSQL_ESCAPES.get(c, c))
+                state["esc"] = False
+            elif c == "\\":
+                state["esc"] = True
+            elif c == state["in_str"]:
+                state["in_str"] = None
+                state["closed"] = c          # '' inside a string is a quote
+            else:
+                state["token"].append(c)
+            continue
+
+        if state["closed"]:
+            quote, state["closed"] = state["closed"], None
+            if c == quote:
+                state["in_str"] = quote
+                state["token"].append(quote)
+                continue
+
+        if not state["depth"]:
+            if c == "(":
+                state.update(depth=1, row=[], token=[], quoted=False)
+            elif c == ";":
+                state["done"] = True
+                return
+            continue
+
+        if c in "'\"":
+            state["in_str"] = c
+            state["quoted"] = True
+        elif c in ",)":
+            value = "".join(state["token"])
+            if not state["quoted"] and value.upper() == "NULL":
+                value = None
+            state["row"].append(value)
+            state["token"], state["quoted"] = [], False
+            if c == ")":
+                state["depth"] = 0
+                yield state["row"]
+        elif not c.isspace():
+            state["token"].append(c)
+
+
+def dump_rows(path):
+    """Rows of the check_users / scores INSERTs of a MySQL dump, read line by line."""
+    columns = {}          # table -> column names from CREATE TABLE
+    creating = None
+    inserting = None      # (table, columns, parser state)
+
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if inserting is not None:
+                table, cols, state = inserting
+                for values in _parse_values(line, state):
+                    kind = _kind(table)
+                    if kind:
+                        yield table, kind, dict(zip(cols, values))
+                if state["done"]:
+                    inserting = None
+                continue
+
+            stripped = line.strip()
+            if creating is not None:
+                if stripped.startswith("`"):
+                    columns[creating].append(stripped.split("`")[1])
+                elif stripped.startswith(")"):
+                    creating = None
+                continue
+
+            if stripped.upper().startswith("CREATE TABLE"):
+                creating = stripped.split("`")[1]
+                columns[creating] = []
+            elif stripped.upper().startswith("INSERT INTO"):
+                table = stripped.split("`")[1]
+                head, _, rest = line.partition("VALUES")
+                if "(" in head.split(table, 1)[1]:
+                    cols = [c.strip(" `") for c in head.split("(", 1)[1].rsplit(")", 1)[0].split(",")]
+                else:
+                    cols = columns.get(table, [])
+                state = {"in_str": None, "esc": False, "closed": None, "depth": 0,
+                         "row": [], "token": [], "quoted": False, "done": False}
+                for values in _parse_values(rest, state):
+                    kind = _kind(table)
+                    if kind:
+                        yield table, kind, dict(zip(cols, values))
+                if not state["done"]:
+                    inserting = (table, cols, state)
+
+
+def mysql_rows(host, user, password, database, chunk_size):
+    """The `scores` table written by db_utils.save_score, fetched chunk by chunk."""
+    try:
+        import mysql.connector
+    except ImportError:
+        raise SystemExit("❌ mysql-connector-python is needed for the mysql source (pip install mysql-connector-python)")
+
+    conn = mysql.connector.connect(host=host, user=user, password=password, database=database)
+    try:
+        cursor = conn.cursor(dictionary=True)   # unbuffered: rows come from the server as we fetch
+        cursor.execute("SELECT * FROM scores")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield "scores", "stats", row
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def sqlite_rows(path):
+    """check_users (and a scores table, if there is one) from Hand.db."""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table in USER_TABLES + STAT_TABLES:
+            if table not in tables:
+                continue
+            kind = _kind(table)
+            for row in conn.execute(f'SELECT * FROM "{table}"'):   # sqlite3 cursors iterate lazily
+                yield table, kind, dict(row)
+    finally:
+        conn.close()
+
+
+# -------------------------------------------------------------------
+# COPY
+# -------------------------------------------------------------------
+def _copy_field(value):
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+class CopyStream:
+    """File-like object over an iterator of tuples, in COPY text format (read() by psycopg2)."""
+    def __init__(self, rows):
+        self._rows = rows
+        self._buffer = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._buffer += "\t".join(_copy_field(v) for v in row) + "\n"
+        if size < 0:
+            data, self._buffer = self._buffer, ""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+
+def _prepare_passwords(rows):
+    """
+    bcrypt the plaintext passwords of a users chunk (old MySQL check_users kept them
+    as typed); bcrypt and werkzeug hashes stay as they are, check_password takes both
+    and the login upgrades werkzeug ones. No password -> '!', which never matches.
+    """
+    plain = [i for i, row in enumerate(rows) if row[2] and not is_password_hash(row[2])]
+    with ThreadPoolExecutor(max_workers=hasher.workers) as pool:
+        hashed = dict(zip(plain, pool.map(hash_password, [rows[i][2] for i in plain])))
+    return [
+        (username, email, hashed.get(i, password) or "!", created_at)
+        for i, (username, email, password, created_at) in enumerate(rows)
+    ]
+
+
+def _flush(conn, kind, rows):
+    """COPY one chunk into the staging table and merge it; returns rows added."""
+    stage = f"stage_{kind}"
+    with conn.cursor() as cur:
+        cur.execute(f"TRUNCATE {stage}")
+        cur.copy_expert(f"COPY {stage} ({', '.join(STAGE_COLUMNS[kind])}) FROM STDIN", CopyStream(iter(rows)))
+        if kind == "users":
+            cur.execute(MERGE_USERS_SQL)
+            added, renamed = cur.fetchone()
+            if renamed:
+                print(f"   ⚠️ {renamed} taken username(s) imported as name#id (see username_renames)")
+            cur.execute(MAP_USERS_SQL)
+        else:
+            cur.execute(MERGE_STATS_SQL)
+            added, ambiguous = cur.fetchone()
+            if ambiguous:
+                print(f"   ⚠️ skipped stats of ambiguous username(s), more than one account could own them: "
+                      f"{', '.join(ambiguous)}")
+    conn.commit()
+    return added
+
+
+def run_import(conn, source_rows, source, chunk_size=10000):
+    """Stream (table, kind, row) tuples into Postgres; prints rows/s per chunk."""
+    with conn.cursor() as cur:
+        cur.execute(STAGE_SQL)
+        cur.execute("TRUNCATE legacy_user_map")
+    conn.commit()
+
+    # users first would be nicer for the join, but the sources are streamed once,
+    # so every chunk is flushed in source order (dumps list check_users before scores)
+    totals = {"users": [0, 0], "stats": [0, 0]}   # kind -> [read, added]
+    started = time.monotonic()
+    rows = iter(source_rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        for kind, group in itertools.groupby(chunk, key=lambda r: r[1]):
+            staged = [user_row(row) if kind == "users" else stat_row(source, table, row)
+                      for table, _, row in group]
+            if kind == "users":
+                staged = _prepare_passwords(staged)
+            totals[kind][0] += len(staged)
+            totals[kind][1] += _flush(conn, kind, staged)
+        read = totals["users"][0] + totals["stats"][0]
+        elapsed = time.monotonic() - started
+        print(f"   {read} rows read, {read / elapsed if elapsed else 0:.0f} rows/s")
+
+    elapsed = time.monotonic() - started
+    read = totals["users"][0] + totals["stats"][0]
+    print(f"   users: {totals['users'][1]}/{totals['users'][0]} added, "
+          f"game_statistics: {totals['stats'][1]}/{totals['stats'][0]} added")
+    print(f"   {read} rows in {elapsed:.1f}s ({read / elapsed if elapsed else 0:.0f} rows/s)")
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import the legacy MySQL/SQLite data into Postgres.")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="rows per COPY/transaction")
+    sub = parser.add_subparsers(dest="source", required=True)
+    dump = sub.add_parser("dump", help="MySQL/phpMyAdmin .sql dump")
+    dump.add_argument("path")
+    my = sub.add_parser("mysql", help="live MySQL `scores` table (db_utils.save_score)")
+    my.add_argument("--host", default="localhost")
+    my.add_argument("--user", default="root")
+    my.add_argument("--password", default="")
+    my.add_argument("--database", default="game_data")
+    lite = sub.add_parser("sqlite", help="SQLite Hand.db (send_data_users.py)")
+    lite.add_argument("path", nargs="?", default="Hand.db")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    if args.source == "dump":
+        rows = dump_rows(args.path)
+    elif args.source == "mysql":
+        rows = mysql_rows(args.host, args.user, args.password, args.database, args.chunk_size)
+    else:
+        rows = sqlite_rows(args.path)
+
+    conn = psycopg2.connect(database_url_from_env())
+    try:
+        print(f"➡️  Importing from {args.source}...")
+        run_import(conn, rows, args.source, chunk_size=args.chunk_size)
+    finally:
+        conn.close()
+    print("Done ✅ legacy import finished.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
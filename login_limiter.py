@@ -0,0 +1,114 @@
+#login_limiter.py
+#Token buckets for /check_user: `capacity` attempts, refilled continuously over
+#`window` seconds (a smooth sliding window). hit() runs before any DB or bcrypt
+#work and returns 0 when the attempt may go on, otherwise the seconds to wait.
+#
+#TokenBucketLimiter keeps the buckets in the process (an LRU of key -> (tokens, t),
+#max_keys entries), PostgresTokenBucketLimiter keeps them in the UNLOGGED table
+#login_buckets, so every worker and node shares the same counts (LOGIN_LIMITER=postgres).
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    def __init__(self, capacity=10, window=60, max_keys=100_000):
+        self.capacity = float(capacity)
+        self.rate = capacity / float(window)   # tokens per second
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()          # key -> (tokens, last refill, monotonic)
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    def _take(self, key, now):
+        tokens, last = self._buckets.pop(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - last) * self.rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        return (1 - tokens) / self.rate
+
+    def hit(self, *keys):
+        """Take one token from every key's bucket; the longest wait, 0 if all had one."""
+        now = time.monotonic()
+        with self._lock:
+            wait = max(self._take(key, now) for key in dict.fromkeys(keys))
+            while len(self._buckets) > self.max_keys:
+                # oldest entries first; an evicted bucket simply starts full again
+                self._buckets.popitem(last=False)
+        if wait:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return wait
+
+    def reset(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._buckets.pop(key, None)
+
+    def stats(self):
+        return {"mode": "memory", "keys": len(self._buckets), "allowed": self.allowed, "limited": self.limited}
+
+
+class PostgresTokenBucketLimiter:
+    """Same buckets in Postgres; `db` is the app's pooled connection (cursor/commit)."""
+    PRUNE_EVERY = 500
+
+    def __init__(self, db, capacity=10, window=60):
+        self.db = db
+        self.capacity = float(capacity)
+        self.window = float(window)
+        self.rate = capacity / float(window)
+        self.allowed = 0
+        self.limited = 0
+        self._hits = 0
+        # capacity and rate are config numbers, inlined so the statement only takes the keys
+        refill = (f"LEAST({self.capacity}, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at)"
+                  f" * {self.rate})")
+        self.hit_sql = f"""
+            INSERT INTO login_buckets AS b (key, tokens, allowed, updated_at)
+            SELECT k, {self.capacity} - 1, TRUE, clock_timestamp()
+            FROM unnest(%s::text[]) AS k
+            ON CONFLICT (key) DO UPDATE SET
+              tokens = CASE WHEN {refill} >= 1 THEN {refill} - 1 ELSE {refill} END,
+              allowed = {refill} >= 1,
+              updated_at = clock_timestamp()
+            RETURNING allowed, tokens
+        """
+
+    def hit(self, *keys):
+        cursor = self.db.cursor()
+        try:
+            cursor.execute(self.hit_sql, (list(dict.fromkeys(keys)),))
+            rows = cursor.fetchall()
+            self._hits += 1
+            if self._hits % self.PRUNE_EVERY == 0:
+                # idle longer than a window = full bucket, same as no row
+                cursor.execute(
+                    "DELETE FROM login_buckets WHERE updated_at < clock_timestamp() - %s * INTERVAL '1 second'",
+                    (self.window,),
+                )
+            self.db.commit()
+        finally:
+            cursor.close()
+        wait = max(0.0 if allowed else (1 - tokens) / self.rate for allowed, tokens in rows)
+        if wait:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return wait
+
+    def reset(self, *keys):
+        cursor = self.db.cursor()
+        try:
+            cursor.execute("DELETE FROM login_buckets WHERE key = ANY(%s)", (list(keys),))
+            self.db.commit()
+        finally:
+            cursor.close()
+
+    def stats(self):
+        return {"mode": "postgres", "allowed": self.allowed, "limited": self.limited}
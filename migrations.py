@@ -0,0 +1,581 @@
+#migrations.py
+#Versioned schema migrations for the Postgres database.
+#create_tables.py creates the base tables; everything after that lives here.
+#Applied versions are recorded in schema_migrations, so running it again is a no-op.
+#
+#Usage:
+#   python migrations.py          apply pending migrations
+#   python migrations.py --list   show applied / pending versions
+
+import os
+import sys
+import time
+
+import psycopg2
+import psycopg2.extras
+from dotenv import load_dotenv
+
+import stat_keys
+from database import database_url_from_env
+
+# any constant works, it only has to be the same for every runner
+MIGRATIONS_LOCK_KEY = 827_301
+
+
+class Migration:
+    """
+    One schema version. `sql` statements run in a single transaction,
+    `indexes` are (name, definition) pairs built with CREATE INDEX CONCURRENTLY
+    (outside any transaction, so writes to the table are never blocked),
+    `unique_indexes` the same with CREATE UNIQUE INDEX CONCURRENTLY,
+    `drop_indexes` are index names removed with DROP INDEX CONCURRENTLY,
+    `python` is an optional callable(conn) for batched data backfills.
+    """
+    def __init__(self, version, name, sql=(), indexes=(), unique_indexes=(), drop_indexes=(), python=None):
+        self.version = version
+        self.name = name
+        self.sql = list(sql)
+        self.indexes = list(indexes)
+        self.unique_indexes = list(unique_indexes)
+        self.drop_indexes = list(drop_indexes)
+        self.python = python
+
+
+def backfill_game_statistics_user_id(conn, batch_size=5000):
+    """Fill game_statistics.user_id from the username, one id range per transaction."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT MIN(id), MAX(id) FROM game_statistics WHERE user_id IS NULL")
+        low, high = cur.fetchone()
+    if low is None:
+        return
+
+    total = 0
+    start = low - 1
+    while start < high:
+        end = start + batch_size
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE game_statistics gs
+                SET user_id = (SELECT MIN(u.id) FROM users u WHERE u.username = gs.username)
+                WHERE gs.id > %s AND gs.id <= %s
+                  AND gs.user_id IS NULL
+                  AND gs.username IS NOT NULL
+            """, (start, end))
+            total += cur.rowcount
+        start = end
+    print(f"   backfilled user_id on {total} rows")
+
+
+def backfill_stat_keys(conn, batch_size=5000):
+    """Fill game_key/result_key with the same Python normalization add_stat uses."""
+    with conn.cursor() as cur:
+        # few distinct spellings exist, so map them once and join in SQL
+        cur.execute("SELECT DISTINCT game_name FROM game_statistics WHERE game_key IS NULL")
+        games = [(raw, stat_keys.game_key_for(raw)) for (raw,) in cur.fetchall() if raw is not None]
+        cur.execute("SELECT DISTINCT result FROM game_statistics WHERE game_key IS NULL")
+        results = [(raw, stat_keys.result_key_for(raw)) for (raw,) in cur.fetchall() if raw is not None]
+
+        cur.execute("CREATE TEMP TABLE game_key_map (raw TEXT PRIMARY KEY, key game_key_t)")
+        cur.execute("CREATE TEMP TABLE result_key_map (raw TEXT PRIMARY KEY, key result_key_t)")
+        psycopg2.extras.execute_values(cur, "INSERT INTO game_key_map VALUES %s", games)
+        psycopg2.extras.execute_values(cur, "INSERT INTO result_key_map VALUES %s", results)
+
+        cur.execute("SELECT MIN(id), MAX(id) FROM game_statistics WHERE game_key IS NULL")
+        low, high = cur.fetchone()
+
+    total = 0
+    start = (low or 0) - 1
+    while low is not None and start < high:
+        end = start + batch_size
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE game_statistics gs
+                SET game_key = COALESCE((SELECT m.key FROM game_key_map m WHERE m.raw = gs.game_name), 'other'),
+                    result_key = (SELECT m.key FROM result_key_map m WHERE m.raw = gs.result)
+                WHERE gs.id > %s AND gs.id <= %s AND gs.game_key IS NULL
+            """, (start, end))
+            total += cur.rowcount
+        start = end
+
+    with conn.cursor() as cur:
+        cur.execute("DROP TABLE game_key_map, result_key_map")
+    print(f"   backfilled game_key/result_key on {total} rows")
+
+
+def rename_duplicate_usernames(conn):
+    """
+    Before the unique index: later accounts sharing a username get `name#id`.
+    Every rename is kept in username_renames so those users can be told their
+    new login name (their email keeps working for login).
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS username_renames (
+              user_id BIGINT PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+              old_username VARCHAR(255) NOT NULL,
+              new_username VARCHAR(255) NOT NULL,
+              renamed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """)
+        cur.execute("""
+            WITH renamed AS (
+              UPDATE users u
+              SET username = LEFT(u.username, 240) || '#' || u.id
+              FROM (
+                SELECT id, username, ROW_NUMBER() OVER (PARTITION BY username ORDER BY id) AS n
+                FROM users
+              ) d
+              WHERE d.id = u.id AND d.n > 1
+              RETURNING u.id, d.username AS old_username, u.username AS new_username
+            )
+            INSERT INTO username_renames (user_id, old_username, new_username)
+            SELECT id, old_username, new_username FROM renamed
+            RETURNING user_id, old_username, new_username
+        """)
+        for user_id, old_username, new_username in cur.fetchall():
+            print(f"   ⚠️ renamed duplicate username of user {user_id}: {old_username} -> {new_username}")
+
+
+MIGRATIONS = [
+    Migration(
+        1,
+        "game_statistics recent-history covering index",
+        # dashboard/today/api_stats filter by username and order/filter by created_at;
+        # the INCLUDE columns let those queries run as index-only scans
+        indexes=[
+            ("game_statistics_username_created_at_idx",
+             "ON game_statistics (username, created_at DESC) "
+             "INCLUDE (game_name, score, time_seconds, result, age)"),
+        ],
+    ),
+    Migration(
+        2,
+        "users username lookup index",
+        indexes=[
+            ("users_username_idx", "ON users (username)"),
+        ],
+    ),
+    Migration(
+        3,
+        "game_statistics.user_id foreign key",
+        # NOT VALID: existing rows are checked later without blocking writes
+        sql=[
+            "ALTER TABLE game_statistics ADD COLUMN IF NOT EXISTS user_id BIGINT",
+            """
+            DO $$
+            BEGIN
+              IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'game_statistics_user_id_fkey') THEN
+                ALTER TABLE game_statistics
+                  ADD CONSTRAINT game_statistics_user_id_fkey
+                  FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE NOT VALID;
+              END IF;
+            END $$;
+            """,
+        ],
+    ),
+    Migration(
+        4,
+        "game_statistics by user_id covering index",
+        indexes=[
+            ("game_statistics_user_id_created_at_idx",
+             "ON game_statistics (user_id, created_at DESC) "
+             "INCLUDE (game_name, score, time_seconds, result, age)"),
+        ],
+    ),
+    Migration(
+        5,
+        "backfill game_statistics.user_id",
+        python=backfill_game_statistics_user_id,
+        sql=[
+            "ALTER TABLE game_statistics VALIDATE CONSTRAINT game_statistics_user_id_fkey",
+        ],
+    ),
+    Migration(
+        6,
+        "game_stats_daily rollup table",
+        sql=["""
+            CREATE TABLE IF NOT EXISTS game_stats_daily (
+              user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+              game_name VARCHAR(100) NOT NULL,
+              day DATE NOT NULL,
+              plays INTEGER NOT NULL DEFAULT 0,
+              sum_score DOUBLE PRECISION NOT NULL DEFAULT 0,
+              scored_plays INTEGER NOT NULL DEFAULT 0,
+              sum_time DOUBLE PRECISION NOT NULL DEFAULT 0,
+              last_played TIMESTAMPTZ,
+              PRIMARY KEY (user_id, game_name, day)
+            )
+        """],
+    ),
+    Migration(
+        7,
+        "populate game_stats_daily",
+        # the v6 schema (game_name) spelled out here: rollups.py follows the current
+        # table and migrations never run code that changes later
+        sql=["""
+            INSERT INTO game_stats_daily (user_id, game_name, day, plays, sum_score, scored_plays, sum_time, last_played)
+            SELECT user_id, COALESCE(game_name, ''), created_at::date,
+                   COUNT(*), COALESCE(SUM(score), 0), COUNT(score), COALESCE(SUM(time_seconds), 0), MAX(created_at)
+            FROM game_statistics
+            WHERE user_id IS NOT NULL
+            GROUP BY user_id, COALESCE(game_name, ''), created_at::date
+            ON CONFLICT (user_id, game_name, day) DO NOTHING
+        """],
+    ),
+    Migration(
+        8,
+        "canonical game/result keys and label tables",
+        sql=[
+            "CREATE TYPE game_key_t AS ENUM ('exercise_1', 'exercise_2', 'exercise_3', 'exercise_4', 'other')",
+            "CREATE TYPE result_key_t AS ENUM ('completed', 'win', 'lose', 'game_over', 'exit', 'playing', 'other')",
+            "ALTER TABLE game_statistics ADD COLUMN IF NOT EXISTS game_key game_key_t",
+            "ALTER TABLE game_statistics ADD COLUMN IF NOT EXISTS result_key result_key_t",
+            """
+            CREATE TABLE IF NOT EXISTS game_labels (
+              game_key game_key_t NOT NULL,
+              lang VARCHAR(5) NOT NULL,
+              label VARCHAR(255) NOT NULL,
+              PRIMARY KEY (game_key, lang)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS result_labels (
+              result_key result_key_t NOT NULL,
+              lang VARCHAR(5) NOT NULL,
+              label VARCHAR(255) NOT NULL,
+              PRIMARY KEY (result_key, lang)
+            )
+            """,
+        ],
+    ),
+    Migration(
+        9,
+        "backfill game_key/result_key",
+        python=backfill_stat_keys,
+    ),
+    Migration(
+        10,
+        "game_stats_daily keyed by game_key",
+        # one GROUP BY per spelling merged into one per game; SHARE MODE holds back
+        # inserts so the rebuilt table misses nothing
+        sql=[
+            "LOCK TABLE game_statistics IN SHARE MODE",
+            "DROP TABLE IF EXISTS game_stats_daily",
+            """
+            CREATE TABLE game_stats_daily (
+              user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+              game_key game_key_t NOT NULL,
+              day DATE NOT NULL,
+              plays INTEGER NOT NULL DEFAULT 0,
+              sum_score DOUBLE PRECISION NOT NULL DEFAULT 0,
+              scored_plays INTEGER NOT NULL DEFAULT 0,
+              sum_time DOUBLE PRECISION NOT NULL DEFAULT 0,
+              last_played TIMESTAMPTZ,
+              PRIMARY KEY (user_id, game_key, day)
+            )
+            """,
+            """
+            INSERT INTO game_stats_daily (user_id, game_key, day, plays, sum_score, scored_plays, sum_time, last_played)
+            SELECT user_id, COALESCE(game_key, 'other'), created_at::date,
+                   COUNT(*), COALESCE(SUM(score), 0), COUNT(score), COALESCE(SUM(time_seconds), 0), MAX(created_at)
+            FROM game_statistics
+            WHERE user_id IS NOT NULL
+            GROUP BY user_id, COALESCE(game_key, 'other'), created_at::date
+            """,
+        ],
+    ),
+    Migration(
+        11,
+        "game_statistics keyset pagination index",
+        # /api/stats pages on (created_at, id) per user; the old (user_id, created_at)
+        # index is a prefix of this one, so it is dropped once the new one is built
+        indexes=[
+            ("game_statistics_user_id_created_at_id_idx",
+             "ON game_statistics (user_id, created_at DESC, id DESC) "
+             "INCLUDE (age, game_name, game_key, score, time_seconds, result, result_key)"),
+        ],
+        sql=["DROP INDEX IF EXISTS game_statistics_user_id_created_at_idx"],
+    ),
+    Migration(
+        12,
+        "game_statistics.idempotency_key",
+        sql=["ALTER TABLE game_statistics ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(64)"],
+    ),
+    Migration(
+        13,
+        "game_statistics idempotency_key unique index",
+        # /add_stats inserts with ON CONFLICT (idempotency_key) DO NOTHING
+        unique_indexes=[
+            ("game_statistics_idempotency_key_idx",
+             "ON game_statistics (idempotency_key) WHERE idempotency_key IS NOT NULL"),
+        ],
+    ),
+    Migration(
+        14,
+        "jobs queue + users.deleted_at",
+        # background work for jobs.py; a deleted account is hidden at once
+        # and its rows are purged later by a job
+        sql=[
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ",
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+              id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+              kind VARCHAR(50) NOT NULL,
+              payload JSONB NOT NULL DEFAULT '{}',
+              user_id BIGINT,
+              status VARCHAR(10) NOT NULL DEFAULT 'queued',
+              attempts INTEGER NOT NULL DEFAULT 0,
+              max_attempts INTEGER NOT NULL DEFAULT 5,
+              run_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+              locked_by VARCHAR(100),
+              locked_at TIMESTAMPTZ,
+              progress JSONB,
+              result JSONB,
+              last_error TEXT,
+              created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+              finished_at TIMESTAMPTZ
+            )
+            """,
+            # workers only ever look at runnable rows, so the index stays tiny
+            "CREATE INDEX IF NOT EXISTS jobs_queued_run_at_idx ON jobs (run_at, id) WHERE status = 'queued'",
+            "CREATE INDEX IF NOT EXISTS jobs_running_locked_at_idx ON jobs (locked_at) WHERE status = 'running'",
+        ],
+    ),
+    Migration(
+        15,
+        "users.next_reminder_at",
+        sql=[
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS next_reminder_at TIMESTAMPTZ",
+            # reminders.NEXT_REMINDER_AT as it was at v15, spelled out
+            """
+            UPDATE users SET next_reminder_at =
+              ((now() AT TIME ZONE 'Europe/Athens')::date
+               + CASE WHEN ((now() AT TIME ZONE 'Europe/Athens')::date + exercise_time) AT TIME ZONE 'Europe/Athens' > now()
+                      THEN 0 ELSE 1 END
+               + exercise_time) AT TIME ZONE 'Europe/Athens'
+            WHERE reminder = 'yes' AND exercise_time IS NOT NULL AND deleted_at IS NULL
+            """,
+        ],
+    ),
+    Migration(
+        16,
+        "users next_reminder_at index",
+        # the reminder job reads only due rows: WHERE next_reminder_at <= now()
+        indexes=[
+            ("users_next_reminder_at_idx",
+             "ON users (next_reminder_at) WHERE next_reminder_at IS NOT NULL"),
+        ],
+    ),
+    Migration(
+        17,
+        "reminder_deliveries",
+        # one row per user and local day a reminder went out; the claim skips
+        # users already in it, so a reminder is never sent twice the same day
+        sql=[
+            """
+            CREATE TABLE IF NOT EXISTS reminder_deliveries (
+              user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+              day DATE NOT NULL,
+              due_at TIMESTAMPTZ NOT NULL,
+              sent_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+              PRIMARY KEY (user_id, day)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS reminder_deliveries_day_idx ON reminder_deliveries (day)",
+        ],
+    ),
+    Migration(
+        18,
+        "login_buckets",
+        # shared login rate limiter state (LOGIN_LIMITER=postgres); UNLOGGED:
+        # no WAL per attempt, and losing it on a crash only resets the limits
+        sql=[
+            """
+            CREATE UNLOGGED TABLE IF NOT EXISTS login_buckets (
+              key VARCHAR(300) PRIMARY KEY,
+              tokens DOUBLE PRECISION NOT NULL,
+              allowed BOOLEAN NOT NULL,
+              updated_at TIMESTAMPTZ NOT NULL
+            )
+            """,
+        ],
+    ),
+    Migration(
+        19,
+        "users unique usernames",
+        python=rename_duplicate_usernames,
+    ),
+    Migration(
+        20,
+        "users username unique index",
+        # registration is INSERT ... ON CONFLICT DO NOTHING, so both email and
+        # username need a unique index; the plain v2 index is covered by it
+        unique_indexes=[
+            ("users_username_unique_idx", "ON users (username)"),
+        ],
+        sql=["DROP INDEX IF EXISTS users_username_idx"],
+    ),
+    Migration(
+        21,
+        "game_statistics idempotency_key unique per user",
+        # a key only has to be unique for its own user, otherwise one user's key can
+        # make another user's result look like a duplicate; rows without an account
+        # share user 0, so re-imported orphans still dedupe
+        unique_indexes=[
+            ("game_statistics_user_idempotency_key_idx",
+             "ON game_statistics ((COALESCE(user_id, 0)), idempotency_key) WHERE idempotency_key IS NOT NULL"),
+        ],
+        sql=["DROP INDEX IF EXISTS game_statistics_idempotency_key_idx"],
+    ),
+    Migration(
+        22,
+        "drop game_statistics username covering index",
+        # every game_statistics read goes by user_id now (v5/v11 indexes); the v1
+        # index only cost a write per insert and its share of the table's size
+        drop_indexes=["game_statistics_username_created_at_idx"],
+    ),
+    Migration(
+        23,
+        "game_statistics (user_id, id) index",
+        # the stats ETag/report marker is the user's MAX(id) and /api/stats?since=
+        # pages on id; ids follow commit order better than created_at (transaction start)
+        indexes=[
+            ("game_statistics_user_id_id_idx", "ON game_statistics (user_id, id)"),
+        ],
+    ),
+]
+
+
+def _ensure_migrations_table(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+              version INTEGER PRIMARY KEY,
+              name VARCHAR(255) NOT NULL,
+              applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """)
+
+
+def applied_versions(conn):
+    _ensure_migrations_table(conn)
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cur.fetchall()}
+
+
+def _drop_invalid_index(conn, name):
+    # a failed CONCURRENTLY build leaves an INVALID index behind; IF NOT EXISTS would keep it
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT 1
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = %s AND NOT i.indisvalid
+        """, (name,))
+        if cur.fetchone():
+            print(f"   dropping invalid index {name}")
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def _create_index_concurrently(conn, name, definition, unique=False):
+    _drop_invalid_index(conn, name)
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+
+
+def apply_migration(conn, migration):
+    """Run one migration on an autocommit connection and record it."""
+    conn.autocommit = True
+    for name, definition in migration.indexes:
+        print(f"   index {name}")
+        _create_index_concurrently(conn, name, definition)
+    for name, definition in migration.unique_indexes:
+        print(f"   unique index {name}")
+        _create_index_concurrently(conn, name, definition, unique=True)
+    for name in migration.drop_indexes:
+        print(f"   drop index {name}")
+        with conn.cursor() as cur:
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+    if migration.python is not None:
+        migration.python(conn)
+
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            for statement in migration.sql:
+                cur.execute(statement)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (migration.version, migration.name),
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+
+def run_migrations(conn, migrations=None):
+    """Apply every pending migration in version order. Returns the versions applied."""
+    migrations = sorted(migrations or MIGRATIONS, key=lambda m: m.version)
+    conn.autocommit = True
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK_KEY,))
+    try:
+        done = applied_versions(conn)
+        applied = []
+        for migration in migrations:
+            if migration.version in done:
+                continue
+            print(f"➡️  Migration {migration.version}: {migration.name}")
+            started = time.monotonic()
+            apply_migration(conn, migration)
+            print(f"   done in {time.monotonic() - started:.1f}s")
+            applied.append(migration.version)
+
+        # labels are derived from translations.py, refresh them on every run
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('game_labels') IS NOT NULL")
+            has_labels = cur.fetchone()[0]
+        if has_labels:
+            stat_keys.sync_labels(conn)
+        return applied
+    finally:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK_KEY,))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    load_dotenv()
+    if not os.environ.get("DATABASE_URL", "").strip():
+        raise RuntimeError("Missing DATABASE_URL in .env")
+    url = database_url_from_env()
+
+    conn = psycopg2.connect(url)
+    conn.autocommit = True
+    try:
+        if "--list" in argv:
+            done = applied_versions(conn)
+            for migration in MIGRATIONS:
+                state = "applied" if migration.version in done else "pending"
+                print(f"{migration.version:>4}  {state:<8} {migration.name}")
+            return 0
+
+        applied = run_migrations(conn)
+        if applied:
+            print(f"Done ✅ Applied migrations: {', '.join(map(str, applied))}")
+        else:
+            print("Done ✅ Database is up to date.")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
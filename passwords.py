@@ -0,0 +1,147 @@
+#passwords.py
+#bcrypt hashing/verification on a dedicated, bounded thread pool.
+#bcrypt releases the GIL, so a few threads use a few cores; capping them at
+#BCRYPT_WORKERS keeps a burst of logins from taking every CPU away from the
+#light API routes. At most BCRYPT_MAX_QUEUE calls wait for a thread; a caller
+#that can't get in within BCRYPT_QUEUE_TIMEOUT gets HasherBusy (-> 503).
+#New hashes use BCRYPT_ROUNDS; needs_rehash() tells the login to upgrade an old one.
+#Accounts imported from the old SQLite app (legacy_import.py) still carry werkzeug
+#hashes (pbkdf2:/scrypt:): they are checked with werkzeug and replaced by bcrypt
+#on their first login.
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from werkzeug.security import check_password_hash
+
+BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+WERKZEUG_PREFIXES = ("pbkdf2:", "scrypt:")
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, rounds=12, workers=2, max_queue=64, queue_timeout=5.0):
+        self.rounds = rounds
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        # workers running + callers waiting
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        # metrics
+        self.calls = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.last_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self._wait_ms_total = 0.0
+        self._run_ms_total = 0.0
+
+    def _executor(self):
+        # threads do not survive a fork: one pool per process
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+                    self._pid = os.getpid()
+        return self._pool
+
+    def _run(self, func, *args):
+        submitted = time.monotonic()   # queue time = waiting for a slot + for a thread
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.rejected += 1
+            raise HasherBusy()
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        def timed():
+            started = time.monotonic()
+            wait_ms = (started - submitted) * 1000
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self.calls += 1
+                    self.last_wait_ms = wait_ms
+                    self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+                    self._wait_ms_total += wait_ms
+                    self._run_ms_total += (time.monotonic() - started) * 1000
+
+        try:
+            return self._executor().submit(timed).result()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def hash(self, password):
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return self._run(bcrypt.hashpw, password.encode("utf-8"), salt).decode("utf-8")
+
+    def check(self, password, hashed):
+        """False for a wrong password and for anything that is not a bcrypt/werkzeug hash."""
+        try:
+            if hashed.startswith(WERKZEUG_PREFIXES):
+                return self._run(check_password_hash, hashed, password)
+            return self._run(bcrypt.checkpw, password.encode("utf-8"), hashed.encode("utf-8"))
+        except ValueError:
+            return False
+
+    def needs_rehash(self, hashed):
+        if hashed.startswith(WERKZEUG_PREFIXES):
+            return True
+        # $2b$12$<salt+hash>: the cost is the 2nd field
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def stats(self):
+        with self._lock:
+            calls = self.calls
+            return {
+                "rounds": self.rounds,
+                "workers": self.workers,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "calls": calls,
+                "rejected": self.rejected,
+                "last_wait_ms": round(self.last_wait_ms, 1),
+                "max_wait_ms": round(self.max_wait_ms, 1),
+                "avg_wait_ms": round(self._wait_ms_total / calls, 1) if calls else 0.0,
+                "avg_run_ms": round(self._run_ms_total / calls, 1) if calls else 0.0,
+            }
+
+
+hasher = PasswordHasher(
+    rounds=int(os.environ.get("BCRYPT_ROUNDS", 12)),
+    workers=int(os.environ.get("BCRYPT_WORKERS", max(1, (os.cpu_count() or 2) // 2))),
+    max_queue=int(os.environ.get("BCRYPT_MAX_QUEUE", 64)),
+    queue_timeout=float(os.environ.get("BCRYPT_QUEUE_TIMEOUT", 5)),
+)
+
+
+def hash_password(password):
+    return hasher.hash(password)
+
+
+def check_password(password, hashed):
+    return hasher.check(password, hashed)
+
+
+def needs_rehash(hashed):
+    return hasher.needs_rehash(hashed)
+
+
+def is_password_hash(value):
+    """True for the hash formats check_password understands (bcrypt, werkzeug)."""
+    return value.startswith(BCRYPT_PREFIXES + WERKZEUG_PREFIXES)
@@ -0,0 +1,77 @@
+#reminders.py
+#Daily exercise reminders are scheduled in the DB: users.next_reminder_at holds the
+#next moment a reminder is due (exercise_time in Athens local time, so the UTC
+#instant moves with DST) and is indexed. The minute job only claims the rows that
+#are due, moves them to their next day and sends; a reminder missed while the app
+#was down is still due on the next run and gets sent late (up to REMINDER_MAX_LATE).
+#reminder_deliveries logs every send, so a user gets at most one reminder per day.
+
+import os
+from datetime import timedelta
+
+REMINDER_TZ = "Europe/Athens"
+CLAIM_BATCH = 1000
+REMINDER_MAX_LATE = timedelta(minutes=int(os.environ.get("REMINDER_MAX_LATE_MINUTES", 360)))
+
+# next exercise_time still ahead of now(): today's if it has not passed yet, otherwise
+# tomorrow's. date + time is a local timestamp, AT TIME ZONE turns it into the instant.
+NEXT_REMINDER_AT = f"""
+CASE WHEN reminder = 'yes' AND exercise_time IS NOT NULL THEN
+  ((now() AT TIME ZONE '{REMINDER_TZ}')::date
+   + CASE WHEN ((now() AT TIME ZONE '{REMINDER_TZ}')::date + exercise_time) AT TIME ZONE '{REMINDER_TZ}' > now()
+          THEN 0 ELSE 1 END
+   + exercise_time) AT TIME ZONE '{REMINDER_TZ}'
+END
+"""
+
+# recompute after reminder / exercise_time changed (same transaction as the change)
+RESCHEDULE_SQL = f"UPDATE users SET next_reminder_at = {NEXT_REMINDER_AT} WHERE id = %s"
+
+# SKIP LOCKED: two schedulers running at the same time never claim the same user.
+# Rows that are due and not too late are logged in reminder_deliveries in the same
+# statement; `send` is true only for the first delivery of that user's local day.
+CLAIM_DUE_SQL = f"""
+WITH due AS (
+  SELECT id, next_reminder_at AS due_at
+  FROM users
+  WHERE next_reminder_at <= now()
+  ORDER BY next_reminder_at
+  LIMIT %s
+  FOR UPDATE SKIP LOCKED
+),
+claimed AS (
+  UPDATE users u
+  SET next_reminder_at = {NEXT_REMINDER_AT}
+  FROM due
+  WHERE u.id = due.id
+  RETURNING u.id, u.username, u.email, u.language, u.reminder, due.due_at
+),
+logged AS (
+  INSERT INTO reminder_deliveries (user_id, day, due_at)
+  SELECT id, (due_at AT TIME ZONE '{REMINDER_TZ}')::date, due_at
+  FROM claimed
+  WHERE reminder = 'yes' AND due_at >= now() - %s * INTERVAL '1 second'
+  ON CONFLICT (user_id, day) DO NOTHING
+  RETURNING user_id
+)
+SELECT c.id, c.username, c.email, c.language, c.due_at, l.user_id IS NOT NULL AS send
+FROM claimed c
+LEFT JOIN logged l ON l.user_id = c.id
+"""
+
+PRUNE_DELIVERIES_SQL = "DELETE FROM reminder_deliveries WHERE day < CURRENT_DATE - %s"
+
+
+def reschedule(cursor, user_id):
+    cursor.execute(RESCHEDULE_SQL, (user_id,))
+
+
+def claim_due(cursor, limit=CLAIM_BATCH, max_late=REMINDER_MAX_LATE):
+    """Due users (rows of the cursor's kind), already moved to their next reminder; send only where `send`."""
+    cursor.execute(CLAIM_DUE_SQL, (limit, max_late.total_seconds()))
+    return cursor.fetchall()
+
+
+def prune_deliveries(cursor, keep_days=30):
+    cursor.execute(PRUNE_DELIVERIES_SQL, (keep_days,))
+    return cursor.rowcount
@@ -0,0 +1,263 @@
+#report_pdf.py
+#Server-side PDF progress report (replaces html2pdf on the patient's device).
+#build_report() draws the summary, two vector charts (reportlab.graphics, no
+#rasterizing) and the latest results with the canvas; ReportCache keeps the bytes
+#on disk under a hash of everything the report depends on, so a repeated export
+#is just a file read.
+
+import hashlib
+import json
+import os
+import threading
+from io import BytesIO
+
+from reportlab.graphics import renderPDF
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.shapes import Drawing, String
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+# bump when the layout changes, so old cached files are not served any more
+REPORT_VERSION = 1
+
+# Helvetica has no Greek glyphs; use a TTF that does (REPORT_FONT / REPORT_FONT_BOLD or a system font)
+FONT_CANDIDATES = [
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/dejavu/DejaVuSans.ttf", "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf"),
+    ("/Library/Fonts/Arial Unicode.ttf", "/Library/Fonts/Arial Unicode.ttf"),
+    ("C:\\Windows\\Fonts\\arial.ttf", "C:\\Windows\\Fonts\\arialbd.ttf"),
+]
+
+_fonts = None
+_fonts_lock = threading.Lock()
+
+
+def report_fonts():
+    """(regular, bold) font names, registered once per process."""
+    global _fonts
+    with _fonts_lock:
+        if _fonts is not None:
+            return _fonts
+        candidates = FONT_CANDIDATES
+        if os.environ.get("REPORT_FONT"):
+            regular = os.environ["REPORT_FONT"]
+            candidates = [(regular, os.environ.get("REPORT_FONT_BOLD", regular))] + candidates
+        for regular, bold in candidates:
+            if os.path.exists(regular):
+                pdfmetrics.registerFont(TTFont("ReportSans", regular))
+                pdfmetrics.registerFont(TTFont("ReportSans-Bold", bold if os.path.exists(bold) else regular))
+                _fonts = ("ReportSans", "ReportSans-Bold")
+                return _fonts
+        print("⚠️ report: no TTF font with Greek glyphs found (set REPORT_FONT), using Helvetica")
+        _fonts = ("Helvetica", "Helvetica-Bold")
+        return _fonts
+
+
+def summarize(per_game, tt):
+    """Summary numbers of the report (same rules the old browser report used)."""
+    total = sum(g["plays"] for g in per_game)
+    successes = sum(g["successes"] for g in per_game)
+    timed = sum(g["timed_plays"] for g in per_game)
+    time_sum = sum(g["time_sum"] or 0 for g in per_game)
+    rate = round(successes * 100 / total) if total else 0
+
+    best, best_rate = "—", 0
+    for g in per_game:
+        game_rate = g["successes"] / g["plays"] if g["plays"] else 0
+        if game_rate > best_rate:
+            best, best_rate = g["game"], game_rate
+
+    progress = tt.get("progress_stable", "Stable")
+    if rate >= 70:
+        progress = tt.get("progress_improving", "Improving")
+    if rate >= 85:
+        progress = tt.get("progress_excellent", "Excellent")
+
+    return [
+        (tt.get("report_total_sessions", "Total sessions"), str(total)),
+        (tt.get("report_exercises_performed", "Exercises performed"), str(len(per_game))),
+        (tt.get("report_success_rate", "Success rate"), f"{rate}%"),
+        (tt.get("report_avg_time", "Average time"), f"{round(time_sum / timed)} sec" if timed else "—"),
+        (tt.get("report_best", "Best performance"), best),
+        (tt.get("report_progress", "Overall progress"), progress),
+    ]
+
+
+def _bar_chart(title, labels, values, width, height, font, bold, color):
+    drawing = Drawing(width, height)
+    drawing.add(String(0, height - 12, title, fontName=bold, fontSize=11))
+    chart = VerticalBarChart()
+    chart.x, chart.y = 30, 30
+    chart.width, chart.height = width - 40, height - 60
+    chart.data = [values or [0]]
+    chart.categoryAxis.categoryNames = labels or [""]
+    chart.categoryAxis.labels.fontName = font
+    chart.categoryAxis.labels.fontSize = 7
+    chart.categoryAxis.labels.angle = 30 if len(labels) > 6 else 0
+    chart.categoryAxis.labels.boxAnchor = "ne" if len(labels) > 6 else "n"
+    chart.valueAxis.labels.fontName = font
+    chart.valueAxis.labels.fontSize = 7
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.forceZero = True
+    chart.bars[0].fillColor = color
+    chart.bars[0].strokeColor = None
+    drawing.add(chart)
+    return drawing
+
+
+class _Page:
+    """Tiny text cursor over a reportlab canvas with automatic page breaks."""
+    MARGIN = 50
+
+    def __init__(self, c, font, bold):
+        self.c = c
+        self.font = font
+        self.bold = bold
+        self.width, self.height = A4
+        self.y = self.height - self.MARGIN
+
+    def need(self, space):
+        if self.y - space < self.MARGIN:
+            self.c.showPage()
+            self.y = self.height - self.MARGIN
+
+    def text(self, value, size=10, bold=False, x=None, gap=4):
+        self.need(size + gap)
+        self.c.setFont(self.bold if bold else self.font, size)
+        self.c.drawString(self.MARGIN if x is None else x, self.y - size, value)
+        self.y -= size + gap
+
+    def row(self, values, xs, size=9, bold=False):
+        self.need(size + 4)
+        self.c.setFont(self.bold if bold else self.font, size)
+        for value, x in zip(values, xs):
+            self.c.drawString(x, self.y - size, value)
+        self.y -= size + 4
+
+
+def build_report(data, tt):
+    """
+    PDF bytes. `data` has patient (first_name, last_name), report_date,
+    per_game [{game, plays, successes, timed_plays, time_sum}],
+    daily [(date, plays)] and recent [{created_at, game, score, time_seconds, result, age}].
+    """
+    font, bold = report_fonts()
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+    c.setTitle(tt.get("pdf_report_title", "Report"))
+    page = _Page(c, font, bold)
+    left = page.MARGIN
+
+    page.text(tt.get("pdf_report_title", "Report"), size=18, bold=True, gap=12)
+    page.text(f"{tt.get('first_name', 'First name')}: {data['patient']['first_name']}")
+    page.text(f"{tt.get('last_name', 'Last name')}: {data['patient']['last_name']}")
+    page.text(f"{tt.get('report_date_label', 'Report date')}: {data['report_date']}", gap=14)
+
+    # summary box
+    summary = summarize(data["per_game"], tt)
+    box_height = 24 + 15 * len(summary)
+    page.need(box_height + 10)
+    c.setFillColor(colors.HexColor("#f4f6f8"))
+    c.roundRect(left, page.y - box_height, page.width - 2 * left, box_height, 8, stroke=0, fill=1)
+    c.setFillColor(colors.black)
+    page.y -= 6
+    page.text(tt.get("report_summary", "Summary"), size=13, bold=True, x=left + 10)
+    for label, value in summary:
+        page.row([f"{label}:", value], [left + 14, left + 220], size=10)
+    page.y -= 16
+
+    # charts (vector drawings)
+    chart_width, chart_height = page.width - 2 * left, 180
+    color = colors.HexColor("#007bff")
+    charts = [
+        _bar_chart(tt.get("report_chart_plays", "Sessions per exercise"),
+                   [g["game"] for g in data["per_game"]], [g["plays"] for g in data["per_game"]],
+                   chart_width, chart_height, font, bold, color),
+        _bar_chart(tt.get("report_chart_daily", "Sessions per day"),
+                   [day.strftime("%d/%m") for day, _ in data["daily"]], [plays for _, plays in data["daily"]],
+                   chart_width, chart_height, font, bold, colors.HexColor("#28a745")),
+    ]
+    for drawing in charts:
+        page.need(chart_height + 10)
+        renderPDF.draw(drawing, c, left, page.y - chart_height)
+        page.y -= chart_height + 16
+
+    # latest results
+    page.text(tt.get("pdf_results_title", "Results"), size=14, bold=True, gap=6)
+    if data["recent_truncated"]:
+        page.text(tt.get("report_recent_note", "").format(count=len(data["recent"])), size=8, gap=6)
+    xs = [left, left + 105, left + 235, left + 290, left + 350, left + 460]
+    page.row(["", "", tt.get("label_score", "Score"), tt.get("label_time", "Time"),
+              tt.get("label_result", "Result"), tt.get("label_age", "Age")], xs, bold=True)
+    for r in data["recent"]:
+        page.row([
+            r["created_at"].strftime("%d/%m/%Y %H:%M"),
+            (r["game"] or "")[:22],
+            "" if r["score"] is None else f"{r['score']:g}",
+            "" if r["time_seconds"] is None else f"{r['time_seconds']:g} sec",
+            (r["result"] or "")[:20],
+            "" if r["age"] is None else str(r["age"]),
+        ], xs)
+
+    c.save()
+    return buffer.getvalue()
+
+
+def report_key(**parts):
+    """Content address of a report: hash of every input that changes its bytes."""
+    raw = json.dumps({"v": REPORT_VERSION, **parts}, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ReportCache:
+    """PDF files on disk named by their report_key; oldest files go past max_files."""
+    def __init__(self, directory, max_files=500):
+        self.directory = directory
+        self.max_files = max_files
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def get(self, key):
+        path = self.path(key)
+        if os.path.exists(path):
+            self.hits += 1
+            try:
+                os.utime(path)   # recently used files survive _trim
+            except FileNotFoundError:
+                return None
+            return path
+        self.misses += 1
+        return None
+
+    def put(self, key, pdf_bytes):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(tmp, path)   # readers never see half a file
+        self._trim()
+        return path
+
+    def _trim(self):
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith(".pdf")]
+        except FileNotFoundError:
+            return
+        if len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
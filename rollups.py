@@ -0,0 +1,140 @@
+#rollups.py
+#game_stats_daily keeps one row per (user, game, day) with the counters the
+#today pages, /api/stats and the PDF report need. add_stat upserts it in the same transaction as the
+#raw insert; this script rebuilds it from game_statistics when needed.
+#
+#Usage:
+#   python rollups.py rebuild [--workers 4] [--chunk-size 500] [--user-id ID]
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import psycopg2
+from dotenv import load_dotenv
+
+from database import database_url_from_env
+
+
+# rebuild the rows of one user-id range from the raw table
+REBUILD_RANGE_SQL = """
+INSERT INTO game_stats_daily (user_id, game_key, day, plays, sum_score, scored_plays, sum_time, last_played)
+SELECT user_id,
+       COALESCE(game_key, 'other'),
+       created_at::date,
+       COUNT(*),
+       COALESCE(SUM(score), 0),
+       COUNT(score),
+       COALESCE(SUM(time_seconds), 0),
+       MAX(created_at)
+FROM game_statistics
+WHERE user_id BETWEEN %s AND %s
+GROUP BY user_id, COALESCE(game_key, 'other'), created_at::date
+"""
+
+
+def rebuild_range(conn, first_id, last_id):
+    """Recompute the rollup for users first_id..last_id in one transaction."""
+    with conn:
+        with conn.cursor() as cur:
+            # FOR UPDATE conflicts with the FK lock taken by concurrent inserts,
+            # so no add_stat for these users can slip in between DELETE and INSERT
+            cur.execute("SELECT id FROM users WHERE id BETWEEN %s AND %s FOR UPDATE", (first_id, last_id))
+            cur.execute("DELETE FROM game_stats_daily WHERE user_id BETWEEN %s AND %s", (first_id, last_id))
+            cur.execute(REBUILD_RANGE_SQL, (first_id, last_id))
+            return cur.rowcount
+
+
+def user_id_chunks(conn, chunk_size):
+    """[(first_id, last_id), ...] covering every user, chunk_size users each."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM users ORDER BY id")
+        ids = [row[0] for row in cur.fetchall()]
+    return [(ids[i], ids[min(i + chunk_size, len(ids)) - 1]) for i in range(0, len(ids), chunk_size)]
+
+
+def rebuild_serial(conn, chunk_size=500):
+    """Single-connection rebuild (used by the migration that creates the table)."""
+    autocommit = conn.autocommit
+    conn.autocommit = False
+    try:
+        total = 0
+        for first_id, last_id in user_id_chunks(conn, chunk_size):
+            total += rebuild_range(conn, first_id, last_id)
+        return total
+    finally:
+        # user_id_chunks' SELECT opens a transaction that nothing commits when
+        # there are no users; autocommit can't be switched back inside one
+        conn.rollback()
+        conn.autocommit = autocommit
+
+
+def rebuild_parallel(url, workers=4, chunk_size=500):
+    """Rebuild all users, chunks spread over `workers` connections."""
+    conn = psycopg2.connect(url)
+    try:
+        chunks = user_id_chunks(conn, chunk_size)
+    finally:
+        conn.close()
+    if not chunks:
+        return 0
+
+    # one connection per worker thread, reused for all of its chunks
+    local = threading.local()
+    opened = []
+    opened_lock = threading.Lock()
+
+    def run(chunk):
+        worker_conn = getattr(local, "conn", None)
+        if worker_conn is None:
+            worker_conn = local.conn = psycopg2.connect(url)
+            with opened_lock:
+                opened.append(worker_conn)
+        return rebuild_range(worker_conn, *chunk)
+
+    started = time.monotonic()
+    total = 0
+    done = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = [pool.submit(run, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                total += future.result()
+                done += 1
+                elapsed = time.monotonic() - started
+                print(f"   {done}/{len(chunks)} chunks, {total} rollup rows ({elapsed:.1f}s)")
+    finally:
+        for worker_conn in opened:
+            worker_conn.close()
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the game_stats_daily rollup table.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="recompute game_stats_daily from game_statistics")
+    rebuild.add_argument("--workers", type=int, default=4)
+    rebuild.add_argument("--chunk-size", type=int, default=500, help="users per transaction")
+    rebuild.add_argument("--user-id", type=int, help="rebuild a single user")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    url = database_url_from_env()
+
+    if args.user_id is not None:
+        conn = psycopg2.connect(url)
+        try:
+            rows = rebuild_range(conn, args.user_id, args.user_id)
+        finally:
+            conn.close()
+    else:
+        rows = rebuild_parallel(url, workers=args.workers, chunk_size=args.chunk_size)
+
+    print(f"Done ✅ game_stats_daily rebuilt ({rows} rows).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+#stat_keys.py
+#Canonical keys for game names and results.
+#Games send "Άσκηση 1" / "exercise_4" and "Νίκη" / "lose" / "completed"; add_stat
+#stores the canonical key next to the raw value (game_key / result_key enum
+#columns) and the display labels per language live in game_labels / result_labels,
+#so stats responses never normalize row by row.
+
+import psycopg2.extras
+
+from translations import TRANSLATIONS
+
+# values of the Postgres enum types game_key_t / result_key_t
+GAME_KEYS = ("exercise_1", "exercise_2", "exercise_3", "exercise_4", "other")
+RESULT_KEYS = ("completed", "win", "lose", "game_over", "exit", "playing", "other")
+
+# translations.py key for each canonical key
+GAME_LABEL_KEYS = {
+    "exercise_1": "exercise_1_title",
+    "exercise_2": "exercise_2_title",
+    "exercise_3": "exercise_3_title",
+    "exercise_4": "exercise_4_title",
+    "other": "game_other_title",
+}
+RESULT_LABEL_KEYS = {
+    "completed": "result_completed",
+    "win": "result_win",
+    "lose": "result_lose",
+    "game_over": "result_game_over",
+    "exit": "result_exit",
+    "playing": "result_playing",
+    "other": "result_other",
+}
+
+
+#Mapping game names for translation
+def normalize_game_key(name: str) -> str:
+    """Map DB game_name (Greek/English) -> canonical key."""
+    if not name:
+        return ""
+
+    name = name.strip()
+
+    mapping = {
+        "Άσκηση 1": "exercise_1",
+        "Άσκηση 2": "exercise_2",
+        "Άσκηση 3": "exercise_3",
+        "Άσκηση 4": "exercise_4",
+        "Exercise 1": "exercise_1",
+        "Exercise 2": "exercise_2",
+        "Exercise 3": "exercise_3",
+        "Exercise 4": "exercise_4",
+    }
+    return mapping.get(name, name)  # fallback: keep as-is if unknown
+
+
+def normalize_result_key(result: str) -> str:
+    """Normalize DB result (completed/win/lose/...) into a canonical key."""
+    if not result:
+        return ""
+
+    r = str(result).strip().lower()
+
+    # accept many variants so old data still works
+    mapping = {
+        "completed": "completed",
+        "complete": "completed",
+        "done": "completed",
+
+        "win": "win",
+        "won": "win",
+        "victory": "win",
+
+        "lose": "lose",
+        "loss": "lose",
+        "failed": "lose",
+         # ✅ add Greek variants
+        "νικη": "win",
+        "νίκη": "win",
+        "επιτυχια": "win",
+         "επιτυχία": "win",
+
+        "ηττα": "lose",
+        "ήττα": "lose",
+        "αποτυχια": "lose",
+        "αποτυχία": "lose",
+
+
+        "game over": "game_over",
+        "game_over": "game_over",
+        "gameover": "game_over",
+
+        "exit": "exit",
+        "quit": "exit",
+    }
+    return mapping.get(r, r)  # fallback to raw normalized value
+
+
+def game_key_for(game_name):
+    """Value for game_statistics.game_key (never NULL; unknown games -> 'other')."""
+    key = normalize_game_key(game_name)
+    return key if key in GAME_KEYS else "other"
+
+
+def result_key_for(result):
+    """Value for game_statistics.result_key (NULL when there is no result)."""
+    key = normalize_result_key(result)
+    if not key:
+        return None
+    return key if key in RESULT_KEYS else "other"
+
+
+def label_rows(label_keys):
+    """[(key, lang, label), ...] resolved with the Greek fallback, for every language."""
+    base = TRANSLATIONS.get("el", {})
+    rows = []
+    for lang, tt in TRANSLATIONS.items():
+        for key, label_key in label_keys.items():
+            rows.append((key, lang, tt.get(label_key) or base.get(label_key) or key))
+    return rows
+
+
+def sync_labels(conn):
+    """Upsert game_labels / result_labels from translations.py (cheap, run on every deploy)."""
+    with conn.cursor() as cur:
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO game_labels (game_key, lang, label) VALUES %s
+            ON CONFLICT (game_key, lang) DO UPDATE SET label = EXCLUDED.label
+        """, label_rows(GAME_LABEL_KEYS), template="(%s::game_key_t, %s, %s)")
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO result_labels (result_key, lang, label) VALUES %s
+            ON CONFLICT (result_key, lang) DO UPDATE SET label = EXCLUDED.label
+        """, label_rows(RESULT_LABEL_KEYS), template="(%s::result_key_t, %s, %s)")
+    if not conn.autocommit:
+        conn.commit()
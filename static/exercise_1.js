@@ -264,17 +264,13 @@
   // ---------- Backend stats ----------
   async function sendStats(result) {
     try {
-      await fetch("/add_stat", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          username,
-          age,
-          game_name: "Άσκηση 1",
-          score,
-          time_seconds: GAME_TIME - timeLeft(),
-          result
-        })
+      StatsOutbox.send({
+        username,
+        age,
+        game_name: "Άσκηση 1",
+        score,
+        time_seconds: GAME_TIME - timeLeft(),
+        result
       });
     } catch (e) {
       // Non-fatal: game can still run even if stats fail
@@ -314,18 +314,14 @@
   async function sendStats(result) {
     const time_seconds = Math.min(TIME_LIMIT, Math.round((Date.now() - startTime) / 1000));
     try {
-      await fetch("/add_stat", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          username,
-          age,
-          game_name: "Άσκηση 2",
-          score,
-          time_seconds,
-          // Note: you currently send Greek strings even in English mode
-          result: (result === "win" ? "Νίκη" : "Ήττα")
-        })
+      StatsOutbox.send({
+        username,
+        age,
+        game_name: "Άσκηση 2",
+        score,
+        time_seconds,
+        // Note: you currently send Greek strings even in English mode
+        result: (result === "win" ? "Νίκη" : "Ήττα")
       });
     } catch (e) {
       console.warn("sendStats failed", e);
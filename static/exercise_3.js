@@ -431,17 +431,13 @@ function drawDone() {
 
     const time_seconds = Math.round(nowSec());
     try {
-      await fetch("/add_stat", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          username,
-          age,
-          game_name: "Άσκηση 3",
-          score,
-          time_seconds,
-          result: "completed"
-        })
+      StatsOutbox.send({
+        username,
+        age,
+        game_name: "Άσκηση 3",
+        score,
+        time_seconds,
+        result: "completed"
       });
     } catch (e) {
       console.warn("sendStats failed", e);
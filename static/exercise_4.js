@@ -135,17 +135,13 @@
     if (statsSent) return;
     statsSent = true;
     try {
-      await fetch("/add_stat", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          username,
-          age,
-          game_name: "exercise_4",
-          score,
-          time_seconds: elapsedSeconds(),
-          result
-        })
+      StatsOutbox.send({
+        username,
+        age,
+        game_name: "exercise_4",
+        score,
+        time_seconds: elapsedSeconds(),
+        result
       });
     } catch (e) {
       console.warn("sendStats failed", e);
@@ -0,0 +1,88 @@
+// stats_outbox.js
+// Game results are queued in localStorage with a client-generated idempotency key
+// and sent in one request to /add_stats. A failed or interrupted request is simply
+// retried later with the same keys, the server skips rows it already stored.
+// The server answers per item (accepted / duplicate / rejected); only the items it
+// answered for leave the queue, anything else waits for the next flush.
+
+(function () {
+  const STORAGE_KEY = "thera_stats_outbox"; // localStorage key of the pending results
+  const FLUSH_DELAY = 1000; // Results finished close together go out in one batch
+  const BATCH_MAX = 500; // Server limit per request (STATS_BATCH_MAX)
+
+  let flushTimer = null;
+  let flushing = false;
+
+  function newKey() { // Unique id for one result
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + "-" + Math.random().toString(36).slice(2, 12);
+  }
+
+  function load() {
+    try {
+      return JSON.parse(localStorage.getItem(STORAGE_KEY)) || [];
+    } catch (e) {
+      return [];
+    }
+  }
+
+  function save(items) {
+    try {
+      localStorage.setItem(STORAGE_KEY, JSON.stringify(items));
+    } catch (e) {
+      console.warn("stats outbox not saved", e);
+    }
+  }
+
+  async function flush() { // Send everything pending in one batch
+    if (flushing) return;
+    const pending = load().slice(0, BATCH_MAX);
+    if (pending.length === 0) return;
+
+    flushing = true;
+    let more = false;
+    try {
+      const res = await fetch("/add_stats", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ items: pending })
+      });
+      if (res.ok) {
+        const body = await res.json();
+        const settled = new Set();
+        (body.results || []).forEach(r => {
+          if (r.status === "rejected") console.warn("stat rejected by the server", r.idempotency_key, r.error);
+          settled.add(r.idempotency_key); // accepted, duplicate (already stored) or rejected for good
+        });
+        const left = load().filter(s => !settled.has(s.idempotency_key)); // keep anything queued meanwhile
+        save(left);
+        more = left.length > 0 && settled.size > 0;
+      }
+    } catch (e) {
+      console.warn("stats flush failed, will retry", e); // Non-fatal: kept for the next flush
+    } finally {
+      flushing = false;
+    }
+    if (more) flush(); // More than one batch was waiting
+  }
+
+  function send(stat) { // Queue one result and schedule a flush
+    const items = load();
+    items.push(Object.assign({ idempotency_key: newKey() }, stat));
+    save(items);
+    clearTimeout(flushTimer);
+    flushTimer = setTimeout(flush, FLUSH_DELAY);
+  }
+
+  window.addEventListener("online", flush); // Retry when the connection comes back
+  window.addEventListener("pagehide", () => { // Leaving right after a game: hand the batch to the browser
+    const pending = load();
+    if (pending.length > 0 && navigator.sendBeacon) {
+      // no answer comes back, so the items stay queued; a resend is skipped as duplicate
+      navigator.sendBeacon("/add_stats", new Blob([JSON.stringify({ items: pending.slice(0, BATCH_MAX) })], { type: "application/json" }));
+    }
+  });
+  flush(); // Leftovers from an earlier visit
+
+  window.StatsOutbox = { send, flush };
+})();
@@ -0,0 +1,120 @@
+#stats_events.py
+#Live stats events. add_stat sends NOTIFY stats_events '<json>' in the same
+#transaction as the insert; one listener thread per worker process keeps a
+#dedicated connection in LISTEN and hands every event to the queues of the
+#SSE clients of that user. Waiting clients cost no queries: they only sit on
+#their queue until an event arrives or the heartbeat timeout fires.
+
+import json
+import os
+import queue
+import select
+import threading
+import time
+
+import psycopg2
+
+CHANNEL = "stats_events"
+
+
+class StatsBroadcaster:
+    def __init__(self, dsn, max_clients=200, queue_size=100):
+        self.dsn = dsn
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self._subscribers = {}        # user_id -> set of queue.Queue
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.delivered = 0
+        self.dropped = 0
+        self.reconnects = 0
+
+    def _ensure_listener(self):
+        # started lazily (and again after a fork) so every worker has its own
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._listen_forever, name="stats-listener", daemon=True)
+        self._thread.start()
+
+    def subscribe(self, user_id):
+        """New queue for one SSE client, or None when the worker is full."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # subscribers inherited from the parent belong to its clients
+                self._subscribers = {}
+            if sum(len(qs) for qs in self._subscribers.values()) >= self.max_clients:
+                return None
+            q = queue.Queue(maxsize=self.queue_size)
+            self._subscribers.setdefault(user_id, set()).add(q)
+            self._ensure_listener()
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            qs = self._subscribers.get(user_id)
+            if qs is None:
+                return
+            qs.discard(q)
+            if not qs:
+                del self._subscribers[user_id]
+
+    def publish(self, payload):
+        """Hand one NOTIFY payload to the clients of its user."""
+        try:
+            event = json.loads(payload)
+            user_id = int(event["user_id"])
+        except (ValueError, KeyError, TypeError):
+            print("⚠️ stats_events: bad payload", payload[:200])
+            return
+        with self._lock:
+            targets = list(self._subscribers.get(user_id, ()))
+        for q in targets:
+            try:
+                q.put_nowait(event)
+                self.delivered += 1
+            except queue.Full:
+                # a stuck client must not slow the others down; it resyncs with since=
+                self.dropped += 1
+
+    def _listen_forever(self):
+        backoff = 1
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CHANNEL}")
+                backoff = 1
+                while True:
+                    # wakes up only for notifications (or every 30 s to notice a dead socket)
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        with conn.cursor() as cur:
+                            cur.execute("SELECT 1")
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.publish(conn.notifies.pop(0).payload)
+            except psycopg2.Error as e:
+                self.reconnects += 1
+                print(f"⚠️ stats_events listener lost its connection ({e}), retrying in {backoff}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def stats(self):
+        with self._lock:
+            clients = sum(len(qs) for qs in self._subscribers.values())
+            users = len(self._subscribers)
+        return {
+            "clients": clients,
+            "users": users,
+            "listening": self._thread is not None and self._thread.is_alive(),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+        }
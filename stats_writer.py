@@ -0,0 +1,151 @@
+#stats_writer.py
+#Optional write-behind buffer for /add_stat (STATS_WRITE_BEHIND=1).
+#The request only puts the row on a bounded queue and answers 202; one thread
+#per worker collects rows for up to `interval_ms` or `max_rows` and hands them
+#to `flush(rows)` as one batch (one multi-row INSERT, one commit).
+#A full queue blocks the request for at most `put_timeout` seconds and then
+#refuses it (backpressure), close() drains whatever is left at shutdown.
+
+import os
+import queue
+import threading
+import time
+
+
+class QueueFull(Exception):
+    pass
+
+
+class WriteBehindBuffer:
+    def __init__(self, flush, max_rows=200, interval_ms=200, max_queue=5000, put_timeout=2.0, max_retries=5):
+        self.flush = flush
+        self.max_rows = max_rows
+        self.interval = interval_ms / 1000.0
+        self.max_queue = max_queue
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        # metrics
+        self.submitted = 0
+        self.rejected = 0
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped_rows = 0
+        self.max_depth = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._flush_ms_total = 0.0
+
+    def _ensure_thread(self):
+        # started lazily, and again in a forked worker (threads do not survive fork)
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_queue)
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="stats-write-behind", daemon=True)
+            self._thread.start()
+
+    def submit(self, row):
+        """Queue one row; raises QueueFull when it stays full for put_timeout seconds."""
+        self._ensure_thread()
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+        except queue.Full:
+            self.rejected += 1
+            raise QueueFull()
+        self.submitted += 1
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def _collect(self):
+        """Block for the first row, then take more until max_rows or the interval ends."""
+        try:
+            rows = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.interval
+        while len(rows) < self.max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return rows
+
+    def _drain(self):
+        rows = []
+        while len(rows) < self.max_rows:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _flush_batch(self, rows):
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                self.flush(rows)
+            except Exception as e:
+                self.failed_flushes += 1
+                if attempt == self.max_retries or self._stop.is_set():
+                    self.dropped_rows += len(rows)
+                    print(f"❌ write-behind: dropped {len(rows)} rows after {attempt + 1} attempts: {e}")
+                    return
+                print(f"⚠️ write-behind flush failed ({e}), retrying")
+                time.sleep(min(0.2 * 2 ** attempt, 5))
+                continue
+            elapsed = (time.monotonic() - started) * 1000
+            self.flushes += 1
+            self.flushed_rows += len(rows)
+            self.last_flush_ms = elapsed
+            self.max_flush_ms = max(self.max_flush_ms, elapsed)
+            self._flush_ms_total += elapsed
+            return
+
+    def _run(self):
+        while not self._stop.is_set():
+            rows = self._collect()
+            if rows:
+                self._flush_batch(rows)
+        # shutdown: write out everything still queued
+        rows = self._drain()
+        while rows:
+            self._flush_batch(rows)
+            rows = self._drain()
+
+    def close(self, timeout=10):
+        """Stop the thread after the queue is flushed (registered with atexit)."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "depth": self._queue.qsize(),
+            "max_depth": self.max_depth,
+            "capacity": self.max_queue,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_flushes": self.failed_flushes,
+            "dropped_rows": self.dropped_rows,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(self._flush_ms_total / self.flushes, 2) if self.flushes else 0.0,
+        }
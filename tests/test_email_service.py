@@ -0,0 +1,229 @@
+#test_email_service.py
+#EmailSender against a fake Brevo (http.server on 127.0.0.1): every test scripts
+#the answers the fake gives, one per request, then looks at what reached it.
+#
+#   python -m pytest -q tests
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeBrevo(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeBrevoHandler)
+        self.script = []      # (status, headers, delay) per request, then 200
+        self.requests = []    # (monotonic time, json payload, api-key)
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/v3/smtp/email"
+
+    def answer(self, *answers):
+        self.script.extend(a if isinstance(a, tuple) else (a, {}, 0) for a in answers)
+
+
+class FakeBrevoHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        with server.lock:
+            server.requests.append((time.monotonic(), json.loads(body), self.headers.get("api-key")))
+            status, headers, delay = server.script.pop(0) if server.script else (200, {}, 0)
+        if delay:
+            time.sleep(delay)
+        data = json.dumps({"messageId": "<fake@brevo>"} if status < 400 else {"code": "error"}).encode()
+        try:
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass   # the client gave up (timeout test)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def brevo(monkeypatch):
+    server = FakeBrevo()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("BREVO_API_URL", server.url)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def email_service(brevo):
+    # BREVO_API_URL is read at import, so import (again) with the fake in place
+    sys.modules.pop("email_service", None)
+    import email_service
+    yield email_service
+    sys.modules.pop("email_service", None)
+
+
+def make_sender(email_service, **kwargs):
+    kwargs.setdefault("backoff", 0.01)
+    kwargs.setdefault("read_timeout", 2)
+    kwargs.setdefault("breaker", email_service.CircuitBreaker(threshold=100))
+    return email_service.EmailSender(url=os.environ["BREVO_API_URL"], **kwargs)
+
+
+PAYLOAD = {
+    "sender": {"email": "noreply@example.com"},
+    "to": [{"email": "user@example.com"}],
+    "subject": "hi",
+    "htmlContent": "<p>hi</p>",
+}
+
+
+def test_send_email_uses_brevo_api_url(brevo, email_service, monkeypatch):
+    monkeypatch.setenv("BREVO_API_KEY", "key-1")
+    monkeypatch.setenv("EMAIL_SENDER", "noreply@example.com")
+    assert email_service.sender.url == brevo.url
+
+    future = email_service.send_email("user@example.com", "hi", "<p>hi</p>")
+    future.result(timeout=5)
+
+    assert len(brevo.requests) == 1
+    _, payload, api_key = brevo.requests[0]
+    assert api_key == "key-1"
+    assert payload["to"] == [{"email": "user@example.com"}]
+    assert email_service.sender.stats()["sent"] == 1
+
+
+def test_200_delivers(brevo, email_service):
+    sender = make_sender(email_service)
+    response = sender.deliver(PAYLOAD, "key")
+
+    assert response.status_code == 200
+    assert len(brevo.requests) == 1
+    assert sender.stats()["sent"] == 1
+    assert sender.stats()["failed"] == 0
+
+
+@pytest.mark.parametrize("status", [500, 502, 503, 429])
+def test_5xx_and_429_are_retried(brevo, email_service, status):
+    brevo.answer(status, status)
+    sender = make_sender(email_service, retries=3)
+    response = sender.deliver(PAYLOAD, "key")
+
+    assert response.status_code == 200
+    assert len(brevo.requests) == 3
+    assert sender.stats()["retried"] == 2
+    assert sender.stats()["sent"] == 1
+
+
+def test_retry_after_is_honoured(brevo, email_service):
+    brevo.answer((429, {"Retry-After": "1"}, 0))
+    sender = make_sender(email_service, retries=1, backoff=0)
+    response = sender.deliver(PAYLOAD, "key")
+
+    assert response.status_code == 200
+    assert len(brevo.requests) == 2
+    first, second = brevo.requests[0][0], brevo.requests[1][0]
+    assert second - first >= 1.0
+
+
+def test_gives_up_after_retries(brevo, email_service):
+    brevo.answer(503, 503, 503)
+    sender = make_sender(email_service, retries=2)
+
+    assert sender.deliver(PAYLOAD, "key") is None
+    assert len(brevo.requests) == 3
+    assert sender.stats()["failed"] == 1
+
+
+@pytest.mark.parametrize("status", [400, 401, 404])
+def test_4xx_is_not_retried(brevo, email_service, status):
+    brevo.answer(status)
+    sender = make_sender(email_service, retries=3)
+    response = sender.deliver(PAYLOAD, "key")
+
+    assert response.status_code == status
+    assert len(brevo.requests) == 1
+    assert sender.stats()["retried"] == 0
+    assert sender.stats()["failed"] == 1
+    # a rejected message is Brevo answering, not Brevo being down
+    assert sender.breaker.failures == 0
+
+
+def test_timeout_is_retried_then_handled(brevo, email_service):
+    brevo.answer((200, {}, 1.0), (200, {}, 1.0))
+    sender = make_sender(email_service, retries=1, read_timeout=0.2)
+
+    started = time.monotonic()
+    assert sender.deliver(PAYLOAD, "key") is None
+    assert time.monotonic() - started < 1.5
+    assert len(brevo.requests) == 2
+    assert sender.stats()["failed"] == 1
+    assert sender.breaker.failures == 2
+
+
+def test_timeout_then_success(brevo, email_service):
+    brevo.answer((200, {}, 1.0))
+    sender = make_sender(email_service, retries=1, read_timeout=0.2)
+
+    assert sender.deliver(PAYLOAD, "key").status_code == 200
+    assert sender.stats()["sent"] == 1
+
+
+def test_breaker_opens_and_lets_one_probe_through(brevo, email_service):
+    breaker = email_service.CircuitBreaker(threshold=3, reset_timeout=0.5)
+    sender = make_sender(email_service, retries=0, breaker=breaker)
+
+    brevo.answer(500, 500, 500)
+    for _ in range(3):
+        assert sender.deliver(PAYLOAD, "key") is None
+    assert breaker.state == "open"
+
+    # open: dropped without reaching Brevo
+    assert sender.deliver(PAYLOAD, "key") is None
+    assert len(brevo.requests) == 3
+    assert sender.stats()["dropped"] == 1
+
+    time.sleep(0.6)
+    assert breaker.state == "half-open"
+
+    # half-open: the first call is the probe (kept in flight by the fake),
+    # anything else meanwhile is dropped
+    brevo.answer((200, {}, 0.5))
+    probe = threading.Thread(target=sender.deliver, args=(PAYLOAD, "key"))
+    probe.start()
+    time.sleep(0.2)
+    assert sender.deliver(PAYLOAD, "key") is None
+    probe.join(timeout=5)
+
+    assert len(brevo.requests) == 4
+    assert sender.stats()["dropped"] == 2
+    assert breaker.state == "closed"
+    assert sender.deliver(PAYLOAD, "key").status_code == 200
+
+
+def test_failed_probe_reopens(brevo, email_service):
+    breaker = email_service.CircuitBreaker(threshold=1, reset_timeout=0.3)
+    sender = make_sender(email_service, retries=0, breaker=breaker)
+
+    brevo.answer(503, 503)
+    assert sender.deliver(PAYLOAD, "key") is None
+    time.sleep(0.4)
+    assert sender.deliver(PAYLOAD, "key") is None   # the probe fails
+    assert breaker.state == "open"
+    assert sender.deliver(PAYLOAD, "key") is None
+    assert len(brevo.requests) == 2
@@ -1,3 +1,6 @@
+import string
+from types import MappingProxyType
+
 TRANSLATIONS = {
     "el": {
         # navbar / bottom
@@ -207,6 +210,7 @@ TRANSLATIONS = {
 "new_username": "Νέο Username",
 "save_changes": "Αποθήκευση Αλλαγών",
 "back_to_profile": "⬅ Επιστροφή στο προφίλ",
+"username_taken": "Το username υπάρχει ήδη, διάλεξε άλλο.",
 #edit password
 "new_password_title": "Νέος Κωδικός",
 "set_new_password": "Ορισμός Νέου Κωδικού",
@@ -283,6 +287,7 @@ TRANSLATIONS = {
 "updating_stats": "🔄 Ενημέρωση στατιστικών...",
 "no_stats_yet": "Δεν υπάρχουν ακόμα στατιστικά...",
 "stats_load_failed": "⚠️ Αποτυχία φόρτωσης στατιστικών.",
+"load_more_stats": "Περισσότερα",
 "no_stats_for_export": "Δεν υπάρχουν στατιστικά για εξαγωγή.",
 "pdf_filename": "thera_hand_report.pdf",
 "pdf_report_title": "Αναφορά Ασκήσεων Χεριού",
@@ -292,6 +297,21 @@ TRANSLATIONS = {
 "label_time": "Χρόνος",
 "label_result": "Αποτέλεσμα",
 "label_age": "Ηλικία",
+"first_name": "Όνομα",
+"last_name": "Επώνυμο",
+"report_summary": "Σύνοψη",
+"report_total_sessions": "Συνολικές προσπάθειες",
+"report_exercises_performed": "Ασκήσεις που εκτελέστηκαν",
+"report_success_rate": "Ποσοστό επιτυχίας",
+"report_avg_time": "Μέσος χρόνος",
+"report_best": "Καλύτερη επίδοση",
+"report_progress": "Γενική πρόοδος",
+"progress_stable": "Σταθερή",
+"progress_improving": "Βελτιούμενη",
+"progress_excellent": "Εξαιρετική",
+"report_chart_plays": "Προσπάθειες ανά άσκηση",
+"report_chart_daily": "Προσπάθειες ανά ημέρα (τελευταίες 30 ημέρες)",
+"report_recent_note": "Εμφανίζονται οι πιο πρόσφατες {count} προσπάθειες.",
 
 "col_name": "Όνομα",
 "col_age": "Ηλικία",
@@ -352,6 +372,7 @@ TRANSLATIONS = {
 "exercise_2_title": "Άσκηση 2",
 "exercise_3_title": "Άσκηση 3",
 "exercise_4_title": "Άσκηση 4",
+"game_other_title": "Άλλη άσκηση",
 
 "result_completed": "Ολοκληρώθηκε",
 "result_win": "Νίκη",
@@ -359,6 +380,7 @@ TRANSLATIONS = {
 "result_game_over": "Τέλος παιχνιδιού",
 "result_exit": "Έξοδος",
 "result_playing": "Σε εξέλιξη",
+"result_other": "Άλλο",
 
 #exercise1 buttons
 "btn_start": "Έναρξη",
@@ -587,6 +609,7 @@ TRANSLATIONS = {
 "new_username": "New Username",
 "save_changes": "Save Changes",
 "back_to_profile": "⬅ Back to profile",
+"username_taken": "This username is already taken, choose another one.",
 #edit password
 "new_password_title": "New Password",
 "set_new_password": "Set New Password",
@@ -665,6 +688,7 @@ TRANSLATIONS = {
 "updating_stats": "🔄 Updating statistics...",
 "no_stats_yet": "No statistics yet...",
 "stats_load_failed": "⚠️ Failed to load statistics.",
+"load_more_stats": "Load more",
 "no_stats_for_export": "No statistics to export.",
 "pdf_filename": "thera_hand_report.pdf",
 "pdf_report_title": "Hand Exercise Report",
@@ -674,6 +698,21 @@ TRANSLATIONS = {
 "label_time": "Time",
 "label_result": "Result",
 "label_age": "Age",
+"first_name": "First name",
+"last_name": "Last name",
+"report_summary": "Summary",
+"report_total_sessions": "Total sessions",
+"report_exercises_performed": "Exercises performed",
+"report_success_rate": "Success rate",
+"report_avg_time": "Average time",
+"report_best": "Best performance",
+"report_progress": "Overall progress",
+"progress_stable": "Stable",
+"progress_improving": "Improving",
+"progress_excellent": "Excellent",
+"report_chart_plays": "Sessions per exercise",
+"report_chart_daily": "Sessions per day (last 30 days)",
+"report_recent_note": "Showing the {count} most recent sessions.",
 
 "col_name": "Name",
 "col_age": "Age",
@@ -718,6 +757,7 @@ TRANSLATIONS = {
 "exercise_2_title": "Exercise 2",
 "exercise_3_title": "Exercise 3",
 "exercise_4_title": "Exercise 4",
+"game_other_title": "Other exercise",
 
 "result_completed": "Completed",
 "result_win": "Win",
@@ -725,6 +765,7 @@ TRANSLATIONS = {
 "result_game_over": "Game Over",
 "result_exit": "Exit",
 "result_playing": "In progress",
+"result_other": "Other",
 #game 4
 # --- Game 4 UI ---
 "game4_all_done": "Finished! All exercises are completed!",
@@ -758,13 +799,71 @@ TRANSLATIONS = {
 
     }
 }
+
+
+# ------------------------------------------------------------
+# ✅ Catalogs: built once at import, shared by Flask and the games.
+# CATALOGS[lang] is a read-only mapping with every key of every language:
+# the language's own text, else the fallback language's (empty = missing).
+# Strings with {placeholders} keep a bound str.format, plain ones are never formatted.
+# ------------------------------------------------------------
+LANGUAGES = ("el", "en")
+DEFAULT_LANG = "el"
+FALLBACKS = {"el": ("en",), "en": ("el",)}
+
+
+def _is_template(text):
+    try:
+        return any(field is not None for _, field, _, _ in string.Formatter().parse(text))
+    except ValueError:
+        # a lone "{" or "}": plain text
+        return False
+
+
+def _build_catalogs():
+    catalogs, templates = {}, {}
+    for lang in LANGUAGES:
+        merged = {}
+        for source in reversed((lang,) + FALLBACKS[lang]):
+            merged.update((key, text) for key, text in TRANSLATIONS.get(source, {}).items() if text)
+        catalogs[lang] = MappingProxyType(merged)
+        templates[lang] = MappingProxyType({
+            key: text.format for key, text in merged.items() if isinstance(text, str) and _is_template(text)
+        })
+    return MappingProxyType(catalogs), MappingProxyType(templates)
+
+
+CATALOGS, _TEMPLATES = _build_catalogs()
+
+
+def catalog(lang: str):
+    """Frozen, fallback-resolved mapping for `lang` (DEFAULT_LANG if unknown)."""
+    return CATALOGS.get(lang) or CATALOGS[DEFAULT_LANG]
+
+
 def t(lang: str, key: str, **kwargs) -> str:
-    if lang not in ("el", "en"):
-        lang = "el"
-    txt = TRANSLATIONS.get(lang, {}).get(key) or TRANSLATIONS["en"].get(key) or key
+    if lang not in CATALOGS:
+        lang = DEFAULT_LANG
     if kwargs:
-        try:
-            return txt.format(**kwargs)
-        except Exception:
-            return txt
-    return txt
+        fmt = _TEMPLATES[lang].get(key)
+        if fmt is not None:
+            try:
+                return fmt(**kwargs)
+            except Exception:
+                pass
+    return CATALOGS[lang].get(key, key)
+
+
+def missing_keys():
+    """{lang: keys that some other language has and this one lacks (served from a fallback)}."""
+    all_keys = set(CATALOGS[DEFAULT_LANG])
+    return {
+        lang: sorted(key for key in all_keys if not TRANSLATIONS.get(lang, {}).get(key))
+        for lang in LANGUAGES
+    }
+
+
+def report_missing_keys():
+    for lang, keys in missing_keys().items():
+        if keys:
+            print(f"⚠️ translations: {len(keys)} key(s) missing in '{lang}': {', '.join(keys)}")
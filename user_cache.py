@@ -0,0 +1,94 @@
+#user_cache.py
+#Small per-process cache of `users` rows (TTL + LRU).
+#One page view used to read the same row several times (load_language,
+#profile, start_exercise, add_stat, ...). Rows are cached by id and can be
+#found by id, username or email. Routes that write a user must invalidate it.
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class UserCache:
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._rows = OrderedDict()   # id -> (row, loaded_at)
+        self._by_username = {}       # username -> id
+        self._by_email = {}          # email -> id
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _resolve(self, user_id, username, email):
+        if user_id is not None:
+            return user_id
+        if username is not None:
+            return self._by_username.get(username)
+        if email is not None:
+            return self._by_email.get(email)
+        return None
+
+    def _drop(self, user_id):
+        entry = self._rows.pop(user_id, None)
+        if entry is None:
+            return
+        row = entry[0]
+        if self._by_username.get(row.get("username")) == user_id:
+            del self._by_username[row.get("username")]
+        if self._by_email.get(row.get("email")) == user_id:
+            del self._by_email[row.get("email")]
+
+    def get(self, user_id=None, username=None, email=None, newer_than=None):
+        """Cached copy of the row, or None on a miss / expired entry."""
+        now = time.time()
+        with self._lock:
+            key = self._resolve(user_id, username, email)
+            entry = self._rows.get(key) if key is not None else None
+            if entry is not None:
+                row, loaded_at = entry
+                stale = now - loaded_at > self.ttl or (newer_than is not None and loaded_at < newer_than)
+                if stale:
+                    self._drop(key)
+                else:
+                    self._rows.move_to_end(key)
+                    self.hits += 1
+                    return dict(row)
+            self.misses += 1
+            return None
+
+    def put(self, row):
+        if not row or row.get("id") is None:
+            return
+        row = dict(row)
+        user_id = row["id"]
+        with self._lock:
+            self._drop(user_id)
+            self._rows[user_id] = (row, time.time())
+            if row.get("username") is not None:
+                self._by_username[row["username"]] = user_id
+            if row.get("email") is not None:
+                self._by_email[row["email"]] = user_id
+            while len(self._rows) > self.maxsize:
+                oldest = next(iter(self._rows))
+                self._drop(oldest)
+
+    def invalidate(self, user_id=None, username=None, email=None):
+        with self._lock:
+            for key in {
+                user_id,
+                self._by_username.get(username) if username is not None else None,
+                self._by_email.get(email) if email is not None else None,
+            }:
+                if key is not None:
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            self._by_username.clear()
+            self._by_email.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._rows), "hits": self.hits, "misses": self.misses}